@@ -1,15 +1,27 @@
 import pyodbc
 from Config.conexion_config import CONFIG_HANA
 import logging
+import os
+import threading
+import time
+from Conexion import diagnostico_hana
 
 logger = logging.getLogger("migrador")
 
+# Sesiones HANA simultaneas del proceso (trabajos en paralelo, multi-almacen, PDFs...)
+HANA_MAX_SESIONES = int(os.getenv("HANA_MAX_SESIONES", "3"))
+_sesiones_hana = threading.BoundedSemaphore(HANA_MAX_SESIONES)
+
 class ConexionHANA:
     def __init__(self, query=None):
         self.conexion = None
         self.cursor = None
         self.db_estado = False
         self.query = query
+        self._turno = False  # Tiene un cupo de _sesiones_hana
+        self._diagnostico = None  # Plan y tiempos de la ultima consulta (HANA_DIAGNOSTICO=1)
+        self._medicion = None  # Consulta ejecutada pendiente de lectura
+        self.metricas = []  # Una medicion por consulta leida: tiempos, filas, columnas y bytes
 
     def __enter__(self):
         self.conectar()
@@ -21,6 +33,9 @@ class ConexionHANA:
         self.cerrar_conexion()
 
     def conectar(self):
+        if not self._turno:
+            _sesiones_hana.acquire()  # Espera si ya hay HANA_MAX_SESIONES abiertas
+            self._turno = True
         try:
             conn_str = (
                 f"DSN={CONFIG_HANA['dsn']};"
@@ -34,13 +49,26 @@ class ConexionHANA:
         except Exception as e:
             logger.error(f"❌ Error al conectar a SAP HANA: {e}")
             self.db_estado = False
+            self._liberar_turno()
+
+    def _liberar_turno(self):
+        if self._turno:
+            self._turno = False
+            _sesiones_hana.release()
 
     def ejecutar(self, query: str):
         if not self.db_estado or not self.cursor:
             logger.warning("Intento de ejecutar query sin conexión activa")
             return None
         try:
+            if diagnostico_hana.DIAGNOSTICO_ACTIVO:
+                self._preparar_diagnostico(query)
+            inicio = time.perf_counter()
             self.cursor.execute(query)
+            segundos = round(time.perf_counter() - inicio, 3)  # Hasta que HANA tiene la primera fila
+            self._medicion = dict(diagnostico_hana.etiqueta_consulta(query), segundos_ejecucion=segundos)
+            if self._diagnostico is not None:
+                self._diagnostico["segundos_ejecucion"] = segundos
             logger.info(f"Query ejecutada en HANA: {query[:50]}...")  # Solo primeros 50 caracteres
             return self.cursor
         except Exception as e:
@@ -54,9 +82,54 @@ class ConexionHANA:
 
     def obtener_tabla(self):
         if self.db_estado and self.cursor:
-            return self.cursor.fetchall()
+            inicio = time.perf_counter()
+            registros = self.cursor.fetchall()
+            segundos = round(time.perf_counter() - inicio, 3)
+            if self._medicion is not None:
+                self._medicion.update(segundos_lectura=segundos, filas=len(registros),
+                                      columnas=len(self.cursor.description or ()),
+                                      bytes=diagnostico_hana.estimar_bytes(registros))
+                self.metricas.append(self._medicion)
+                logger.info(f"[TRANSFERENCIA] {self._medicion['tabla']}: ejecucion {self._medicion['segundos_ejecucion']}s, "
+                            f"lectura {segundos}s, {len(registros)} filas x {self._medicion['columnas']} columnas, "
+                            f"~{self._medicion['bytes'] / 1048576:.1f} MB")
+                self._medicion = None
+            if self._diagnostico is not None:
+                self._diagnostico.update(segundos_lectura=segundos, filas=len(registros))
+                diagnostico_hana.registrar(self._diagnostico)
+                self._diagnostico = None
+            return registros
         return []
 
+    def obtener_tablas(self, consultas: dict) -> dict:
+        """
+        Ejecuta varias consultas en secuencia sobre esta misma sesion, leyendo cada
+        resultado antes de pasar a la siguiente. Devuelve {clave: filas} (None si falla).
+        """
+        resultados = {}
+        for clave, query in consultas.items():
+            if self.ejecutar(query) is None:
+                resultados[clave] = None
+                continue
+            medidas = len(self.metricas)
+            try:
+                resultados[clave] = self.obtener_tabla()
+                if len(self.metricas) > medidas:
+                    self.metricas[-1]["clave"] = clave
+            except Exception as e:
+                logger.error(f"❌ Error leyendo resultado HANA ({clave}): {e}")
+                resultados[clave] = None
+        return resultados
+
+    def _preparar_diagnostico(self, query: str):
+        """Captura el EXPLAIN PLAN antes de ejecutar (un fallo aqui no detiene la consulta)."""
+        self._diagnostico = diagnostico_hana.etiqueta_consulta(query)
+        try:
+            self._diagnostico["plan"] = diagnostico_hana.explicar(self.cursor, query)
+        except Exception as e:
+            self._diagnostico["plan_error"] = str(e)
+            logger.warning(f"No se pudo obtener el EXPLAIN PLAN: {e}")
+
     def cerrar_conexion(self):
         try:
             if self.cursor:
@@ -66,3 +139,5 @@ class ConexionHANA:
             logger.info("Conexión SAP HANA cerrada")
         except Exception as e:
             logger.warning(f"Error al cerrar conexión SAP HANA: {e}")
+        finally:
+            self._liberar_turno()
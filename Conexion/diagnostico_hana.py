@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+logger = logging.getLogger("migrador")
+
+# ==========================================
+# DIAGNOSTICO DE CONSULTAS HANA
+# ==========================================
+# Con HANA_DIAGNOSTICO=1 cada consulta de ConexionHANA guarda su EXPLAIN PLAN,
+# el tiempo de ejecucion/lectura y las filas en un JSONL (una linea por consulta).
+# huella_sql cambia cuando cambia el texto de la consulta: permite comparar versiones.
+DIAGNOSTICO_ACTIVO = os.getenv("HANA_DIAGNOSTICO", "0") == "1"
+DIAGNOSTICO_ARCHIVO = os.getenv("HANA_DIAGNOSTICO_ARCHIVO", os.path.join("Logs", "diagnostico_hana.jsonl"))
+
+_lock = threading.Lock()
+
+# Filas que se miden para estimar los bytes materializados de cada extracto
+MUESTRA_BYTES = int(os.getenv("HANA_MUESTRA_BYTES", "1000"))
+
+COLUMNAS_PLAN = ('OPERATOR_ID', 'PARENT_OPERATOR_ID', 'LEVEL', 'OPERATOR_NAME', 'OPERATOR_DETAILS',
+                 'TABLE_NAME', 'TABLE_TYPE', 'OUTPUT_SIZE', 'SUBTREE_COST')
+
+
+def etiqueta_consulta(query: str) -> dict:
+    """Primera tabla del FROM + hash del texto normalizado."""
+    normalizada = " ".join(query.split())
+    tabla = re.search(r'FROM\s+(?:\S+\.)?"?(\w+)"?', normalizada, re.IGNORECASE)
+    return {
+        "tabla": tabla.group(1) if tabla else None,
+        "huella_sql": hashlib.sha1(normalizada.encode("utf-8")).hexdigest()[:12],
+    }
+
+
+def explicar(cursor, query: str) -> list:
+    """EXPLAIN PLAN de `query` (no la ejecuta). Devuelve los operadores como diccionarios."""
+    nombre = f"MIG_{uuid.uuid4().hex[:12]}"
+    cursor.execute(f"EXPLAIN PLAN SET STATEMENT_NAME = '{nombre}' FOR {query}")
+    cursor.execute(
+        f"SELECT {', '.join(COLUMNAS_PLAN)} FROM EXPLAIN_PLAN_TABLE "
+        f"WHERE STATEMENT_NAME = ? ORDER BY OPERATOR_ID", nombre
+    )
+    plan = [dict(zip(COLUMNAS_PLAN, fila)) for fila in cursor.fetchall()]
+    cursor.execute("DELETE FROM EXPLAIN_PLAN_TABLE WHERE STATEMENT_NAME = ?", nombre)
+    cursor.connection.commit()
+    return plan
+
+
+def registrar(registro: dict):
+    """Agrega una linea al historico de diagnostico."""
+    registro = dict(registro, fecha=time.strftime('%Y-%m-%d %H:%M:%S'))
+    try:
+        carpeta = os.path.dirname(DIAGNOSTICO_ARCHIVO)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        linea = json.dumps(registro, default=str, ensure_ascii=False)
+        with _lock, open(DIAGNOSTICO_ARCHIVO, "a", encoding="utf-8") as f:
+            f.write(linea + "\n")
+    except Exception as e:
+        logger.warning(f"No se pudo registrar el diagnostico HANA: {e}")
+
+
+# ==========================================
+# VOLUMEN DE TRANSFERENCIA
+# ==========================================
+# ConexionHANA mide cada consulta leida (ejecucion hasta la primera fila, lectura,
+# filas, columnas y bytes). Los migradores lo acumulan por tabla para saber si una
+# migracion lenta se va en HANA, en la red o en Python.
+def bytes_valor(valor) -> int:
+    if valor is None:
+        return 0
+    if isinstance(valor, str):
+        return len(valor.encode("utf-8"))
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if isinstance(valor, Decimal):
+        return 9
+    if isinstance(valor, (datetime, date, int, float)):
+        return 8
+    return len(str(valor))
+
+
+def bytes_filas(filas) -> int:
+    """Tamano aproximado de un extracto tal como cruza el ODBC."""
+    return sum(sum(bytes_valor(v) for v in fila) for fila in filas)
+
+
+def estimar_bytes(filas, muestra: int = MUESTRA_BYTES) -> int:
+    """bytes_filas sobre una muestra repartida (no recorre extractos grandes enteros)."""
+    if len(filas) <= muestra:
+        return bytes_filas(filas)
+    medidas = filas[::len(filas) // muestra]
+    return int(bytes_filas(medidas) * len(filas) / len(medidas))
+
+
+CAMPOS_TRANSFERENCIA = ("segundos_ejecucion", "segundos_lectura", "filas", "bytes")
+
+
+def acumular_transferencia(destino: dict, tabla: str, mediciones: list):
+    """Suma las mediciones de ConexionHANA en destino[tabla]."""
+    if not mediciones:
+        return
+    total = destino.setdefault(tabla, dict(dict.fromkeys(CAMPOS_TRANSFERENCIA, 0), consultas=0, columnas=0))
+    for medicion in mediciones:
+        total["consultas"] += 1
+        total["columnas"] = max(total["columnas"], medicion.get("columnas", 0))
+        for campo in CAMPOS_TRANSFERENCIA:
+            total[campo] += medicion.get(campo, 0)
+    total["segundos_ejecucion"] = round(total["segundos_ejecucion"], 3)
+    total["segundos_lectura"] = round(total["segundos_lectura"], 3)
+
+
+def acumular_por_clave(destino: dict, mediciones: list, claves):
+    """Reparte por tabla las mediciones de obtener_tablas (cada una lleva su clave)."""
+    for medicion in mediciones:
+        if medicion.get("clave") in claves:
+            acumular_transferencia(destino, medicion["clave"], [medicion])
+
+
+def total_transferencia(por_tabla: dict) -> dict:
+    """Agregado de toda la migracion a partir del detalle por tabla."""
+    total = dict(dict.fromkeys(CAMPOS_TRANSFERENCIA, 0), consultas=0)
+    for medicion in por_tabla.values():
+        for campo in total:
+            total[campo] += medicion.get(campo, 0)
+    total["segundos_ejecucion"] = round(total["segundos_ejecucion"], 3)
+    total["segundos_lectura"] = round(total["segundos_lectura"], 3)
+    return total
+
+
+def registrar_transferencia(origen: str, por_tabla: dict) -> dict:
+    """Deja en el log el volumen leido de HANA por una migracion (por tabla y total)."""
+    total = total_transferencia(por_tabla)
+    if total["consultas"]:
+        detalle = ", ".join(f"{t}: {m['filas']} filas ~{m['bytes'] / 1048576:.1f} MB" for t, m in por_tabla.items())
+        logger.info(f"[TRANSFERENCIA] {origen}: {total['consultas']} consultas, {total['filas']} filas, "
+                    f"~{total['bytes'] / 1048576:.1f} MB, ejecucion {total['segundos_ejecucion']}s, "
+                    f"lectura {total['segundos_lectura']}s ({detalle})")
+    return total
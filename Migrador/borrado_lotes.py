@@ -0,0 +1,68 @@
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# BORRADO POR LOTES (limpieza previa a la carga)
+# ==========================================
+# Un DELETE ... WHERE DocEntry IN (SELECT ...) sobre ITL1/OITL/IBT1/... escala a
+# bloqueo de tabla en almacenes grandes y frena los SP de los PDF.
+# Aqui las claves del padre se calculan una sola vez (#BORRADO) y cada tabla se
+# borra en lotes DELETE TOP (n) con commit entre lotes.
+# Por debajo de ~5000 filas por sentencia SQL Server no escala el bloqueo.
+LOTE_BORRADO = int(os.getenv("MIGRACION_LOTE_BORRADO", "2000"))
+# Por defecto la limpieza previa confirma cada lote aunque la carga vaya en una sola
+# transaccion: si la carga falla despues, el dia queda vacio hasta la siguiente
+# corrida (la huella ya se invalido, asi que se recarga). Con 1 la limpieza va dentro
+# de la transaccion de la carga (todo o nada) y los bloqueos duran toda la carga.
+LIMPIEZA_EN_TRANSACCION = os.getenv("MIGRACION_LIMPIEZA_EN_TRANSACCION", "0") == "1"
+
+
+def borrar_por_lotes(sql, descripcion: str, seleccion: str, pasos: list, lote: int = LOTE_BORRADO,
+                     confirmar: bool = True) -> dict:
+    """
+    - `seleccion`: SELECT DISTINCT de las claves del padre (al menos DocEntry).
+    - `pasos`: [(tabla, sentencia)] en orden hijos -> padre. Cada sentencia es un
+      `DELETE TOP (?) ...` con JOIN a #BORRADO B; se repite hasta borrar menos de `lote`.
+    Devuelve {"claves": n, "pasos": {tabla: {"filas", "lotes", "segundos"}}}.
+    Un error deja confirmados los lotes anteriores: la limpieza se puede repetir.
+    Con confirmar=False no hace commits: el borrado queda en la transaccion de quien llama.
+    """
+    cursor = sql.cursor
+    inicio = time.perf_counter()
+    cursor.execute("IF OBJECT_ID('tempdb..#BORRADO') IS NOT NULL DROP TABLE #BORRADO")
+    cursor.execute(f"SELECT S.* INTO #BORRADO FROM ({seleccion}) AS S")
+    cursor.execute("SELECT COUNT(*) FROM #BORRADO")
+    claves = cursor.fetchone()[0]
+    resumen = {"claves": claves, "pasos": {}}
+
+    if claves:
+        cursor.execute("CREATE CLUSTERED INDEX IX_BORRADO ON #BORRADO (DocEntry)")
+        if confirmar: sql.conexion.commit()
+        for tabla, sentencia in pasos:
+            filas_tabla, lotes, inicio_tabla = 0, 0, time.perf_counter()
+            while True:
+                inicio_lote = time.perf_counter()
+                cursor.execute(sentencia, lote)
+                filas = cursor.rowcount
+                if confirmar: sql.conexion.commit()
+                lotes += 1
+                filas_tabla += max(filas, 0)
+                logger.info(f"[BORRADO] {descripcion} {tabla} lote {lotes}: {filas} filas "
+                            f"en {time.perf_counter() - inicio_lote:.2f}s")
+                if filas < lote:
+                    break
+            resumen["pasos"][tabla] = {
+                "filas": filas_tabla,
+                "lotes": lotes,
+                "segundos": round(time.perf_counter() - inicio_tabla, 2),
+            }
+
+    cursor.execute("DROP TABLE #BORRADO")
+    if confirmar: sql.conexion.commit()
+    total = sum(p["filas"] for p in resumen["pasos"].values())
+    logger.info(f"[BORRADO] {descripcion}: {claves} documentos, {total} filas "
+                f"en {time.perf_counter() - inicio:.2f}s")
+    return resumen
@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from Conexion.conexion_sql import ConexionSQL
+from Procesamiento.Importador import clave_texto
+from Migrador.puntos_control import error_de_conexion
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CARGADOR CON BISECCION DE BLOQUES
+# ==========================================
+# Cada bloque se ejecuta detras de un SAVE TRANSACTION. Si falla, se deshace solo
+# ese bloque y se reintenta por mitades hasta aislar las sentencias malas:
+# las buenas entran igual (O(log n) viajes extra) y las malas van al archivo de
+# rechazos con su error. Los duplicados de PK (maestros compartidos) no se rechazan.
+RECHAZOS_DIR = os.getenv("MIGRACION_RECHAZOS_DIR", "Rechazos")
+
+# Columnas PK en SQL Server de los maestros que los importadores especializados
+# mandan fila por fila (misma forma que la pk que usan en procesar_fila)
+CLAVES_MAESTRAS = {
+    'OITM': ('ItemCode',),
+    'OBTN': ('ItemCode', 'DistNumber'),
+    'OBTW': ('AbsEntry',),
+}
+
+_PUNTO = "CARGA_BLOQUE"
+_INICIO_SENTENCIA = re.compile(r"(?<=;\n)(?=INSERT INTO )")
+_lock_rechazos = threading.Lock()  # Escritores paralelos comparten `errores` y el archivo de rechazos
+
+
+class TransaccionPerdida(Exception):
+    """SQL Server abortó la transacción entera: lo no commiteado se perdió, hay que reanudar."""
+
+
+def partir_bloque(bloque: str) -> list:
+    """Sentencias de un bloque del Importador ("INSERT ...;\\n" concatenados)."""
+    return [s for s in _INICIO_SENTENCIA.split(bloque) if s.strip()]
+
+
+def es_duplicado(e: Exception) -> bool:
+    msg = str(e)
+    return 'PRIMARY KEY' in msg or '2627' in msg
+
+
+class CargadorSQL:
+    """
+    Ejecuta los bloques de un plan sobre la conexion abierta `sql` (autocommit apagado).
+    El commit lo sigue haciendo el migrador (puntos de control cada COMMIT_CADA bloques).
+    """
+
+    def __init__(self, sql, origen: str, errores: dict = None):
+        self.sql = sql
+        self.origen = origen  # Nombre del archivo de rechazos (id de la bitacora)
+        self.errores = errores if errores is not None else {}  # mensaje -> veces
+        self.insertadas = 0
+        self.duplicadas = 0
+        self.rechazadas = 0
+        self.reintentos = 0
+
+    def ejecutar(self, bloque: str, tabla: str) -> tuple:
+        """Carga un bloque. Devuelve (insertadas, duplicadas, rechazadas)."""
+        resultado = self._intentar(partir_bloque(bloque), tabla)
+        self.insertadas += resultado[0]
+        self.duplicadas += resultado[1]
+        self.rechazadas += resultado[2]
+        return resultado
+
+    def _intentar(self, sentencias: list, tabla: str) -> tuple:
+        cursor = self.sql.cursor
+        try:
+            # El punto de guardado va en el mismo viaje que el bloque
+            cursor.execute(f"IF @@TRANCOUNT = 0 BEGIN TRANSACTION; SAVE TRANSACTION {_PUNTO};\n" + "".join(sentencias))
+            while cursor.nextset():  # Los errores de sentencias posteriores llegan en los siguientes resultados
+                pass
+            return len(sentencias), 0, 0
+        except Exception as e:
+            if error_de_conexion(e): raise
+            self._deshacer()
+            if len(sentencias) == 1:
+                if es_duplicado(e):
+                    return 0, 1, 0
+                self._rechazar(tabla, sentencias[0], e)
+                return 0, 0, 1
+            self.reintentos += 1
+            mitad = len(sentencias) // 2
+            izquierda = self._intentar(sentencias[:mitad], tabla)
+            derecha = self._intentar(sentencias[mitad:], tabla)
+            return tuple(a + b for a, b in zip(izquierda, derecha))
+
+    def _deshacer(self):
+        """Vuelve al punto de guardado del intento fallido (lo anterior del lote sigue pendiente de commit)."""
+        cursor = self.sql.cursor
+        cursor.execute("SELECT XACT_STATE()")
+        estado = cursor.fetchone()[0]
+        if estado != 1:
+            raise TransaccionPerdida(f"{self.origen}: la transaccion quedo en estado {estado}, se debe reanudar")
+        cursor.execute(f"ROLLBACK TRANSACTION {_PUNTO}")
+
+    def _rechazar(self, tabla: str, sentencia: str, e: Exception):
+        msg = str(e)
+        with _lock_rechazos:
+            self.errores[msg] = self.errores.get(msg, 0) + 1
+        try:
+            os.makedirs(RECHAZOS_DIR, exist_ok=True)
+            linea = json.dumps({"fecha": time.strftime('%Y-%m-%d %H:%M:%S'), "tabla": tabla,
+                                "error": msg, "sentencia": sentencia.strip()}, ensure_ascii=False)
+            with _lock_rechazos, open(os.path.join(RECHAZOS_DIR, f"{self.origen}.jsonl"), "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+        except Exception as ex:
+            logger.error(f"No se pudo guardar el rechazo de {tabla}: {ex} | {sentencia.strip()[:200]}")
+
+    def sumar(self, otro: "CargadorSQL"):
+        """Agrega los conteos de otro cargador (escritores paralelos)."""
+        self.insertadas += otro.insertadas
+        self.duplicadas += otro.duplicadas
+        self.rechazadas += otro.rechazadas
+        self.reintentos += otro.reintentos
+
+    def resumen(self) -> dict:
+        return {"insertadas": self.insertadas, "duplicadas": self.duplicadas,
+                "rechazadas": self.rechazadas, "reintentos": self.reintentos}
+
+
+# ==========================================
+# CLAVES EXISTENTES (maestros ya cargados)
+# ==========================================
+def claves_existentes(sql, candidatas: dict) -> dict:
+    """
+    Una sola consulta: cuales de las PK candidatas {tabla: [pk]} ya estan en SQL Server.
+    Las candidatas viajan a #CLAVES_MAESTRAS (fast_executemany) y se cruzan con cada maestro.
+    Devuelve {tabla: set(clave_texto)}.
+    """
+    filas = set()
+    for tabla, pks in candidatas.items():
+        for pk in pks:
+            clave = clave_texto(pk)
+            filas.add((tabla, clave[0], clave[1] if len(clave) > 1 else None))
+    existentes = {tabla: set() for tabla in candidatas}
+    if not filas:
+        return existentes
+
+    cursor = sql.cursor
+    cursor.execute("IF OBJECT_ID('tempdb..#CLAVES_MAESTRAS') IS NOT NULL DROP TABLE #CLAVES_MAESTRAS")
+    cursor.execute("CREATE TABLE #CLAVES_MAESTRAS (Tabla NVARCHAR(10) NOT NULL, Clave1 NVARCHAR(100) NOT NULL, Clave2 NVARCHAR(100) NULL)")
+    cursor.fast_executemany = True
+    cursor.executemany("INSERT INTO #CLAVES_MAESTRAS (Tabla, Clave1, Clave2) VALUES (?, ?, ?)", list(filas))
+    cursor.fast_executemany = False
+
+    consultas = []
+    for tabla in candidatas:
+        columnas = CLAVES_MAESTRAS[tabla]
+        union = " AND ".join(f"T.{c} = K.Clave{n + 1}" for n, c in enumerate(columnas))  # Sin funciones sobre T: usa la PK
+        segunda = f"CAST(T.{columnas[1]} AS NVARCHAR(100))" if len(columnas) > 1 else "NULL"
+        consultas.append(f"SELECT '{tabla}', CAST(T.{columnas[0]} AS NVARCHAR(100)), {segunda} "
+                         f"FROM dbo.{tabla} T JOIN #CLAVES_MAESTRAS K ON K.Tabla = '{tabla}' AND {union}")
+    cursor.execute(" UNION ALL ".join(consultas))
+    for tabla, clave1, clave2 in cursor.fetchall():
+        existentes[tabla].add(clave_texto((clave1,) if clave2 is None else (clave1, clave2)))
+    cursor.execute("DROP TABLE #CLAVES_MAESTRAS")
+    return existentes
+
+
+def descartar_maestros_existentes(importador, tablas=tuple(CLAVES_MAESTRAS)) -> int:
+    """
+    Quita del plan los INSERT de maestros (OITM/OBTN/OBTW) cuya PK ya esta en SQL Server,
+    en vez de mandarlos y esperar el error 2627 de cada uno. Si la consulta falla se
+    sigue igual: el cargador cuenta esos duplicados como siempre.
+    `tablas`: sin los maestros que la limpieza del modulo borra (se vuelven a insertar).
+    """
+    candidatas = {t: [pk for pk, _ in importador.maestros_pendientes.get(t, [])] for t in tablas}
+    candidatas = {t: pks for t, pks in candidatas.items() if pks}
+    if not candidatas:
+        return 0
+    try:
+        with ConexionSQL() as sql:
+            if not sql.db_estado:
+                return 0
+            existentes = claves_existentes(sql, candidatas)
+    except Exception as e:
+        logger.warning(f"No se pudieron consultar las claves existentes de {list(candidatas)}: {e}")
+        return 0
+    descartados = importador.descartar_existentes(existentes)
+    if descartados:
+        logger.info(f"[MAESTROS] {descartados} filas ya existentes en SQL Server no se envian "
+                    f"({ {t: len(c) for t, c in existentes.items()} })")
+    return descartados
@@ -0,0 +1,69 @@
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class CoalescedorMigraciones:
+    """
+    Evita que dos peticiones iguales migren lo mismo a la vez.
+    - Misma firma (modulo, fecha, almacenes, opciones) en curso: la segunda
+      peticion se engancha a la corrida existente y recibe el mismo resultado.
+    - Firma distinta pero con claves en comun (p. ej. mismo modulo/fecha/almacen
+      con forzar=True): espera a que termine la otra antes de limpiar e insertar.
+    - Claves distintas corren en paralelo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_vuelo = {}  # firma -> Future
+        self._cerrojos = {}  # clave -> [Lock, usuarios]
+
+    def ejecutar(self, claves: list, firma, funcion):
+        """Ejecuta `funcion()` (o espera el resultado de la corrida identica en curso)."""
+        claves = sorted(set(claves))  # Orden fijo: sin bloqueos cruzados entre peticiones
+        with self._lock:
+            futuro = self._en_vuelo.get(firma)
+            if futuro is not None:
+                propio = False
+            else:
+                propio = True
+                futuro = Future()
+                self._en_vuelo[firma] = futuro
+                for clave in claves:
+                    self._cerrojos.setdefault(clave, [threading.Lock(), 0])[1] += 1
+                cerrojos = [self._cerrojos[clave][0] for clave in claves]
+
+        if not propio:
+            logger.info(f"Peticion {firma} unida a la migracion en curso")
+            return futuro.result()
+
+        tomados = []
+        try:
+            for cerrojo in cerrojos:
+                cerrojo.acquire()
+                tomados.append(cerrojo)
+            resultado = funcion()
+            futuro.set_result(resultado)
+            return resultado
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            for cerrojo in reversed(tomados):
+                cerrojo.release()
+            with self._lock:
+                del self._en_vuelo[firma]
+                for clave in claves:
+                    self._cerrojos[clave][1] -= 1
+                    if self._cerrojos[clave][1] == 0:
+                        del self._cerrojos[clave]
+
+    def en_curso(self) -> list:
+        with self._lock:
+            return [firma for firma in self._en_vuelo]
+
+
+# Instancia unica del proceso (endpoints sincronos y trabajos en segundo plano)
+coalescedor_migraciones = CoalescedorMigraciones()
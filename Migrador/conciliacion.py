@@ -0,0 +1,192 @@
+import logging
+import time
+
+from Conexion.conexion_hana import ConexionHANA
+from Conexion.conexion_sql import ConexionSQL
+from Conexion.diagnostico_hana import acumular_por_clave, total_transferencia
+from Config.conexion_config import CONFIG_HANA
+from Migrador.control_migracion import MODULOS_POR_FECHA, cargas_registradas
+from Migrador.multi_almacen import condicion_almacenes
+from Migrador.ventana import VentanaFechas
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CONCILIACION HANA <-> SQL SERVER
+# ==========================================
+# Por cada modulo se cuentan las cabeceras por (dia, almacen) en los dos lados con
+# UNA consulta agrupada por lado: documentos y suma de DocEntry (detecta documentos
+# cambiados por otros aunque la cantidad coincida). Los (modulo, fecha, almacen)
+# distintos son los que hay que re-migrar; el resto no se toca.
+# Solo despacho limpia por fecha (MODULOS_POR_FECHA). Ventas, recepcion y traslados
+# borran todo el almacen antes de cargar: SQL Server guarda un solo dia por almacen,
+# el que figura en MIGRACION_CONTROL. En esos modulos se compara solo ese dia (los
+# demas no estan cargados y re-migrarlos borraria el dia registrado).
+# Recepcion, traslados y organoleptico escriben la misma dbo.OWTR: recepcion agrupa
+# por ToWhsCode (cubre tambien las cabeceras del organoleptico, mismo filtro) y
+# traslados por Filler. En SQL Server se aplica la parte del filtro que se carga
+# (U_SYP_MDSD/U_SYP_MDCD): un traslado hacia 01/09 del mismo dia tambien esta en el
+# extracto de recepcion de ese almacen.
+_DOCUMENTO_VALIDO = ('"CANCELED" = \'N\'', '"U_SYP_STATUS" = \'V\'', '"U_SYP_MDSD" IS NOT NULL', '"U_SYP_MDCD" IS NOT NULL')
+_DOCUMENTO_CARGADO = ("U_SYP_MDSD IS NOT NULL", "U_SYP_MDCD IS NOT NULL")
+
+
+class ReglaConciliacion:
+    """
+    Que cabeceras compara un modulo:
+    - tabla: cabecera en HANA y en SQL Server (dbo)
+    - fecha: columna del dia migrado; fecha_alterna: la que se usa si `fecha` es NULL
+    - almacen: columna del almacen del modulo
+    - filtro_hana: condiciones de la extraccion (columnas sin alias)
+    - filtro_sql: condiciones que en SQL Server separan al modulo de otros que escriben la misma tabla
+    - control: modulo en MIGRACION_CONTROL (dice si la limpieza es por fecha y que dia hay cargado)
+    - valores: valores de la columna `almacen` que cubre un almacen del modulo (traslados: '16' -> 15 y 16)
+    """
+
+    def __init__(self, modulo: str, tabla: str, fecha: str, almacen: str, control: str, filtro_hana=(), filtro_sql=(),
+                 fecha_alterna: str = None, valores=None):
+        self.modulo = modulo
+        self.control = control
+        self.valores = valores or (lambda almacen: (almacen,))
+        self.tabla = tabla
+        self.fecha = fecha
+        self.almacen = almacen
+        self.filtro_hana = tuple(filtro_hana)
+        self.filtro_sql = tuple(filtro_sql)
+        self.fecha_alterna = fecha_alterna
+
+    def _consulta(self, ventana: VentanaFechas, almacenes, origen: str, dia: str, col) -> str:
+        fecha = col(self.fecha)
+        if self.fecha_alterna:
+            # Dos rangos sobre las columnas crudas (un COALESCE en el WHERE impide usar indices)
+            alterna = col(self.fecha_alterna)
+            rango = f"(({ventana.condicion(fecha)}) OR ({fecha} IS NULL AND {ventana.condicion(alterna)}))"
+            fecha = f"COALESCE({fecha}, {alterna})"
+        else:
+            rango = ventana.condicion(fecha)
+        condiciones = [rango]
+        if almacenes and almacenes != "*":
+            almacenes = almacenes if isinstance(almacenes, (list, tuple, set)) else [almacenes]
+            valores = sorted({v for a in almacenes for v in self.valores(a)})
+            condiciones.append(condicion_almacenes(col(self.almacen), valores))
+        filtros = self.filtro_hana if origen == "hana" else self.filtro_sql
+        condiciones += [f"T.{f}" for f in filtros]
+        return f"""
+            SELECT {dia.format(fecha)}, {col(self.almacen)}, COUNT(*), SUM({col('DocEntry')})
+            FROM {self._tabla(origen)} T
+            WHERE {' AND '.join(condiciones)}
+            GROUP BY {dia.format(fecha)}, {col(self.almacen)}
+        """
+
+    @property
+    def por_fecha(self) -> bool:
+        return self.control in MODULOS_POR_FECHA
+
+    def _tabla(self, origen: str) -> str:
+        return f"{CONFIG_HANA.get('schema', 'SBO_SCHEMA')}.{self.tabla}" if origen == "hana" else f"dbo.{self.tabla}"
+
+    def consulta_hana(self, ventana: VentanaFechas, almacenes="*") -> str:
+        return self._consulta(ventana, almacenes, "hana", "TO_VARCHAR({}, 'YYYY-MM-DD')", lambda c: f'T."{c}"')
+
+    def consulta_sql(self, ventana: VentanaFechas, almacenes="*") -> str:
+        return self._consulta(ventana, almacenes, "sql", "CONVERT(VARCHAR(10), CAST({} AS DATE), 23)",
+                              lambda c: f"T.{c}")
+
+
+CONCILIACIONES = {
+    'ventas': ReglaConciliacion('ventas', 'ODLN', 'U_BPP_FECINITRA', 'U_COB_LUGAREN', 'VENTAS',
+                                filtro_hana=_DOCUMENTO_VALIDO),
+    'despacho': ReglaConciliacion('despacho', 'OINV', 'U_BPP_FECINITRA', 'U_COB_LUGAREN', 'DESPACHO',
+                                  filtro_hana=('"CANCELED" = \'N\'',), fecha_alterna='DocDate'),
+    'recepcion': ReglaConciliacion('recepcion', 'OWTR', 'U_BPP_FECINITRA', 'ToWhsCode', 'RECEPCION',
+                                   filtro_hana=_DOCUMENTO_VALIDO, filtro_sql=_DOCUMENTO_CARGADO),
+    'traslados': ReglaConciliacion('traslados', 'OWTR', 'U_BPP_FECINITRA', 'Filler', 'TRASLADOS',
+                                   filtro_hana=_DOCUMENTO_VALIDO + ('"ToWhsCode" IN (\'01\', \'09\')',),
+                                   filtro_sql=_DOCUMENTO_CARGADO + ("ToWhsCode IN ('01', '09')",),
+                                   valores=lambda almacen: ('15', '16') if almacen == '16' else (almacen,)),
+}
+
+
+def _agrupar(filas) -> dict:
+    """{(fecha, almacen): (documentos, suma DocEntry)}"""
+    return {(str(f[0]), str(f[1]).strip() if f[1] is not None else None): (int(f[2]), int(f[3] or 0)) for f in filas}
+
+
+def _dias_cargados(regla: ReglaConciliacion, ventana: VentanaFechas, almacenes) -> list:
+    """[(fecha, almacen)] que MIGRACION_CONTROL da por cargados para un modulo que limpia el almacen entero."""
+    pedidos = None if almacenes in (None, "*") else set(almacenes if isinstance(almacenes, (list, tuple, set)) else [almacenes])
+    # Las cargas multi-almacen registran un control por almacen; "*" no limpia nada por almacen
+    return [(fecha, almacen) for fecha, almacen in cargas_registradas(regla.control, ventana.desde, ventana.hasta)
+            if almacen != "*" and "," not in almacen and (pedidos is None or almacen in pedidos)]
+
+
+def _sumar(grupos: dict, fecha: str, valores) -> tuple:
+    filas = [grupos.get((fecha, v), (0, 0)) for v in valores]
+    return sum(f[0] for f in filas), sum(f[1] for f in filas)
+
+
+def conciliar(desde, dias: int = 1, modulos=None, almacenes="*") -> dict:
+    """
+    Compara HANA y SQL Server para los dias [desde, desde + dias) y los modulos pedidos.
+    Devuelve las diferencias por (modulo, fecha, almacen) y los grupos comparados.
+    """
+    modulos = list(modulos or CONCILIACIONES)
+    desconocidos = [m for m in modulos if m not in CONCILIACIONES]
+    if desconocidos:
+        raise ValueError(f"Modulos sin conciliacion: {desconocidos} (use {' | '.join(CONCILIACIONES)})")
+    ventana = VentanaFechas(desde, dias)
+    inicio = time.perf_counter()
+
+    with ConexionHANA() as hana:
+        if not hana.db_estado:
+            raise ConnectionError("Sin conexion a SAP HANA para conciliar")
+        leidos = hana.obtener_tablas({m: CONCILIACIONES[m].consulta_hana(ventana, almacenes) for m in modulos})
+        transferencia = {}
+        acumular_por_clave(transferencia, hana.metricas, modulos)
+    fallidos = [m for m, filas in leidos.items() if filas is None]
+    if fallidos:
+        raise RuntimeError(f"Fallo la lectura HANA de la conciliacion: {fallidos}")
+
+    copias = {}
+    with ConexionSQL() as sql:
+        if not sql.db_estado:
+            raise ConnectionError("Sin conexion a SQL Server para conciliar")
+        for modulo in modulos:
+            sql.cursor.execute(CONCILIACIONES[modulo].consulta_sql(ventana, almacenes))
+            copias[modulo] = sql.cursor.fetchall()
+
+    cargados = {m: _dias_cargados(CONCILIACIONES[m], ventana, almacenes) for m in modulos
+                if not CONCILIACIONES[m].por_fecha}
+    diferencias, comparados, sin_carga = [], 0, {}
+    for modulo in modulos:
+        regla = CONCILIACIONES[modulo]
+        origen, copia = _agrupar(leidos[modulo]), _agrupar(copias[modulo])
+        if regla.por_fecha:
+            grupos = [(fecha, almacen, (almacen,)) for fecha, almacen in set(origen) | set(copia)]
+        else:
+            grupos = [(fecha, almacen, regla.valores(almacen)) for fecha, almacen in cargados[modulo]]
+            cubiertos = {(fecha, v) for fecha, _, valores in grupos for v in valores}
+            sin_carga[modulo] = sum(1 for g in origen if g not in cubiertos)
+        for fecha, almacen, valores in sorted(grupos, key=lambda g: (g[0], str(g[1]))):
+            comparados += 1
+            en_hana, en_sql = _sumar(origen, fecha, valores), _sumar(copia, fecha, valores)
+            if en_hana != en_sql:
+                diferencias.append({
+                    "modulo": modulo, "fecha": fecha, "almacen": almacen,
+                    "hana": {"documentos": en_hana[0], "suma_docentry": en_hana[1]},
+                    "sql": {"documentos": en_sql[0], "suma_docentry": en_sql[1]},
+                })
+
+    segundos = round(time.perf_counter() - inicio, 2)
+    logger.info(f"[CONCILIACION] {ventana} {modulos}: {comparados} grupos (dia, almacen) comparados, "
+                f"{len(diferencias)} distintos ({segundos}s)")
+    return {
+        "ventana": ventana.como_dict(),
+        "modulos": modulos,
+        "grupos_comparados": comparados,
+        "diferencias": diferencias,
+        # Grupos HANA de dias que SQL Server no tiene cargados (modulos que limpian el almacen entero)
+        "grupos_sin_carga": sin_carga,
+        "transferencia": total_transferencia(transferencia),
+        "segundos": segundos,
+    }
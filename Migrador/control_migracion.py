@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import threading
+
+from Conexion.conexion_sql import ConexionSQL
+from Procesamiento.cache_maestros import CacheMaestros
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# TABLA DE CONTROL (SQL Server)
+# ==========================================
+# Una fila por (modulo, fecha, almacen) con la huella del ultimo extracto cargado.
+# Si la fila existe, SQL Server contiene exactamente ese extracto.
+DDL_CONTROL = """
+IF OBJECT_ID('dbo.MIGRACION_CONTROL', 'U') IS NULL
+CREATE TABLE dbo.MIGRACION_CONTROL (
+    Modulo VARCHAR(30) NOT NULL,
+    Fecha DATE NOT NULL,
+    Almacen VARCHAR(100) NOT NULL,
+    Huella CHAR(64) NOT NULL,
+    Registros INT NOT NULL,
+    FechaRegistro DATETIME NOT NULL DEFAULT GETDATE(),
+    CONSTRAINT PK_MIGRACION_CONTROL PRIMARY KEY (Modulo, Fecha, Almacen)
+);
+"""
+
+# Tablas que borra la limpieza de cada modulo y tablas que carga.
+# Sirve para saber que huellas dejan de ser validas cuando otro modulo limpia.
+TABLAS_MODULO = {
+    'VENTAS': {
+        'borra': {'ITL1', 'OITL', 'IBT1', 'DLN1', 'ODLN'},
+        'carga': {'ODLN', 'DLN1', 'IBT1', 'OBTN', 'OBTW', 'OITL', 'ITL1', 'OITM'},
+    },
+    'OINV': {'borra': {'OINV', 'INV1'}, 'carga': {'OINV'}},
+    'INV1': {'borra': {'INV1'}, 'carga': {'INV1'}},
+    'OWHS': {'borra': {'OWHS'}, 'carga': {'OWHS'}},
+    'DESPACHO': {
+        'borra': {'ITL1', 'OITL', 'IBT1', 'INV1', 'OINV'},
+        'carga': {'OINV', 'INV1', 'IBT1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM'},
+    },
+    'RECEPCION': {
+        'borra': {'ITL1', 'OITL', 'OBTW', 'OBTN', 'WTR1', 'OWTR'},
+        'carga': {'OWTR', 'WTR1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM'},
+    },
+    'TRASLADOS': {
+        'borra': {'ITL1', 'OITL', 'OBTW', 'OBTN', 'WTR1', 'OWTR'},
+        'carga': {'OWTR', 'WTR1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM'},
+    },
+    'ORGANOLEPTICO': {
+        'borra': {'ITL1', 'OITL', 'WTR1', 'OWTR'},
+        'carga': {'OWTR', 'WTR1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM'},
+    },
+}
+
+# Tablas del Migrador generico (modulo GENERAL_<tabla>, TRUNCATE + carga)
+TABLAS_GENERALES = ('OITM', 'OBTW', 'OBTN', 'OWHS', 'OINV', 'INV1', 'ODLN', 'DLN1',
+                    'OWTR', 'WTR1', 'OITL', 'ITL1', 'IBT1')
+
+# Tablas del Migrador generico filtradas por dia: se reemplazan solo los documentos
+# del dia (el resto son maestros y se truncan)
+TABLAS_GENERALES_POR_DIA = ('OINV', 'INV1', 'ODLN', 'DLN1', 'OWTR', 'WTR1', 'OITL', 'ITL1', 'IBT1')
+
+# Modulos cuya limpieza solo toca la fecha procesada.
+# El resto borra todos los dias del almacen (o trunca la tabla).
+MODULOS_POR_FECHA = {'DESPACHO', 'OINV', 'INV1', 'OWHS'} | {f'GENERAL_{t}' for t in TABLAS_GENERALES_POR_DIA}
+
+_tabla_lista = False
+_lock = threading.Lock()
+
+
+def _tablas(modulo):
+    if modulo.startswith('GENERAL_'):
+        tabla = modulo[len('GENERAL_'):]
+        return {'borra': {tabla}, 'carga': {tabla}}
+    return TABLAS_MODULO.get(modulo, {'borra': set(), 'carga': set()})
+
+
+def _modulos_conocidos():
+    return list(TABLAS_MODULO) + [f'GENERAL_{t}' for t in TABLAS_GENERALES]
+
+
+def clave_almacen(almacen) -> str:
+    if isinstance(almacen, (list, tuple, set)):
+        return ",".join(sorted(almacen))
+    return str(almacen)
+
+
+def _fecha(fecha) -> str:
+    return fecha if isinstance(fecha, str) else fecha.strftime('%Y-%m-%d')
+
+
+def _asegurar_tabla(cursor):
+    global _tabla_lista
+    if _tabla_lista:
+        return
+    with _lock:
+        if not _tabla_lista:
+            cursor.execute(DDL_CONTROL)
+            _tabla_lista = True
+
+
+def huella_registros(registros) -> str:
+    """
+    Huella del extracto independiente del orden de las filas.
+    Suma (mod 2^160) de los hash de cada fila + cantidad de filas.
+    """
+    suma = 0
+    for fila in registros:
+        suma = (suma + int(CacheMaestros.huella(fila), 16)) % (1 << 160)
+    return hashlib.sha256(f"{len(registros)}:{suma:040x}".encode("ascii")).hexdigest()
+
+
+def huella_sin_cambios(modulo: str, fecha, almacen, huella: str) -> bool:
+    """True si la ultima carga de (modulo, fecha, almacen) tuvo la misma huella."""
+    try:
+        with ConexionSQL() as sql:
+            if not sql.db_estado:
+                return False
+            _asegurar_tabla(sql.cursor)
+            sql.cursor.execute(
+                "SELECT Huella FROM dbo.MIGRACION_CONTROL WHERE Modulo = ? AND Fecha = ? AND Almacen = ?",
+                (modulo, _fecha(fecha), clave_almacen(almacen))
+            )
+            fila = sql.cursor.fetchone()
+            return bool(fila) and fila[0] == huella
+    except Exception as e:
+        logger.warning(f"No se pudo consultar la huella de {modulo}: {e}")
+        return False
+
+
+def tablas_borradas(modulo: str, almacen) -> set:
+    """Tablas que la limpieza del modulo borra realmente para ese almacen."""
+    if modulo == 'OWHS':
+        return {'OWHS'} if almacen == "*" else set()
+    if almacen == "*" and not modulo.startswith('GENERAL_'):
+        return set()  # Con '*' los migradores especializados no limpian
+    return _tablas(modulo)['borra']
+
+
+def invalidar_afectados(modulo: str, fecha, almacen):
+    """
+    Se llama antes de limpiar/cargar. Borra las huellas que dejan de describir
+    el contenido de SQL Server:
+    - de otros modulos que cargan alguna tabla que este modulo borra
+    - del propio modulo: la fecha actual, o todo el almacen si la limpieza no es por fecha
+    """
+    borradas = tablas_borradas(modulo, almacen)
+    afectados = [m for m in _modulos_conocidos()
+                 if m != modulo and _tablas(m)['carga'] & borradas]
+    try:
+        with ConexionSQL() as sql:
+            if not sql.db_estado:
+                return
+            _asegurar_tabla(sql.cursor)
+            if afectados:
+                marcas = ", ".join("?" for _ in afectados)
+                sql.cursor.execute(f"DELETE FROM dbo.MIGRACION_CONTROL WHERE Modulo IN ({marcas})", afectados)
+            if modulo in MODULOS_POR_FECHA:
+                sql.cursor.execute(
+                    "DELETE FROM dbo.MIGRACION_CONTROL WHERE Modulo = ? AND Fecha = ? AND Almacen = ?",
+                    (modulo, _fecha(fecha), clave_almacen(almacen))
+                )
+            elif modulo.startswith('GENERAL_'):
+                sql.cursor.execute("DELETE FROM dbo.MIGRACION_CONTROL WHERE Modulo = ?", (modulo,))
+            else:
+                sql.cursor.execute(
+                    "DELETE FROM dbo.MIGRACION_CONTROL WHERE Modulo = ? AND Almacen = ?",
+                    (modulo, clave_almacen(almacen))
+                )
+            sql.conexion.commit()
+    except Exception as e:
+        logger.warning(f"No se pudieron invalidar huellas para {modulo}: {e}")
+
+
+def registrar_huella(modulo: str, fecha, almacen, huella: str, registros: int):
+    """Guarda la huella tras una carga completa y sin errores."""
+    try:
+        with ConexionSQL() as sql:
+            if not sql.db_estado:
+                return
+            _asegurar_tabla(sql.cursor)
+            params = (modulo, _fecha(fecha), clave_almacen(almacen))
+            sql.cursor.execute(
+                "DELETE FROM dbo.MIGRACION_CONTROL WHERE Modulo = ? AND Fecha = ? AND Almacen = ?", params
+            )
+            sql.cursor.execute(
+                "INSERT INTO dbo.MIGRACION_CONTROL (Modulo, Fecha, Almacen, Huella, Registros) VALUES (?, ?, ?, ?, ?)",
+                params + (huella, registros)
+            )
+            sql.conexion.commit()
+    except Exception as e:
+        logger.warning(f"No se pudo registrar la huella de {modulo}: {e}")
+
+
+def migracion_registrada(modulo: str, fecha, almacen):
+    """Fecha/hora de la ultima carga completa de (modulo, fecha, almacen), o None."""
+    try:
+        with ConexionSQL() as sql:
+            if not sql.db_estado:
+                return None
+            _asegurar_tabla(sql.cursor)
+            sql.cursor.execute(
+                "SELECT FechaRegistro, Registros FROM dbo.MIGRACION_CONTROL WHERE Modulo = ? AND Fecha = ? AND Almacen = ?",
+                (modulo, _fecha(fecha), clave_almacen(almacen))
+            )
+            fila = sql.cursor.fetchone()
+            return fila[0] if fila else None
+    except Exception as e:
+        logger.warning(f"No se pudo consultar el control de {modulo}: {e}")
+        return None
+
+
+def cargas_registradas(modulo: str, desde, hasta) -> list:
+    """[(fecha 'YYYY-MM-DD', almacen)] con carga completa de `modulo` en [desde, hasta)."""
+    with ConexionSQL() as sql:
+        if not sql.db_estado:
+            raise ConnectionError("Sin conexion a SQL Server para leer MIGRACION_CONTROL")
+        _asegurar_tabla(sql.cursor)
+        sql.cursor.execute(
+            "SELECT CONVERT(VARCHAR(10), Fecha, 23), Almacen FROM dbo.MIGRACION_CONTROL "
+            "WHERE Modulo = ? AND Fecha >= ? AND Fecha < ?",
+            (modulo, _fecha(desde), _fecha(hasta))
+        )
+        return [(str(f[0]), str(f[1])) for f in sql.cursor.fetchall()]
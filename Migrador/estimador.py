@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from Conexion.conexion_hana import ConexionHANA
+from Conexion.diagnostico_hana import bytes_filas
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# ESTIMADOR (dry run)
+# ==========================================
+# Sondeos livianos en HANA (COUNT y una muestra de filas para el ancho) mas el
+# rendimiento historico de cada modulo (filas/s de extraccion + carga, media movil).
+# No limpia ni inserta nada en SQL Server.
+RENDIMIENTO_ARCHIVO = os.getenv("MIGRACION_RENDIMIENTO_ARCHIVO", os.path.join("Logs", "rendimiento_migracion.json"))
+FILAS_POR_SEGUNDO_DEFECTO = float(os.getenv("MIGRACION_FILAS_POR_SEGUNDO", "300"))  # Sin historico
+MUESTRA_ANCHO = int(os.getenv("MIGRACION_MUESTRA_ANCHO", "200"))  # Filas leidas para estimar bytes/fila
+PESO_ULTIMA = 0.3  # Peso de la ultima corrida en la media movil
+
+_lock = threading.Lock()
+
+
+def _leer_historico() -> dict:
+    try:
+        with open(RENDIMIENTO_ARCHIVO, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def registrar_rendimiento(modulo: str, filas: int, segundos: float):
+    """Actualiza el rendimiento historico tras una carga completa."""
+    if filas <= 0 or segundos <= 0:
+        return
+    try:
+        with _lock:
+            historico = _leer_historico()
+            previo = historico.get(modulo)
+            tasa = filas / segundos
+            if previo:
+                tasa = previo["filas_por_segundo"] * (1 - PESO_ULTIMA) + tasa * PESO_ULTIMA
+            historico[modulo] = {
+                "filas_por_segundo": round(tasa, 1),
+                "corridas": (previo or {}).get("corridas", 0) + 1,
+                "ultima": time.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            carpeta = os.path.dirname(RENDIMIENTO_ARCHIVO)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            temporal = RENDIMIENTO_ARCHIVO + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(historico, f, indent=1)
+            os.replace(temporal, RENDIMIENTO_ARCHIVO)
+    except Exception as e:
+        logger.warning(f"No se pudo registrar el rendimiento de {modulo}: {e}")
+
+
+def sondear(cursor, query: str) -> tuple:
+    """(filas, bytes promedio por fila) de la consulta sin traer el extracto completo."""
+    cursor.execute(f"SELECT COUNT(*) FROM ({query}) AS SONDEO")
+    filas = cursor.fetchone()[0]
+    if not filas:
+        return 0, 0
+    cursor.execute(f"SELECT TOP {MUESTRA_ANCHO} * FROM ({query}) AS SONDEO")
+    muestra = cursor.fetchall()
+    ancho = bytes_filas(muestra) / len(muestra) if muestra else 0
+    return filas, ancho
+
+
+def estimar_migracion(migrador, tablas=None, prefijo: str = "") -> list:
+    """
+    Estimacion por tabla: filas, bytes y segundos. `prefijo` arma la clave del
+    historico igual que la carga real (GENERAL_<tabla> en el migrador generico).
+    """
+    tablas = tablas or [t for t in migrador.tablas_objetivo if t in migrador.queries]
+    historico = _leer_historico()
+    resultados = []
+    with ConexionHANA() as hana:
+        if not hana.db_estado:
+            raise ConnectionError("Sin conexion a SAP HANA para estimar la migracion")
+        for tabla in tablas:
+            inicio = time.perf_counter()
+            try:
+                filas, ancho = sondear(hana.cursor, migrador.queries[tabla])
+            except Exception as e:
+                logger.error(f"Sondeo de {tabla} fallido: {e}")
+                resultados.append({"tabla": tabla, "status": "error", "error": str(e)})
+                continue
+            previo = historico.get(f"{prefijo}{tabla}")
+            tasa = previo["filas_por_segundo"] if previo else FILAS_POR_SEGUNDO_DEFECTO
+            resultados.append({
+                "tabla": tabla,
+                "status": "dry_run",
+                "filas": filas,
+                "bytes": int(filas * ancho),
+                "segundos_estimados": round(filas / tasa, 1) if tasa else None,
+                "fuente": "historico" if previo else "defecto",
+                "tiempo_sondeo": round(time.perf_counter() - inicio, 2),
+            })
+    return resultados
+
+
+def resumen_estimacion(resultados: list) -> dict:
+    estimadas = [r for r in resultados if r.get("status") == "dry_run"]
+    return {
+        "filas": sum(r["filas"] for r in estimadas),
+        "bytes": sum(r["bytes"] for r in estimadas),
+        "segundos_estimados": round(sum(r["segundos_estimados"] or 0 for r in estimadas), 1),
+        "tablas_con_error": [r["tabla"] for r in resultados if r.get("status") == "error"],
+    }
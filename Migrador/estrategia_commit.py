@@ -0,0 +1,396 @@
+import logging
+import os
+import queue
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from Conexion.conexion_sql import ConexionSQL
+from Migrador.borrado_lotes import LIMPIEZA_EN_TRANSACCION
+from Migrador.cargador import CargadorSQL
+from Migrador.puntos_control import COMMIT_CADA
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# ESTRATEGIA DE COMMIT DE LA CARGA
+# ==========================================
+# "todo":     inserts en UNA transaccion. Sin puntos de control (una caida repite la
+#             carga). La limpieza previa va antes, por lotes confirmados; con
+#             MIGRACION_LIMPIEZA_EN_TRANSACCION=1 va dentro de la transaccion de la
+#             carga (todo o nada, bloqueando las tablas toda la carga).
+# "filas":    commit cada COMMIT_CADA filas.
+# "segundos": commit cada COMMIT_SEGUNDOS segundos.
+# Con commits intermedios los inserts van a tablas de staging (dbo.STG_<tabla>_<corrida>).
+# Al terminar el staging se borra el dia por lotes con commit entre lotes (mismo
+# alcance que reemplaza el staging) y despues, en una transaccion corta que solo
+# inserta, se pasa el staging a las tablas reales. Costo: entre el borrado y la
+# publicacion los SP de reportes ven el dia vacio (no a medio cargar). Si la
+# publicacion falla, el staging queda y reanudar la repite (el borrado es repetible).
+ESTRATEGIA_COMMIT = os.getenv("MIGRACION_ESTRATEGIA_COMMIT", "todo")
+ESTRATEGIAS_COMMIT = ("todo", "filas", "segundos")
+COMMIT_SEGUNDOS = float(os.getenv("MIGRACION_COMMIT_SEGUNDOS", "10"))
+
+# ==========================================
+# LLENADO PARALELO DEL STAGING
+# ==========================================
+# Con staging cada tabla del plan se llena en su propio escritor, con su propia
+# conexion (hasta ESCRITORES_SQL a la vez). El staging no tiene PK ni FK, asi que
+# el orden entre tablas no importa ahi: el orden padre -> hijo lo da la publicacion,
+# que es serial y en el orden del plan. El punto de control es el staging completo:
+# una corrida paralela interrumpida vuelve a llenar el staging desde cero.
+# ESCRITORES_SQL = 1 (por defecto) es el orden estricto de siempre en una sola
+# conexion; la estrategia "todo" siempre va asi (una sola transaccion).
+ESCRITORES_SQL = int(os.getenv("MIGRACION_ESCRITORES_SQL", "1"))
+
+
+class PoliticaCommit:
+    """Decide cuando confirmar y mide el rendimiento de la carga con esa estrategia."""
+
+    def __init__(self, estrategia: str = ESTRATEGIA_COMMIT, filas: int = COMMIT_CADA, segundos: float = COMMIT_SEGUNDOS):
+        if estrategia not in ESTRATEGIAS_COMMIT:
+            raise ValueError(f"Estrategia de commit desconocida: {estrategia} (opciones: {ESTRATEGIAS_COMMIT})")
+        self.estrategia = estrategia
+        self.cada_filas = max(1, filas)
+        self.cada_segundos = segundos
+        self.inicio = time.perf_counter()
+        self._ultimo = self.inicio
+        self._pendientes = 0
+        self.filas = 0
+        self.commits = 0
+        self.max_segundos_transaccion = 0.0  # Transaccion mas larga (bloqueos tomados)
+        self.segundos_publicacion = None     # Solo staging: lo que duran bloqueadas las tablas reales
+
+    @property
+    def escalonada(self) -> bool:
+        """Hay commits intermedios (y por lo tanto la carga va por staging)."""
+        return self.estrategia != "todo"
+
+    def avanzar(self, filas: int) -> bool:
+        """Suma las filas ejecutadas. True si toca un commit intermedio."""
+        self.filas += filas
+        self._pendientes += filas
+        if self.estrategia == "filas":
+            return self._pendientes >= self.cada_filas
+        if self.estrategia == "segundos":
+            return self._pendientes > 0 and time.perf_counter() - self._ultimo >= self.cada_segundos
+        return False
+
+    def confirmado(self):
+        """Llamar justo despues de cada commit."""
+        ahora = time.perf_counter()
+        self.max_segundos_transaccion = max(self.max_segundos_transaccion, ahora - self._ultimo)
+        self._ultimo = ahora
+        self._pendientes = 0
+        self.commits += 1
+
+    def resumen(self) -> dict:
+        segundos = time.perf_counter() - self.inicio
+        return {
+            "estrategia": self.estrategia,
+            "filas": self.filas,
+            "commits": self.commits,
+            "segundos": round(segundos, 2),
+            "filas_por_segundo": round(self.filas / segundos, 1) if segundos else None,
+            "max_segundos_transaccion": round(self.max_segundos_transaccion, 2),
+            "segundos_publicacion": self.segundos_publicacion,
+        }
+
+    def sumar(self, otra: "PoliticaCommit"):
+        """Agrega lo hecho por la politica de un escritor paralelo."""
+        self.filas += otra.filas
+        self.commits += otra.commits
+        self.max_segundos_transaccion = max(self.max_segundos_transaccion, otra.max_segundos_transaccion)
+        self._ultimo = time.perf_counter()  # Mientras escribian, la conexion principal no tenia transaccion abierta
+
+
+class RendimientoTablas:
+    """Filas y segundos de escritura por tabla destino."""
+
+    def __init__(self):
+        self.tablas = {}
+
+    def sumar(self, tabla: str, filas: int, segundos: float, rechazadas: int = 0):
+        datos = self.tablas.setdefault(tabla, {"filas": 0, "segundos": 0.0, "rechazadas": 0})
+        datos["filas"] += filas
+        datos["segundos"] += segundos
+        datos["rechazadas"] += rechazadas
+
+    def resumen(self) -> dict:
+        return {t: {"filas": d["filas"], "segundos": round(d["segundos"], 2), "rechazadas": d["rechazadas"],
+                    "filas_por_segundo": round(d["filas"] / d["segundos"], 1) if d["segundos"] else None}
+                for t, d in self.tablas.items()}
+
+
+class CargaStaging:
+    """
+    Tablas de staging de una corrida. Son tablas reales (no #temporales) para que
+    sobrevivan a una caida: la reanudacion sigue llenandolas desde el ultimo commit.
+    """
+
+    def __init__(self, sql, corrida: str):
+        self.sql = sql
+        self.sufijo = re.sub(r"\W", "_", corrida)
+        self.tablas = []     # En el orden del plan (padres antes que hijos)
+        self._patrones = {}  # tabla -> regex del INSERT a redirigir
+
+    def nombre(self, tabla: str) -> str:
+        return f"dbo.STG_{tabla}_{self.sufijo}"
+
+    def preparar(self, tablas, reanudar: bool = False) -> bool:
+        """
+        Crea el staging vacio de cada tabla (misma estructura, sin PK ni FK).
+        Con `reanudar` conserva lo ya commiteado; devuelve False si faltaba algo
+        (el staging se rehace y la carga debe empezar de cero).
+        """
+        self.tablas = list(dict.fromkeys(tablas))
+        cursor = self.sql.cursor
+        if reanudar:
+            faltantes = []
+            for tabla in self.tablas:
+                cursor.execute("SELECT OBJECT_ID(?)", self.nombre(tabla))
+                if cursor.fetchone()[0] is None:
+                    faltantes.append(tabla)
+            if not faltantes:
+                return True
+            logger.warning(f"[STAGING] {self.sufijo}: faltan {faltantes}, la carga empieza de cero")
+        self.descartar()
+        for tabla in self.tablas:
+            cursor.execute(f"SELECT TOP 0 * INTO {self.nombre(tabla)} FROM dbo.{tabla}")
+        self.sql.conexion.commit()
+        return False
+
+    def redirigir(self, bloque: str, tabla: str) -> str:
+        """Cambia el destino de los INSERT del bloque (dbo.T o T) al staging de T."""
+        patron = self._patrones.get(tabla)
+        if patron is None:
+            patron = self._patrones[tabla] = re.compile(rf"^INSERT INTO (?:dbo\.)?{tabla}\b", re.M)
+        return patron.sub(f"INSERT INTO {self.nombre(tabla)}", bloque)
+
+    def _sentencia_publicar(self, tabla: str) -> str:
+        cursor = self.sql.cursor
+        cursor.execute("SELECT name FROM sys.columns WHERE object_id = OBJECT_ID(?) AND is_computed = 0 "
+                       "ORDER BY column_id", f"dbo.{tabla}")
+        columnas = ", ".join(f"[{f[0]}]" for f in cursor.fetchall())
+        cursor.execute("SELECT C.name FROM sys.indexes I "
+                       "JOIN sys.index_columns IC ON IC.object_id = I.object_id AND IC.index_id = I.index_id "
+                       "JOIN sys.columns C ON C.object_id = IC.object_id AND C.column_id = IC.column_id "
+                       "WHERE I.is_primary_key = 1 AND I.object_id = OBJECT_ID(?) ORDER BY IC.key_ordinal", f"dbo.{tabla}")
+        pk = [f"[{f[0]}]" for f in cursor.fetchall()]
+        if not pk:
+            return f"INSERT INTO dbo.{tabla} ({columnas}) SELECT {columnas} FROM {self.nombre(tabla)}"
+        # Como en la carga directa: una PK repetida en el staging o que ya esta (maestros compartidos) no entra
+        existe = " AND ".join(f"T.{c} = S.{c}" for c in pk)
+        return (f"INSERT INTO dbo.{tabla} ({columnas}) SELECT {columnas} FROM ("
+                f"SELECT *, ROW_NUMBER() OVER (PARTITION BY {', '.join(pk)} ORDER BY (SELECT NULL)) AS N_STAGING "
+                f"FROM {self.nombre(tabla)}) S "
+                f"WHERE S.N_STAGING = 1 AND NOT EXISTS (SELECT 1 FROM dbo.{tabla} T WHERE {existe})")
+
+    def publicar(self) -> dict:
+        """
+        Paso de cada staging a su tabla y DROP del staging, en la transaccion abierta
+        (el dia ya se limpio antes, con sus propios commits). El commit lo hace quien llama.
+        Devuelve {tabla: {"staging": filas, "publicadas": filas}}.
+        """
+        cursor = self.sql.cursor
+        sentencias = {tabla: self._sentencia_publicar(tabla) for tabla in self.tablas}
+        resumen = {}
+        for tabla in self.tablas:
+            cursor.execute(f"SELECT COUNT(*) FROM {self.nombre(tabla)}")
+            en_staging = cursor.fetchone()[0]
+            cursor.execute(sentencias[tabla])
+            resumen[tabla] = {"staging": en_staging, "publicadas": cursor.rowcount}
+        self.descartar()
+        return resumen
+
+    def descartar(self):
+        cursor = self.sql.cursor
+        for tabla in self.tablas:
+            cursor.execute(f"IF OBJECT_ID('{self.nombre(tabla)}') IS NOT NULL DROP TABLE {self.nombre(tabla)}")
+
+
+def _escribir_tabla(conexiones: queue.Queue, tabla: str, entradas: list, staging: CargaStaging,
+                    origen: str, errores: dict, estrategia: str) -> dict:
+    """
+    Escritor paralelo: carga en el staging de `tabla` sus entradas [(indice, bloque)]
+    con una conexion del pool, con commits intermedios segun la estrategia.
+    """
+    sql = conexiones.get()
+    try:
+        cargador = CargadorSQL(sql, origen, errores)
+        politica = PoliticaCommit(estrategia)
+        exitos, graves, confirmados = 0, 0, []
+        inicio = time.perf_counter()
+        try:
+            for i, bloque in entradas:
+                filas = 0
+                if bloque.strip():
+                    insertadas, duplicadas, rechazadas = cargador.ejecutar(staging.redirigir(bloque, tabla), tabla)
+                    filas = insertadas + duplicadas + rechazadas
+                    if rechazadas:
+                        graves += rechazadas
+                        logger.error(f"Bloque {i + 1} de {tabla}: {rechazadas} filas rechazadas, {insertadas} insertadas")
+                    else:
+                        exitos += 1
+                        if not duplicadas:
+                            confirmados.append(i)
+                if politica.avanzar(filas):
+                    sql.conexion.commit()
+                    politica.confirmado()
+            sql.conexion.commit()
+            politica.confirmado()
+        except Exception:
+            sql.conexion.rollback()
+            raise
+        return {"tabla": tabla, "exitos": exitos, "graves": graves, "confirmados": confirmados, "politica": politica,
+                "cargador": cargador, "segundos": time.perf_counter() - inicio}
+    finally:
+        conexiones.put(sql)
+
+
+def _cargar_en_paralelo(sql, plan: list, inicio: int, graves: int, bitacora, importador, staging: CargaStaging,
+                        politica: PoliticaCommit, rendimiento: RendimientoTablas, cargador: CargadorSQL,
+                        escritores: int, avisar=None) -> tuple:
+    """
+    Llena el staging de todas las tablas del plan a la vez, una tabla por escritor.
+    Un llenado interrumpido (0 < inicio < plan) se vacia y se repite entero.
+    Los conteos de cada escritor se suman a `cargador`. Devuelve (exitos, graves).
+    """
+    exitos = 0
+    if inicio >= len(plan):
+        return exitos, graves
+    if inicio:
+        for t in staging.tablas:
+            sql.cursor.execute(f"TRUNCATE TABLE {staging.nombre(t)}")
+        sql.conexion.commit()
+        graves = 0
+
+    grupos = {}
+    for t, i, bloque in plan:
+        grupos.setdefault(t, []).append((i, bloque))
+
+    hilos = max(1, min(escritores, len(grupos)))
+    with ExitStack() as pila:
+        conexiones = queue.Queue()
+        for _ in range(hilos):
+            conexion = pila.enter_context(ConexionSQL())
+            if not conexion.db_estado:
+                raise ConnectionError("No se pudo abrir la conexion de un escritor SQL")
+            conexiones.put(conexion)
+
+        with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="escritor_sql") as pool:
+            futuros = [pool.submit(_escribir_tabla, conexiones, t, entradas, staging, bitacora.id,
+                                   cargador.errores, politica.estrategia) for t, entradas in grupos.items()]
+            resultados = [f.result() for f in futuros]  # El primer error corta la carga
+    for r in resultados:
+        exitos += r["exitos"]
+        graves += r["graves"]
+        for i in r["confirmados"]:
+            importador.confirmar(r["tabla"], i)
+        politica.sumar(r["politica"])
+        rendimiento.sumar(r["tabla"], r["politica"].filas, r["segundos"], r["graves"])
+        cargador.sumar(r["cargador"])
+    bitacora.avance(len(plan), graves, orden="paralelo")
+    if avisar: avisar(len(plan))
+    return exitos, graves
+
+
+def cargar_plan(sql, plan: list, bitacora, importador, limpiar, avisar=None, errores: dict = None,
+                politica: PoliticaCommit = None, escritores: int = ESCRITORES_SQL) -> dict:
+    """
+    Ejecuta el plan [(tabla, indice, bloque)] desde el ultimo punto de control con la
+    estrategia de commit. `limpiar(sql, confirmar)` es el borrado previo, por lotes
+    confirmados: en "todo" antes de la carga (o sin commits dentro de ella con
+    LIMPIEZA_EN_TRANSACCION); con staging justo antes de publicar.
+    `avisar(hechos)` se llama tras cada commit intermedio (con `escritores` > 1, al llenar el staging).
+    Devuelve {"exitos", "graves", "cargador", "commit", "publicacion"} o None si la limpieza falla.
+    """
+    politica = politica or PoliticaCommit()
+    cargador = CargadorSQL(sql, bitacora.id, errores)  # Las filas rechazadas quedan en Rechazos/
+    inicio, graves = bitacora.confirmados, bitacora.errores
+    staging = CargaStaging(sql, bitacora.id)
+    rendimiento = RendimientoTablas()
+    exitos, publicacion = 0, None
+
+    try:
+        if politica.escalonada:
+            if not staging.preparar([t for t, _, _ in plan], reanudar=inicio > 0):
+                inicio, graves = 0, 0
+        else:
+            if inicio:
+                # Restos de una corrida anterior con staging: en "todo" se carga de nuevo todo
+                staging.tablas = list(dict.fromkeys(t for t, _, _ in plan))
+                staging.descartar()
+                inicio, graves = 0, 0
+            if limpiar(sql, not LIMPIEZA_EN_TRANSACCION) is False:
+                sql.conexion.rollback()
+                return None
+
+        # Una corrida a medias sigue en el orden con que conto sus confirmados
+        if inicio:
+            paralela = bitacora.orden != "plan"
+        else:
+            paralela = politica.escalonada and escritores > 1 and len(staging.tablas) > 1
+        if paralela:
+            exitos, graves = _cargar_en_paralelo(sql, plan, inicio, graves, bitacora, importador, staging, politica,
+                                                 rendimiento, cargador, escritores, avisar)
+        else:
+            for n in range(inicio, len(plan)):
+                t, i, bloque = plan[n]
+                filas = 0
+                if bloque.strip():
+                    comienzo = time.perf_counter()
+                    insertadas, duplicadas, rechazadas = cargador.ejecutar(
+                        staging.redirigir(bloque, t) if politica.escalonada else bloque, t)
+                    filas = insertadas + duplicadas + rechazadas
+                    rendimiento.sumar(t, filas, time.perf_counter() - comienzo, rechazadas)
+                    if rechazadas:
+                        graves += rechazadas
+                        logger.error(f"Bloque {n + 1} de {t}: {rechazadas} filas rechazadas, {insertadas} insertadas")
+                    else:
+                        # Los duplicados de PK ya estaban en SQL Server: el bloque cuenta como exito, pero
+                        # no va a la cache de maestros (la fila que quedo puede ser una version anterior)
+                        exitos += 1
+                        if not duplicadas:
+                            importador.confirmar(t, i)
+                if politica.avanzar(filas):
+                    # Solo toca el staging: la cache de maestros se vuelca despues de publicar
+                    sql.conexion.commit()
+                    politica.confirmado()
+                    bitacora.avance(n + 1, graves)
+                    if avisar: avisar(n + 1)
+
+        if politica.escalonada:
+            if limpiar(sql, True) is False:
+                # Lo borrado hasta el fallo queda confirmado; el staging sigue para reanudar
+                sql.conexion.rollback()
+                return None
+            inicio_publicacion = time.perf_counter()
+            publicacion = staging.publicar()
+            sql.conexion.commit()
+            politica.segundos_publicacion = round(time.perf_counter() - inicio_publicacion, 2)
+        else:
+            sql.conexion.commit()
+        politica.confirmado()
+    except Exception:
+        # ConexionSQL confirma al cerrar: lo que no llego a un commit propio se deshace aqui
+        sql.conexion.rollback()
+        raise
+
+    importador.volcar_cache()
+    resumen = politica.resumen()
+    resumen["escritores"] = escritores if paralela else 1
+    resumen["tablas"] = rendimiento.resumen()
+    logger.info(f"[COMMIT] {bitacora.id}: {resumen['estrategia']}, {resumen['filas']} filas en {resumen['segundos']}s "
+                f"({resumen['filas_por_segundo']} filas/s), {resumen['commits']} commits, transaccion mas larga "
+                f"{resumen['max_segundos_transaccion']}s, publicacion {resumen['segundos_publicacion']}s, "
+                f"{resumen['escritores']} escritores")
+    if resumen["tablas"]:
+        logger.info(f"[COMMIT] {bitacora.id}: filas/s por tabla "
+                    f"{ {t: r['filas_por_segundo'] for t, r in resumen['tablas'].items()} }")
+    if publicacion:
+        omitidas = {t: p["staging"] - p["publicadas"] for t, p in publicacion.items() if p["staging"] != p["publicadas"]}
+        if omitidas:
+            logger.info(f"[STAGING] {bitacora.id}: filas ya existentes omitidas al publicar {omitidas}")
+    return {"exitos": exitos, "graves": graves, "cargador": cargador, "commit": resumen, "publicacion": publicacion}
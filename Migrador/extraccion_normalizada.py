@@ -0,0 +1,144 @@
+import logging
+import os
+import time
+
+from Conexion.conexion_hana import ConexionHANA
+from Migrador.control_migracion import huella_registros
+from Conexion.diagnostico_hana import bytes_filas
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# EXTRACCION NORMALIZADA (tablas por separado + union en memoria)
+# ==========================================
+# El join ancho de VENTAS/DESPACHO repite la cabecera, el articulo y el lote en
+# cada linea de lote: la mayoria de los bytes que cruzan el ODBC son duplicados.
+# En modo "normalizada" cada tabla se lee sola (filtrada en HANA por las claves de
+# las cabeceras del dia) y las filas anchas se arman aqui con las mismas uniones,
+# asi el importador recibe exactamente lo mismo.
+EXTRACCION_MODO = os.getenv("MIGRACION_EXTRACCION", "ancha")
+MODOS_EXTRACCION = ("ancha", "normalizada")
+
+# Un plan normalizado es un dict:
+#   "tablas": [{"alias", "columnas", "consulta", "union": "inner" | "left",
+#               "condiciones": [(columna, alias_padre, columna_padre)]}]  en orden de union
+#             (la primera es la raiz: cabeceras)
+#   "orden":  aliases en el orden de columnas de la consulta ancha
+
+
+def _columnas_sql(alias: str, columnas: list) -> str:
+    # Una columna puede ser (nombre, expresion) para campos calculados de la cabecera
+    return ", ".join(f'{c[1]} AS "{c[0]}"' if isinstance(c, tuple) else f'{alias}."{c}"' for c in columnas)
+
+
+def armar_plan(tablas: list, orden: list, esquema: str) -> dict:
+    """`tablas`: [(alias, union, columnas, filtro WHERE, condiciones)] en orden de union."""
+    return {
+        "tablas": [{
+            "alias": alias,
+            "union": union,
+            "columnas": columnas,
+            "consulta": f"SELECT {_columnas_sql(alias, columnas)} FROM {esquema}.{alias} {alias} WHERE {filtro}",
+            "condiciones": condiciones,
+        } for alias, union, columnas, filtro, condiciones in tablas],
+        "orden": orden,
+    }
+
+
+def _clave(valores):
+    # NULL nunca une (como en SQL). Texto para cruzar NVARCHAR con INT (ObjType = DocType)
+    if any(v is None for v in valores):
+        return None
+    return tuple(str(v) for v in valores)
+
+
+def unir_normalizado(plan: dict, leidos: dict) -> list:
+    """Arma las filas anchas a partir de las tablas leidas por separado (hash join por condicion)."""
+    tablas = plan["tablas"]
+    posiciones = {t["alias"]: {(c[0] if isinstance(c, tuple) else c): i for i, c in enumerate(t["columnas"])} for t in tablas}
+    raiz = tablas[0]["alias"]
+    parciales = [{raiz: fila} for fila in leidos[raiz]]
+
+    for tabla in tablas[1:]:
+        alias, propias = tabla["alias"], posiciones[tabla["alias"]]
+        indice = {}
+        for fila in leidos[alias]:
+            clave = _clave([fila[propias[columna]] for columna, _, _ in tabla["condiciones"]])
+            if clave is not None:
+                indice.setdefault(clave, []).append(fila)
+        nuevos = []
+        for parcial in parciales:
+            clave = _clave([
+                parcial[padre][posiciones[padre][columna]] if parcial[padre] is not None else None
+                for _, padre, columna in tabla["condiciones"]
+            ])
+            coincidencias = indice.get(clave, []) if clave is not None else []
+            if coincidencias:
+                nuevos.extend(dict(parcial, **{alias: fila}) for fila in coincidencias)
+            elif tabla["union"] == "left":
+                nuevos.append(dict(parcial, **{alias: None}))
+        parciales = nuevos
+
+    vacias = {t["alias"]: (None,) * len(t["columnas"]) for t in tablas}
+    return [
+        tuple(valor for alias in plan["orden"] for valor in (parcial[alias] if parcial[alias] is not None else vacias[alias]))
+        for parcial in parciales
+    ]
+
+
+def leer_normalizado(hana, plan: dict):
+    """Lee cada tabla del plan en la sesion `hana` y une. (filas, {alias: filas leidas}); filas None si algo falla."""
+    leidos = hana.obtener_tablas({t["alias"]: t["consulta"] for t in plan["tablas"]})
+    fallidas = [alias for alias, filas in leidos.items() if filas is None]
+    if fallidas:
+        logger.error(f"Extraccion normalizada incompleta: fallaron {fallidas}")
+        return None, leidos
+    return unir_normalizado(plan, leidos), leidos
+
+
+def extraer_normalizado(hana, plan: dict):
+    """Filas anchas equivalentes a la consulta ancha, o None si alguna lectura falla."""
+    inicio = time.perf_counter()
+    registros, leidos = leer_normalizado(hana, plan)
+    if registros is not None:
+        logger.info(f"Extraccion normalizada: {sum(len(f) for f in leidos.values())} filas en "
+                    f"{len(leidos)} tablas -> {len(registros)} filas anchas ({time.perf_counter() - inicio:.2f}s)")
+    return registros
+
+
+def comparar_extracciones(consulta_ancha: str, plan: dict) -> dict:
+    """
+    Benchmark: lee el mismo extracto con el join ancho y en modo normalizado (misma
+    sesion HANA) y compara bytes recibidos, tiempo y huella del resultado.
+    """
+    with ConexionHANA() as hana:
+        if not hana.db_estado:
+            raise ConnectionError("Sin conexion a SAP HANA para comparar extracciones")
+
+        inicio = time.perf_counter()
+        ancha = hana.obtener_tablas({"ANCHA": consulta_ancha})["ANCHA"]
+        segundos_ancha = time.perf_counter() - inicio
+        if ancha is None:
+            raise RuntimeError("Fallo la consulta ancha")
+
+        inicio = time.perf_counter()
+        normalizada, leidos = leer_normalizado(hana, plan)
+        segundos_normalizada = time.perf_counter() - inicio
+        if normalizada is None:
+            raise RuntimeError("Fallo la extraccion normalizada")
+
+    bytes_ancha = bytes_filas(ancha)
+    por_tabla = {alias: {"filas": len(filas), "bytes": bytes_filas(filas)} for alias, filas in leidos.items()}
+    bytes_normalizada = sum(t["bytes"] for t in por_tabla.values())
+    return {
+        "ancha": {"filas": len(ancha), "bytes": bytes_ancha, "segundos": round(segundos_ancha, 3)},
+        "normalizada": {
+            "filas": len(normalizada),
+            "bytes": bytes_normalizada,
+            "segundos": round(segundos_normalizada, 3),
+            "consultas": len(leidos),
+            "tablas": por_tabla,
+        },
+        "ahorro_bytes_pct": round(100 * (1 - bytes_normalizada / bytes_ancha), 1) if bytes_ancha else None,
+        "resultado_identico": huella_registros(ancha) == huella_registros(normalizada),
+    }
@@ -0,0 +1,119 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from Conexion.conexion_hana import HANA_MAX_SESIONES, ConexionHANA
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# EXTRACCION PARTICIONADA POR RANGOS DE CLAVE
+# ==========================================
+# Un extracto grande (maestros completos como OBTW/OITM, ventanas de varios dias)
+# se lee con un solo cursor y queda limitado por ese hilo. Aqui la consulta se parte
+# en rangos de una columna clave con limites por cuantiles (NTILE en HANA, sirve
+# para numeros, textos y fechas) y cada rango se lee en su propia sesion HANA en
+# paralelo. Las filas se concatenan en el orden de los rangos: es el mismo
+# conjunto que la consulta entera (la huella no depende del orden).
+# Las sesiones salen del mismo cupo HANA_MAX_SESIONES que el resto del proceso.
+EXTRACCION_PARTICIONES = int(os.getenv("MIGRACION_EXTRACCION_PARTICIONES", "4"))
+# Por debajo de estas filas no vale la pena abrir mas sesiones: se lee entera.
+# Primero se cuenta (COUNT sin ordenar); el NTILE (recorrido + orden) solo se pide
+# cuando el extracto pasa este umbral.
+PARTICION_MIN_FILAS = int(os.getenv("MIGRACION_PARTICION_MIN_FILAS", "200000"))
+
+
+def _literal(valor) -> str:
+    if isinstance(valor, str):
+        return "'" + valor.replace("'", "''") + "'"
+    if isinstance(valor, datetime):
+        return f"'{valor:%Y-%m-%d %H:%M:%S}'"
+    if isinstance(valor, date):
+        return f"'{valor:%Y-%m-%d}'"
+    return str(valor)
+
+
+def consulta_limites(query: str, columna: str, particiones: int) -> str:
+    """Limite superior y filas de cada cuantil de `columna` (los NULL van aparte)."""
+    return f"""
+        SELECT MAX(R."{columna}"), COUNT(*)
+        FROM (
+            SELECT Q."{columna}", NTILE({particiones}) OVER (ORDER BY Q."{columna}") AS "TRAMO"
+            FROM ({query}) Q
+            WHERE Q."{columna}" IS NOT NULL
+        ) R
+        GROUP BY R."TRAMO"
+        ORDER BY R."TRAMO"
+    """
+
+
+def condiciones_rangos(columna: str, limites: list) -> list:
+    """
+    Condiciones que cubren toda la columna sin solaparse:
+    <= l1, (l1, l2], ..., > l(n-1) (el ultimo abierto: filas nuevas entre lecturas) e IS NULL.
+    """
+    limites = sorted(set(limites))[:-1]
+    col = f'Q."{columna}"'
+    condiciones, anterior = [], None
+    for limite in limites:
+        condicion = f"{col} <= {_literal(limite)}"
+        if anterior is not None:
+            condicion = f"{col} > {_literal(anterior)} AND {condicion}"
+        condiciones.append(condicion)
+        anterior = limite
+    condiciones.append(f"{col} > {_literal(anterior)}" if anterior is not None else f"{col} IS NOT NULL")
+    condiciones.append(f"{col} IS NULL")
+    return condiciones
+
+
+def _leer_rango(query: str, condicion: str):
+    """(filas o None, mediciones) de un rango en su propia sesion."""
+    with ConexionHANA(f"SELECT * FROM ({query}) Q WHERE {condicion}") as hana:
+        if not hana.db_estado:
+            return None, []
+        try:
+            return hana.obtener_tabla(), hana.metricas
+        except Exception as e:
+            logger.error(f"[PARTICIONES] Error leyendo el rango {condicion}: {e}")
+            return None, hana.metricas
+
+
+def extraer_particionado(query: str, columna: str, particiones: int = EXTRACCION_PARTICIONES,
+                         mediciones: list = None):
+    """
+    Filas de `query` leidas por rangos de `columna` en paralelo, o None si alguna lectura falla.
+    Las mediciones de transferencia de todas las sesiones se agregan a `mediciones`.
+    `columna` debe ser un nombre unico entre las columnas que devuelve la consulta.
+    """
+    mediciones = mediciones if mediciones is not None else []
+    inicio = time.perf_counter()
+    with ConexionHANA() as hana:
+        if not hana.db_estado:
+            logger.error("Conexion a SAP HANA fallida")
+            return None
+        conteo = hana.obtener_tablas({"FILAS": f"SELECT COUNT(*) FROM ({query}) Q"})["FILAS"]
+        cuantiles = None
+        if conteo and conteo[0][0] >= PARTICION_MIN_FILAS:
+            cuantiles = hana.obtener_tablas({"LIMITES": consulta_limites(query, columna, particiones)})["LIMITES"]
+        if not cuantiles:
+            # Pocas filas (o sin limites): se lee entera en esta misma sesion
+            registros = hana.obtener_tablas({"ENTERA": query})["ENTERA"]
+            mediciones.extend(hana.metricas)
+            return registros
+        mediciones.extend(hana.metricas)
+
+    condiciones = condiciones_rangos(columna, [limite for limite, _ in cuantiles])
+    hilos = max(1, min(len(condiciones), HANA_MAX_SESIONES))
+    with ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="rango_hana") as pool:
+        leidos = list(pool.map(lambda condicion: _leer_rango(query, condicion), condiciones))
+    registros = []
+    for filas, medidas in leidos:
+        mediciones.extend(medidas)
+        if filas is None:
+            return None
+        registros.extend(filas)
+    logger.info(f"[PARTICIONES] {len(registros)} filas en {len(condiciones)} rangos de {columna} "
+                f"({hilos} sesiones, {time.perf_counter() - inicio:.2f}s)")
+    return registros
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+
+from Conexion.conexion_hana import ConexionHANA
+from Config.conexion_config import CONFIG_HANA
+from Migrador.ventana import VentanaFechas
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# EXTRACTO OWTR COMPARTIDO POR DIA
+# ==========================================
+# Recepcion, traslados y organoleptico leen el mismo join ancho
+# OWTR/WTR1/OITL/ITL1/OBTN/OBTW/OITM del mismo dia. Aqui se lee UNA vez el
+# superconjunto (todas las sucursales, uniones del organoleptico, que son las mas
+# laxas) y cada migrador aplica en memoria sus uniones y su filtro de almacen.
+# La entrada vive EXTRACTO_OWTR_TTL segundos; 0 desactiva (cada modulo lee su consulta).
+EXTRACTO_OWTR_TTL = int(os.getenv("MIGRACION_EXTRACTO_OWTR_TTL", "300"))
+TABLAS_EXTRACTO_OWTR = ('RECEPCION', 'TRASLADOS', 'ORGANOLEPTICO')
+
+COLUMNAS_OWTR = """
+          OWTR."DocEntry", OWTR."DocNum", OWTR."DocDate", OWTR."Filler", OWTR."ToWhsCode", OWTR."U_SYP_MDTD", OWTR."U_SYP_MDSD",
+          OWTR."U_SYP_MDCD", OWTR."ObjType", OWTR."CardName", OWTR."U_BPP_FECINITRA",
+          WTR1."DocEntry", WTR1."LineNum", WTR1."ItemCode", WTR1."Dscription", WTR1."WhsCode", WTR1."ObjType",
+          OITL."LogEntry", OITL."ItemCode", OITL."DocEntry", OITL."DocLine", OITL."DocType", OITL."StockEff", OITL."LocCode",
+          ITL1."LogEntry", ITL1."ItemCode", ITL1."Quantity", ITL1."SysNumber", ITL1."MdAbsEntry",
+          OBTN."ItemCode", OBTN."DistNumber", OBTN."SysNumber", OBTN."AbsEntry", OBTN."MnfSerial", OBTN."ExpDate",
+          OBTW."ItemCode", OBTW."MdAbsEntry", OBTW."WhsCode", OBTW."Location", OBTW."AbsEntry",
+          OITM."ItemCode", OITM."ItemName", OITM."FrgnName", OITM."U_SYP_CONCENTRACION", OITM."U_SYP_FORPR", OITM."U_SYP_FFDET",
+          OITM."U_SYP_FABRICANTE"
+"""
+
+# Uniones de recepcion/traslados que el superconjunto no aplica:
+# (columna clave del nivel, columna a comparar, columna de WTR1, inicio de lo que se anula, clave del padre)
+_NIVELES_ESTRICTOS = (
+    (17, 18, 13, 17, (11, 12)),                          # OITL."ItemCode" = WTR1."ItemCode"
+    (24, 25, 13, 24, (11, 12, 17)),                      # ITL1."ItemCode" = WTR1."ItemCode"
+    (39, 37, 15, 35, (11, 12, 17, 24, 25, 27, 29, 30)),  # OBTW."WhsCode" = WTR1."WhsCode"
+)
+_FIN_LOTES = 40  # Despues de OBTW viene OITM, que solo depende de WTR1
+
+
+def consulta_owtr_dia(fecha) -> str:
+    esquema = CONFIG_HANA.get("schema", "SBO_SCHEMA")
+    return f"""
+        SELECT {COLUMNAS_OWTR}
+        FROM {esquema}.OWTR OWTR
+        INNER JOIN {esquema}.WTR1 WTR1 ON WTR1."DocEntry" = OWTR."DocEntry"
+        LEFT JOIN {esquema}.OITL OITL ON OITL."DocEntry" = OWTR."DocEntry" AND OITL."DocType" = OWTR."ObjType" AND OITL."DocLine" = WTR1."LineNum"
+        LEFT JOIN {esquema}.ITL1 ITL1 ON ITL1."LogEntry" = OITL."LogEntry"
+        LEFT JOIN {esquema}.OBTN OBTN ON OBTN."SysNumber" = ITL1."SysNumber" AND OBTN."ItemCode" = WTR1."ItemCode"
+        LEFT JOIN {esquema}.OBTW OBTW ON OBTW."ItemCode" = WTR1."ItemCode" AND OBTW."MdAbsEntry" = ITL1."MdAbsEntry"
+        LEFT JOIN {esquema}.OITM OITM ON OITM."ItemCode" = WTR1."ItemCode"
+        WHERE {VentanaFechas(fecha).condicion('OWTR."U_BPP_FECINITRA"')}
+          AND OWTR."CANCELED" = 'N'
+          AND OWTR."U_SYP_STATUS" = 'V'
+          AND OWTR."U_SYP_MDSD" IS NOT NULL
+          AND OWTR."U_SYP_MDCD" IS NOT NULL
+        """
+
+
+def uniones_estrictas(filas) -> list:
+    """
+    Convierte filas del superconjunto en las que daria el LEFT JOIN de recepcion/traslados.
+    Un hijo que no cumple la union extra se anula (con todo lo que cuelga de el) y la
+    fila anulada solo sobrevive si su padre no tiene ningun otro hijo valido.
+    """
+    filas = [list(f) for f in filas]
+    for clave, columna, columna_wtr1, inicio, padre in _NIVELES_ESTRICTOS:
+        for f in filas:
+            if f[clave] is not None and f[columna] != f[columna_wtr1]:
+                f[inicio:_FIN_LOTES] = [None] * (_FIN_LOTES - inicio)
+        con_hijo = {tuple(f[i] for i in padre) for f in filas if f[clave] is not None}
+        filas = [f for f in filas if f[clave] is not None or tuple(f[i] for i in padre) not in con_hijo]
+    return list(dict.fromkeys(tuple(f) for f in filas))
+
+
+def filtrar(filas, indice: int, valores) -> list:
+    """Filas cuyo almacen (columna `indice`) esta en `valores`."""
+    return [f for f in filas if str(f[indice]) in valores]
+
+
+class ExtractoOWTR:
+    """Cache de proceso {fecha: filas} con TTL. Una sola lectura HANA por fecha aunque pidan varios hilos."""
+
+    def __init__(self, ttl_segundos: int = EXTRACTO_OWTR_TTL):
+        self.ttl = ttl_segundos
+        self._datos = {}    # fecha -> (expira, filas, leido)
+        self._lectores = {}  # fecha -> Lock (el primero lee, los demas esperan)
+        self._lock = threading.Lock()
+        self.lecturas = 0
+        self.aciertos = 0
+
+    @property
+    def activo(self) -> bool:
+        return self.ttl > 0
+
+    def obtener(self, fecha, mediciones: list = None, forzar: bool = False):
+        """
+        Filas del dia (superconjunto). None si la lectura falla.
+        Si lee de HANA agrega sus mediciones de transferencia a `mediciones`.
+        Con `forzar` no sirve una entrada leida antes de la llamada (si una leida mientras
+        esperaba el candado: varios modulos forzados del mismo dia comparten una lectura).
+        No llamar con una sesion HANA tomada: la lectura abre su sesion DESPUES del candado
+        del dia. Con una sesion tomada esperando el candado, el hilo que lo tiene puede
+        quedar esperando un cupo de HANA_MAX_SESIONES (bloqueo mutuo).
+        """
+        dia = fecha.date() if hasattr(fecha, "date") else fecha
+        pedido = time.monotonic()
+        with self._lock:
+            self._podar(pedido)
+            lector = self._lectores.setdefault(dia, threading.Lock())
+        with lector:
+            with self._lock:
+                entrada = self._datos.get(dia)
+                if entrada and not (forzar and entrada[2] < pedido):
+                    self.aciertos += 1
+                    logger.info(f"[EXTRACTO OWTR] {dia}: {len(entrada[1])} filas desde la cache")
+                    return entrada[1]
+                self._datos.pop(dia, None)
+            filas = self._leer(dia, mediciones)
+            if filas is not None:
+                with self._lock:
+                    self.lecturas += 1
+                    leido = time.monotonic()
+                    self._datos[dia] = (leido + self.ttl, filas, leido)
+            return filas
+
+    def _podar(self, ahora):
+        """Quita las entradas vencidas y los candados de dias sin entrada que nadie tiene (con self._lock)."""
+        for d in [d for d, (expira, _, _) in self._datos.items() if expira <= ahora]:
+            del self._datos[d]
+        for d in [d for d, lector in self._lectores.items() if d not in self._datos and not lector.locked()]:
+            del self._lectores[d]
+
+    def _leer(self, dia, mediciones):
+        inicio = time.perf_counter()
+        try:
+            with ConexionHANA() as hana:
+                filas = hana.obtener_tablas({"OWTR": consulta_owtr_dia(dia)})["OWTR"] if hana.db_estado else None
+                if mediciones is not None:
+                    mediciones.extend(hana.metricas)
+        except Exception as e:
+            logger.error(f"[EXTRACTO OWTR] Error leyendo HANA ({dia}): {e}")
+            return None
+        if filas is not None:
+            logger.info(f"[EXTRACTO OWTR] {dia}: {len(filas)} filas leidas de HANA en {time.perf_counter() - inicio:.2f}s")
+        return filas
+
+    def invalidar(self, fecha=None):
+        with self._lock:
+            if fecha is None:
+                self._datos.clear()
+            else:
+                self._datos.pop(fecha.date() if hasattr(fecha, "date") else fecha, None)
+            self._podar(time.monotonic())
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {"dias": len(self._datos), "lecturas": self.lecturas, "aciertos": self.aciertos, "ttl": self.ttl}
+
+
+# Instancia unica del proceso (compartida por los tres migradores)
+extracto_owtr = ExtractoOWTR()
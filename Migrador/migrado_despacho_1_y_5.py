@@ -1,14 +1,13 @@
 import logging
 import sys
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from pydantic import BaseModel
 
-from Conexion.conexion_hana import ConexionHANA
-from Conexion.conexion_sql import ConexionSQL
-from Config.conexion_config import CONFIG_HANA
-from Procesamiento.Importador import Importador
 from Procesamiento.Importador_despacho import ImportadorDespacho
+from Migrador.multi_almacen import condicion_almacenes
+from Migrador.motor import EspecificacionTabla, MotorMigracion
+from Migrador.extraccion_normalizada import armar_plan
 
 # Configuración de logs
 LOG_DIR = "Logs"
@@ -24,26 +23,32 @@ class MigracionDespachoRequest(BaseModel):
     fecha: datetime
     almacen_id: str = "*"
 
-class MigradorDespacho:
-    def __init__(self, fecha: datetime, almacen_id: str):
-        self.fecha = datetime.strptime(fecha, "%Y-%m-%d") if isinstance(fecha, str) else fecha
-        self.almacen_id = almacen_id
-        self.importador_generico = Importador()
-        self.tablas_objetivo = ['DESPACHO', 'OWHS']
-        self.queries = self._construir_queries()
+class MigradorDespacho(MotorMigracion):
+    # Indice de U_COB_LUGAREN en la fila DESPACHO (reparto multi-almacen)
+    COLUMNAS_ALMACEN = {'DESPACHO': 12}
 
-    def _esquema(self, tabla):
-        return CONFIG_HANA.get("schema", "SBO_SCHEMA")
+    ESPECIFICACIONES = {
+        'DESPACHO': EspecificacionTabla(
+            ImportadorDespacho, orden=['OINV', 'INV1', 'IBT1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM'], normalizable=True),
+        # Maestro global: nunca se limpia (otros almacenes lo comparten)
+        'OWHS': EspecificacionTabla(),
+    }
 
-    def _construir_queries(self):
+    def _filtro_despacho(self):
+        """Filtro de las facturas del dia (alias OINV): lo usan el join ancho y la extraccion normalizada."""
         # FECHA EXACTA (Como en el C#)
-        fecha_fmt = self.fecha.strftime('%Y-%m-%d')
-
         # --- LOGICA REPLICADA DEL C# ---
         # El C# dice: COALESCE("U_BPP_FECINITRA" , "DocDate") = Fecha
         # Esto significa: Prioridad a Fecha Traslado, si es null, usa DocDate.
-        condicion_fecha_hana = f"AND COALESCE(OINV.\"U_BPP_FECINITRA\", OINV.\"DocDate\") = '{fecha_fmt}'"
+        # Se expresa como dos rangos sobre las columnas crudas (el COALESCE impide usar indices).
+        rango_traslado = self._rango_fecha_hana('OINV."U_BPP_FECINITRA"', self.fecha)
+        rango_documento = self._rango_fecha_hana('OINV."DocDate"', self.fecha)
+        condicion_fecha_hana = f"AND (({rango_traslado}) OR (OINV.\"U_BPP_FECINITRA\" IS NULL AND {rango_documento}))"
+        return f"""OINV."CANCELED" = 'N'
+            {condicion_fecha_hana}
+            AND {condicion_almacenes('OINV."U_COB_LUGAREN"', self.almacen_id)}"""
 
+    def _construir_queries(self):
         # --- QUERY BLINDADA ---
         consulta_despacho = f'''
             SELECT
@@ -75,128 +80,95 @@ class MigradorDespacho:
             LEFT JOIN {self._esquema("ITL1")}.ITL1 ITL1 ON ITL1."LogEntry" = OITL."LogEntry" AND ITL1."SysNumber" = OBTN."SysNumber"
             LEFT JOIN {self._esquema("OBTW")}.OBTW OBTW ON OBTW."ItemCode" = INV1."ItemCode" AND OBTW."MdAbsEntry" = ITL1."MdAbsEntry"
             INNER JOIN {self._esquema("OITM")}.OITM OITM ON OITM."ItemCode" = INV1."ItemCode"
-            WHERE OINV."CANCELED" = 'N'
-            {condicion_fecha_hana}
-            AND OINV."U_COB_LUGAREN" = '{self.almacen_id}'
+            WHERE {self._filtro_despacho()}
         '''
         
         consulta_owhs = f"SELECT \"WhsCode\", \"WhsName\", \"TaxOffice\" FROM {self._esquema('OWHS')}.OWHS"
         
         return {'DESPACHO': consulta_despacho, 'OWHS': consulta_owhs}
 
-    def _limpiar_sql_quirurgico(self, tabla_sql):
+    def _plan_normalizado(self) -> dict:
+        """
+        DESPACHO en modo normalizado: cada tabla por separado, filtrada en HANA por las
+        facturas del dia, y las mismas uniones (LEFT salvo INV1/OITM) aplicadas en memoria.
+        """
+        e = self._esquema("OINV")
+        facturas = f'SELECT OINV."DocEntry" FROM {e}.OINV OINV WHERE {self._filtro_despacho()}'
+        articulos = f'SELECT INV1."ItemCode" FROM {e}.INV1 INV1 WHERE INV1."DocEntry" IN ({facturas})'
+        filtro_ibt1 = (f'IBT1."Quantity" < 0 AND EXISTS (SELECT 1 FROM {e}.OINV OINV WHERE OINV."DocEntry" = IBT1."BaseEntry" '
+                       f'AND OINV."ObjType" = IBT1."BaseType" AND {self._filtro_despacho()})')
+        filtro_oitl = (f'OITL."StockEff" = 1 AND EXISTS (SELECT 1 FROM {e}.OINV OINV WHERE OINV."DocEntry" = OITL."DocEntry" '
+                       f'AND OINV."ObjType" = OITL."DocType" AND {self._filtro_despacho()})')
+        logs = f'SELECT OITL."LogEntry" FROM {e}.OITL OITL WHERE {filtro_oitl}'
+        tablas = [
+            ("OINV", None, ["DocEntry", "NumAtCard", ("U_SYP_NGUIA", 'COALESCE(OINV."U_SYP_NGUIA", \'\')'), "ObjType",
+                            "DocNum", "CardCode", "CardName", ("DocDate", 'TO_VARCHAR(OINV."DocDate", \'YYYY-MM-DD\')'),
+                            ("TaxDate", 'TO_VARCHAR(OINV."TaxDate", \'YYYY-MM-DD\')'), "U_SYP_MDTD", "U_SYP_MDSD",
+                            "U_SYP_MDCD", "U_COB_LUGAREN",
+                            ("U_BPP_FECINITRA", 'TO_VARCHAR(OINV."U_BPP_FECINITRA", \'YYYY-MM-DD\')')],
+             self._filtro_despacho(), []),
+            ("INV1", "inner", ["DocEntry", "ObjType", "WhsCode", "ItemCode", "LineNum", "Dscription", "UomCode",
+                               "BaseType", "BaseEntry"],
+             f'INV1."DocEntry" IN ({facturas})', [("DocEntry", "OINV", "DocEntry")]),
+            ("IBT1", "left", ["ItemCode", "BatchNum", "WhsCode", "BaseEntry", "BaseType", "BaseLinNum", "Quantity"],
+             filtro_ibt1,
+             [("BaseEntry", "INV1", "DocEntry"), ("BaseType", "INV1", "ObjType"), ("BaseLinNum", "INV1", "LineNum")]),
+            ("OBTN", "left", ["ItemCode", "DistNumber", "SysNumber", "AbsEntry", "MnfSerial", "ExpDate"],
+             f'OBTN."ItemCode" IN ({articulos}) AND OBTN."DistNumber" IN (SELECT IBT1."BatchNum" FROM {e}.IBT1 IBT1 WHERE {filtro_ibt1})',
+             [("ItemCode", "INV1", "ItemCode"), ("DistNumber", "IBT1", "BatchNum")]),
+            ("OITL", "left", ["LogEntry", "ItemCode", "DocEntry", "DocLine", "DocType", "StockEff", "LocCode"],
+             filtro_oitl,
+             [("DocEntry", "INV1", "DocEntry"), ("DocType", "INV1", "ObjType"), ("DocLine", "INV1", "LineNum")]),
+            ("ITL1", "left", ["LogEntry", "ItemCode", "Quantity", "SysNumber", "MdAbsEntry"],
+             f'ITL1."LogEntry" IN ({logs})',
+             [("LogEntry", "OITL", "LogEntry"), ("SysNumber", "OBTN", "SysNumber")]),
+            ("OBTW", "left", ["ItemCode", "MdAbsEntry", "WhsCode", "Location", "AbsEntry"],
+             f'OBTW."ItemCode" IN ({articulos}) AND OBTW."MdAbsEntry" IN (SELECT ITL1."MdAbsEntry" FROM {e}.ITL1 ITL1 WHERE ITL1."LogEntry" IN ({logs}))',
+             [("ItemCode", "INV1", "ItemCode"), ("MdAbsEntry", "ITL1", "MdAbsEntry")]),
+            ("OITM", "inner", ["ItemCode", "ItemName", "FrgnName", "U_SYP_CONCENTRACION", "U_SYP_FORPR",
+                               "U_SYP_FFDET", "U_SYP_FABRICANTE"],
+             f'OITM."ItemCode" IN ({articulos})', [("ItemCode", "INV1", "ItemCode")]),
+        ]
+        # Orden de columnas del join ancho (el que espera ImportadorDespacho)
+        return armar_plan(tablas, ["OINV", "INV1", "IBT1", "OBTN", "OBTW", "OITL", "ITL1", "OITM"], e)
+
+    def _alcance_limpieza(self, tabla_sql, registros=None):
         """
         Limpieza exacta usando la misma lógica del C#:
         Borramos registros donde COALESCE(FechaTraslado, DocDate) sea igual a la fecha procesada.
         """
-        if not self.almacen_id or self.almacen_id == "*": return True
-        
+        if not self.almacen_id or self.almacen_id == "*": return None
+        if tabla_sql != 'DESPACHO': return None
+
         fecha_fmt = self.fecha.strftime('%Y-%m-%d')
-        
+
         # TRADUCCION DE LOGICA C# A T-SQL (SQL SERVER)
         # ISNULL en T-SQL es equivalente a COALESCE/IFNULL
         condicion_fecha_sql = f"AND ISNULL(T_PADRE.U_BPP_FECINITRA, T_PADRE.DocDate) = '{fecha_fmt}'"
-        
         filtro = f"WHERE T_PADRE.U_COB_LUGAREN = '{self.almacen_id}' {condicion_fecha_sql}"
-
-        if tabla_sql == 'DESPACHO':
-            script = f"""
-            DELETE T1 FROM dbo.ITL1 T1 JOIN dbo.OITL T2 ON T1.LogEntry = T2.LogEntry JOIN dbo.OINV T_PADRE ON T2.DocEntry = T_PADRE.DocEntry AND T2.DocType = T_PADRE.ObjType {filtro};
-            DELETE T1 FROM dbo.OITL T1 JOIN dbo.OINV T_PADRE ON T1.DocEntry = T_PADRE.DocEntry AND T1.DocType = T_PADRE.ObjType {filtro};
-            DELETE T1 FROM dbo.IBT1 T1 JOIN dbo.OINV T_PADRE ON T1.BaseEntry = T_PADRE.DocEntry AND T1.BaseType = T_PADRE.ObjType {filtro};
-            DELETE T1 FROM dbo.INV1 T1 JOIN dbo.OINV T_PADRE ON T1.DocEntry = T_PADRE.DocEntry {filtro};
-            DELETE T_PADRE FROM dbo.OINV T_PADRE {filtro};
-            """
-            try:
-                with ConexionSQL() as sql:
-                    if sql.db_estado:
-                        sql.cursor.execute(script)
-                        sql.conexion.commit()
-                        logger.info(f"Limpieza exacta (Lógica C#) para Almacen {self.almacen_id} fecha {fecha_fmt} completada.")
-            except Exception as e:
-                logger.error(f"Error en limpieza segregada: {e}")
-        return True
-
-    def migracion_hana_sql(self, query, tabla_sql):
-        logger.info(f"--- 🚀 Iniciando migración: {tabla_sql} (Almacen: {self.almacen_id}) ---")
-        
-        self._limpiar_sql_quirurgico(tabla_sql)
-        
-        registros = []
-        with ConexionHANA(query) as hana:
-            if not hana.db_estado: 
-                logger.error("❌ No hay conexión con HANA")
-                return 0
-            registros = hana.obtener_tabla()
-            
-        if not registros:
-            logger.warning(f"⚠️ HANA devolvió 0 registros para {tabla_sql}. Revisa filtros.")
-            return 0
-        
-        # --- DIAGNOSTICO ---
-        if tabla_sql == 'DESPACHO':
+        return {
+            "descripcion": f"{tabla_sql} almacen {self.almacen_id} fecha {fecha_fmt}",
+            "seleccion": f"SELECT DISTINCT T_PADRE.DocEntry, T_PADRE.ObjType FROM dbo.OINV T_PADRE {filtro}",
+            "pasos": [
+                ('ITL1', "DELETE TOP (?) T1 FROM dbo.ITL1 T1 JOIN dbo.OITL T2 ON T1.LogEntry = T2.LogEntry "
+                         "JOIN #BORRADO B ON T2.DocEntry = B.DocEntry AND T2.DocType = B.ObjType"),
+                ('OITL', "DELETE TOP (?) T1 FROM dbo.OITL T1 JOIN #BORRADO B ON T1.DocEntry = B.DocEntry AND T1.DocType = B.ObjType"),
+                ('IBT1', "DELETE TOP (?) T1 FROM dbo.IBT1 T1 JOIN #BORRADO B ON T1.BaseEntry = B.DocEntry AND T1.BaseType = B.ObjType"),
+                ('INV1', "DELETE TOP (?) T1 FROM dbo.INV1 T1 JOIN #BORRADO B ON T1.DocEntry = B.DocEntry"),
+                ('OINV', "DELETE TOP (?) T_PADRE FROM dbo.OINV T_PADRE JOIN #BORRADO B ON T_PADRE.DocEntry = B.DocEntry"),
+            ],
+        }
+
+    def _diagnosticar(self, tabla_sql, registros):
+        # Antes de pasar a tuplas, que pierden los nombres de columna
+        if tabla_sql == 'DESPACHO' and registros:
             r_test = registros[0]
             val_guia = getattr(r_test, 'U_SYP_NGUIA', 'NO_EXISTE')
             val_fecha = getattr(r_test, 'U_BPP_FECINITRA', 'NO_EXISTE')
             logger.info(f"🔍 [MUESTRA] Guía: '{val_guia}' | Fecha: '{val_fecha}'")
-        # -------------------
-
-        logger.info(f"✅ HANA trajo {len(registros)} registros. Procesando...")
-
-        exitos = 0
-        errores_count = 0
-        
-        with ConexionSQL() as sql:
-            if not sql.db_estado: 
-                logger.error("❌ No hay conexión con SQL Server")
-                return 0
-            
-            if tabla_sql == 'DESPACHO':
-                imp = ImportadorDespacho()
-                try:
-                    for f in registros: imp.procesar_fila(f)
-                except Exception as e:
-                    logger.error(f"❌ Error transformando: {e}")
-                    return 0
-
-                tablas_ordenadas = ['OINV', 'INV1', 'IBT1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM']
-                
-                for t in tablas_ordenadas:
-                    bloques = imp.obtener_bloques(t)
-                    if not bloques: continue
-                    
-                    # Log visual OINV
-                    if t == 'OINV':
-                        print(f"👀 INSERT OINV: {bloques[0][:150]}...")
-
-                    for bloque in bloques:
-                        try:
-                            if not bloque.strip(): continue
-                            sql.cursor.execute(bloque)
-                            exitos += 1
-                        except Exception as e:
-                            if 'PRIMARY KEY' not in str(e):
-                                errores_count += 1
-                                logger.error(f"❌ Error {t}: {e}")
-
-            else:
-                self.importador_generico.query_sql = []
-                for f in registros: self.importador_generico.query_transaccion(f, tabla_sql)
-                bloques = self.importador_generico.obtener_query_final()
-                for bloque in bloques:
-                    try: 
-                        sql.cursor.execute(bloque)
-                        exitos += 1
-                    except Exception as e: 
-                        errores_count += 1
-
-            if exitos > 0:
-                sql.conexion.commit()
-                logger.info("💾 Commit realizado.")
-            else:
-                logger.warning("⚠️ No hubo inserciones.")
-
-        return {"registros_hana": len(registros), "insertados_sql": exitos, "errores": errores_count}
 
-    def migrar_todas(self) -> list:
-        return [{"tabla": t, "registros": self.migracion_hana_sql(self.queries[t], t)} for t in self.tablas_objetivo]
\ No newline at end of file
+    def _resumen_tabla(self, tabla_sql, total, exitos=0, rechazadas=0, importador=None):
+        resumen = {"registros_hana": total, "insertados_sql": exitos, "errores": rechazadas}  # Rechazos de esta sesion
+        if importador is not None:
+            resumen["maestros_existentes"] = importador.omitidos_existentes
+        return resumen
@@ -2,10 +2,13 @@ import logging
 import sys
 import os
 from datetime import datetime, timedelta
-from Conexion.conexion_hana import ConexionHANA
+from Migrador.borrado_lotes import borrar_por_lotes
+from Migrador.motor import EspecificacionTabla, MotorMigracion
+from Migrador.estrategia_commit import ESTRATEGIA_COMMIT
+from Migrador.snapshots import SNAPSHOT_MODO
+from Migrador.sincronizacion import TABLAS_SINCRONIZABLES, sincronizar_tabla
+from Conexion.diagnostico_hana import acumular_transferencia
 from Conexion.conexion_sql import ConexionSQL
-from Procesamiento.Importador import Importador
-from Config.conexion_config import CONFIG_HANA
 
 # ==========================================
 # CONFIGURACION DE LOGS
@@ -27,37 +30,69 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
-class Migrador:
-    def __init__(self, fecha_str):
-        # Manejo flexible de fecha (string o datetime)
-        if isinstance(fecha_str, str):
-            self.fecha = datetime.strptime(fecha_str, "%Y-%m-%d")
-        else:
-            self.fecha = fecha_str
+def _general(tabla, por_dia=False, particion=None):
+    # Tabla suelta con el Importador generico. La limpieza borra filas de la tabla (la cache
+    # de maestros no sirve en esta corrida); en un maestro un extracto vacio no toca nada.
+    # Las tablas por dia necesitan el extracto para limpiar, tambien al reanudar, y un dia
+    # vacio en HANA vacia tambien el dia en SQL Server.
+    return EspecificacionTabla(invalidar=(tabla,), limpiar_vacio=por_dia, limpia_con_extracto=por_dia,
+                               particion=particion)
 
-        # Definir rango del día completo
-        self.fecha_inicio = self.fecha.replace(hour=0, minute=0, second=0)
-        self.fecha_fin = self.fecha_inicio + timedelta(days=1) - timedelta(seconds=1)
-        
-        self.importador = Importador()
-        
-        # Lista de tablas a migrar en orden
-        self.tablas_objetivo = [
-            'OITM', 'OBTW', 'OBTN', 'OWHS', 
-            'OINV', 'INV1', 
-            'ODLN', 'DLN1', 
-            'OWTR', 'WTR1', 
-            'OITL', 'ITL1', 
-            'IBT1'
-        ]
-        self.queries = self._construir_queries()
 
-    def _esquema(self, tabla):
-        return CONFIG_HANA["schema"]
+class Migrador(MotorMigracion):
+    # Tablas filtradas por dia en HANA: en vez de TRUNCATE se borran los documentos del
+    # extracto y los del dia (CABECERAS_POR_DIA). (indice de la clave en la fila HANA, indice del tipo o None, JOIN con #BORRADO)
+    # Las demas (OITM, OBTW, OBTN, OWHS) son maestros completos y se truncan.
+    REEMPLAZO_POR_DIA = {
+        'OINV': (0, None, "T.DocEntry = B.DocEntry"),
+        'INV1': (0, None, "T.DocEntry = B.DocEntry"),
+        'ODLN': (0, None, "T.DocEntry = B.DocEntry"),
+        'DLN1': (0, None, "T.DocEntry = B.DocEntry"),
+        'OWTR': (0, None, "T.DocEntry = B.DocEntry"),
+        'WTR1': (0, None, "T.DocEntry = B.DocEntry"),
+        'OITL': (0, None, "T.LogEntry = B.DocEntry"),
+        'ITL1': (0, None, "T.LogEntry = B.DocEntry"),
+        'IBT1': (3, 4, "T.BaseEntry = B.DocEntry AND T.BaseType = B.Tipo"),
+    }
+    # Cabeceras con DocDate en dbo: el dia se borra por fecha, asi salen tambien los documentos
+    # anulados o eliminados en HANA. El filtro repite el de la consulta HANA sobre columnas
+    # cargadas (recepcion, traslados y ventas escriben las mismas tablas).
+    # Las lineas se borran por las claves de esas cabeceras mas las del extracto.
+    # (tabla de lineas, ObjType, filtro en SQL Server)
+    CABECERAS_POR_DIA = {
+        'OINV': ('INV1', '13', ()),
+        'ODLN': ('DLN1', '15', ("U_COB_LUGAREN IN ('15', '16')", "CardCode <> 'C20611448971'")),
+        'OWTR': ('WTR1', '67', ("Filler IN ('15', '16')", "ToWhsCode IN ('01', '09', 'ALM07')",
+                                "U_SYP_MDSD IS NOT NULL", "U_SYP_MDCD IS NOT NULL")),
+    }
+
+    # Tablas a migrar, en orden
+    ESPECIFICACIONES = {
+        # Maestros completos (sin filtro de fecha): se leen por rangos de su clave en paralelo
+        'OITM': _general('OITM', particion='ItemCode'), 'OBTW': _general('OBTW', particion='AbsEntry'),
+        'OBTN': _general('OBTN', particion='AbsEntry'), 'OWHS': _general('OWHS'),
+        'OINV': _general('OINV', por_dia=True), 'INV1': _general('INV1', por_dia=True),
+        'ODLN': _general('ODLN', por_dia=True), 'DLN1': _general('DLN1', por_dia=True),
+        'OWTR': _general('OWTR', por_dia=True), 'WTR1': _general('WTR1', por_dia=True),
+        'OITL': _general('OITL', por_dia=True), 'ITL1': _general('ITL1', por_dia=True),
+        'IBT1': _general('IBT1', por_dia=True),
+    }
+    PREFIJO_MODULO = "GENERAL_"
+    EXTRAER_JUNTAS = False   # Cada tabla lee su consulta (/api/importar/ migra tablas sueltas)
+    TOLERAR_ERRORES = True   # Una tabla que falla no corta las demas
+
+    def __init__(self, fecha_str, forzar=False, reanudar=False, progreso=None, snapshot=SNAPSHOT_MODO,
+                 estrategia_commit=ESTRATEGIA_COMMIT, sincronizar=False):
+        # Manejo flexible de fecha (string o datetime)
+        fecha = datetime.strptime(fecha_str, "%Y-%m-%d") if isinstance(fecha_str, str) else fecha_str
 
-    def _formato_fecha_hana(self, columna):
-        # Usamos TO_VARCHAR estándar de HANA
-        return f"TO_VARCHAR({columna}, 'YYYY-MM-DD')"
+        # Definir rango del día completo (lo usan las consultas)
+        self.fecha_inicio = fecha.replace(hour=0, minute=0, second=0)
+        self.fecha_fin = self.fecha_inicio + timedelta(days=1) - timedelta(seconds=1)
+        super().__init__(fecha, "*", forzar=forzar, reanudar=reanudar, progreso=progreso, snapshot=snapshot,
+                         estrategia_commit=estrategia_commit)
+        self.sincronizar = sincronizar  # OBTW/OWHS: comparar hashes por rangos en vez de recargar (ver sincronizacion)
+        self.sincronizaciones = {}      # tabla -> resumen de la sincronizacion
 
     def _construir_queries(self):
         fecha_fmt = self.fecha.strftime("%Y-%m-%d")
@@ -185,86 +220,121 @@ class Migrador:
             '''
         }
 
-    def migracion_hana_sql(self, query: str, tabla_sql: str) -> int:
-        logger.info(f"Procesando tabla: {tabla_sql}...")
-        try:
-            # 1. Obtener datos de HANA
-            with ConexionHANA(query) as hana:
-                if not hana.db_estado:
-                    logger.error("Conexión a SAP HANA fallida")
-                    return 0
-                registros = hana.obtener_tabla()
-                total = len(registros)
-                logger.info(f"Registros extraídos de HANA para {tabla_sql}: {total}")
-
-                if not registros:
-                    logger.warning(f"No hay registros en HANA para {tabla_sql}")
-                    return 0
-
-                # 2. Generar inserts (Bloques)
-                # Reiniciamos el importador para limpiar queries anteriores
-                self.importador = Importador()
-                
-                for i, fila in enumerate(registros, 1):
-                    self.importador.query_transaccion(fila, tabla_sql)
-                    if i % 1000 == 0:
-                        logger.info(f"Generando SQL... {i}/{total}")
+    def _documentos_del_dia(self, tabla_sql: str):
+        """(SELECT de los DocEntry del dia en la cabecera, lineas, ObjType) de una cabecera o sus lineas; None si no tiene."""
+        for cabecera, (lineas, tipo, filtro) in self.CABECERAS_POR_DIA.items():
+            if tabla_sql in (cabecera, lineas):
+                hasta = self.fecha_inicio + timedelta(days=1)
+                condiciones = [f"C.DocDate >= '{self.fecha_inicio:%Y%m%d}'", f"C.DocDate < '{hasta:%Y%m%d}'"]
+                condiciones += [f"C.{f}" for f in filtro]
+                return f"SELECT C.DocEntry FROM dbo.{cabecera} C WHERE {' AND '.join(condiciones)}", lineas, tipo
+        return None
 
-                # 3. Insertar en SQL Server
-                with ConexionSQL() as sql:
-                    if not sql.db_estado:
-                        logger.error("Conexión a SQL Server fallida")
-                        return 0
-                    cursor = sql.cursor
+    def _borrar_retirados(self, sql, descripcion: str, documentos: str, lineas: str, tipo: str, confirmar: bool):
+        """Documentos del dia en SQL Server que ya no trae HANA: se borran sus lineas y lotes."""
+        borrar_por_lotes(
+            sql, f"{descripcion} retirados",
+            f"SELECT D.DocEntry FROM ({documentos}) D WHERE NOT EXISTS (SELECT 1 FROM #CLAVES_DIA K WHERE K.Clave = D.DocEntry)",
+            [
+                (lineas, f"DELETE TOP (?) T FROM dbo.{lineas} T JOIN #BORRADO B ON T.DocEntry = B.DocEntry"),
+                ('IBT1', f"DELETE TOP (?) T FROM dbo.IBT1 T JOIN #BORRADO B ON T.BaseEntry = B.DocEntry AND T.BaseType = '{tipo}'"),
+                ('ITL1', f"DELETE TOP (?) T FROM dbo.ITL1 T JOIN dbo.OITL L ON L.LogEntry = T.LogEntry "
+                         f"JOIN #BORRADO B ON L.DocEntry = B.DocEntry AND L.DocType = '{tipo}'"),
+                ('OITL', f"DELETE TOP (?) T FROM dbo.OITL T JOIN #BORRADO B ON T.DocEntry = B.DocEntry AND T.DocType = '{tipo}'"),
+            ],
+            confirmar=confirmar
+        )
 
-                    # A. Truncar
-                    try:
-                        cursor.execute(f"TRUNCATE TABLE dbo.{tabla_sql}")
-                        logger.info(f"Tabla dbo.{tabla_sql} truncada.")
-                    except Exception as e:
-                        logger.warning(f"No se pudo truncar dbo.{tabla_sql}: {e}")
+    def _borrar_dia(self, sql, tabla_sql: str, registros, confirmar: bool = False):
+        """
+        Reemplazo por dia: borra por lotes los documentos del extracto y, en cabeceras con
+        DocDate y sus lineas, todos los del dia en SQL Server (aunque el extracto venga vacio).
+        Los lotes (OITL, ITL1, IBT1) no tienen fecha en SQL Server: se borran por el extracto y,
+        los de documentos retirados, al limpiar su cabecera.
+        """
+        indice_clave, indice_tipo, union = self.REEMPLAZO_POR_DIA[tabla_sql]
+        claves = {(fila[indice_clave], None if indice_tipo is None else str(fila[indice_tipo])) for fila in registros}
+        cursor = sql.cursor
+        cursor.execute("IF OBJECT_ID('tempdb..#CLAVES_DIA') IS NOT NULL DROP TABLE #CLAVES_DIA")
+        cursor.execute("CREATE TABLE #CLAVES_DIA (Clave INT NOT NULL, Tipo NVARCHAR(20) NULL)")
+        if claves:
+            cursor.fast_executemany = True
+            cursor.executemany("INSERT INTO #CLAVES_DIA (Clave, Tipo) VALUES (?, ?)", list(claves))
+            cursor.fast_executemany = False
+        descripcion = f"GENERAL {tabla_sql} {self.fecha.strftime('%Y-%m-%d')}"
+        seleccion = "SELECT DISTINCT Clave AS DocEntry, Tipo FROM #CLAVES_DIA"
+        del_dia = self._documentos_del_dia(tabla_sql)
+        if del_dia:
+            documentos, lineas, tipo = del_dia
+            if tabla_sql != lineas:
+                self._borrar_retirados(sql, descripcion, documentos, lineas, tipo, confirmar)
+            seleccion += f" UNION SELECT D.DocEntry, NULL FROM ({documentos}) D"
+        resumen = borrar_por_lotes(
+            sql, descripcion, seleccion,
+            [(tabla_sql, f"DELETE TOP (?) T FROM dbo.{tabla_sql} T JOIN #BORRADO B ON {union}")],
+            confirmar=confirmar
+        )
+        cursor.execute("DROP TABLE #CLAVES_DIA")
+        if confirmar: sql.conexion.commit()
+        return resumen
 
-                    # B. Insertar bloques
-                    bloques = self.importador.query_sql
-                    errores_bloques = 0
-                    
-                    for j, bloque in enumerate(bloques, 1):
-                        if not bloque.strip(): continue
-                        try:
-                            cursor.execute(bloque)
-                        except Exception as e:
-                            errores_bloques += 1
-                            logger.error(f"Error en bloque {j} de {tabla_sql}: {e}")
-                            # logger.debug(f"Bloque: {bloque[:100]}...")
+    def _limpiar_sql_previo(self, tabla_sql: str, sql=None, registros=None, confirmar=None) -> bool:
+        """
+        Reemplazo del dia (tablas por fecha) o TRUNCATE (maestros). Con `confirmar` cada
+        lote se confirma; sin el queda en la transaccion de quien llama.
+        """
+        if sql is None:
+            with ConexionSQL() as propia:
+                return propia.db_estado and self._limpiar_sql_previo(tabla_sql, propia, registros, True)
+        if tabla_sql in self.REEMPLAZO_POR_DIA:
+            if registros is None:
+                logger.error(f"{tabla_sql}: sin el extracto no se puede limpiar el dia, reintente sin reanudar")
+                return False
+            self._borrar_dia(sql, tabla_sql, registros, bool(confirmar))
+            return True
+        try:
+            sql.cursor.execute(f"TRUNCATE TABLE dbo.{tabla_sql}")
+            if confirmar: sql.conexion.commit()
+            logger.info(f"Tabla dbo.{tabla_sql} truncada.")
+        except Exception as e:
+            logger.warning(f"No se pudo truncar dbo.{tabla_sql}: {e}")
+        return True
 
-                    # C. Commit
-                    sql.conexion.commit()
-                    
-                    if errores_bloques > 0:
-                        logger.warning(f"Migración {tabla_sql} completada con {errores_bloques} bloques fallidos.")
-                    else:
-                        logger.info(f"Migración {tabla_sql} completada exitosamente.")
-                    
-                    return total
+    def migracion_hana_sql(self, query: str, tabla_sql: str, registros=None):
+        if self.sincronizar and tabla_sql in TABLAS_SINCRONIZABLES:
+            return self._sincronizar_tabla(tabla_sql)
+        return super().migracion_hana_sql(query, tabla_sql, registros)
 
+    def _sincronizar_tabla(self, tabla_sql: str) -> int:
+        """Sincroniza la tabla por hashes de rangos. Devuelve las filas enviadas a SQL Server."""
+        logger.info(f"--- Sincronizando: {tabla_sql} (hash por rangos) ---")
+        medidas = []
+        try:
+            resumen = sincronizar_tabla(tabla_sql, origen=f"GENERAL_{tabla_sql}_{self.fecha:%Y-%m-%d}_SYNC",
+                                        mediciones=medidas)
         except Exception as e:
-            logger.critical(f"Error general migrando {tabla_sql}: {e}", exc_info=True)
+            logger.critical(f"Error sincronizando {tabla_sql}: {e}", exc_info=True)
             return 0
+        finally:
+            acumular_transferencia(self.transferencia, tabla_sql, medidas)
+        self.sincronizaciones[tabla_sql] = resumen
+        self.estado[tabla_sql] = "synced" if resumen["insertadas"] or resumen["borradas"] else "unchanged"
+        self._avisar(tabla_sql, self.estado[tabla_sql], hechos=resumen["insertadas"], total=resumen["insertadas"])
+        return resumen["insertadas"]
 
-    def migrar_todas(self) -> list:
-        """
-        Ejecuta la migración de todas las tablas en orden.
-        """
-        resultados = []
-        for tabla in self.tablas_objetivo:
-            if tabla in self.queries:
-                cantidad = self.migracion_hana_sql(self.queries[tabla], tabla)
-                resultados.append({
-                    "tabla": tabla,
-                    "registros": cantidad,
-                    "exito": cantidad > 0 or cantidad == 0 # Éxito técnico
-                })
-            else:
-                logger.error(f"Query no definida para la tabla {tabla}")
-        
-        return resultados
\ No newline at end of file
+    def _resultado(self, tabla: str, cantidad) -> dict:
+        resultado = super()._resultado(tabla, cantidad)
+        if tabla in self.sincronizaciones:
+            resultado["sincronizacion"] = self.sincronizaciones[tabla]
+        return resultado
+
+    def migrar_tabla(self, tabla: str) -> str:
+        """Migra una sola tabla (usado por /api/importar/)."""
+        if tabla not in self.queries:
+            raise ValueError(f"Query no definida para la tabla {tabla}")
+        cantidad = self.migracion_hana_sql(self.queries[tabla], tabla)
+        if self.estado.get(tabla) == "unchanged":
+            return f"{tabla}: sin cambios ({cantidad} registros)"
+        if self.estado.get(tabla) == "error":
+            return f"{tabla}: error, no se migro (ver log)"
+        return f"{tabla}: {cantidad} registros migrados"
@@ -4,12 +4,11 @@ import os
 from datetime import datetime
 from pydantic import BaseModel
 
-# Imports de conexion y procesamiento
-from Conexion.conexion_hana import ConexionHANA
-from Conexion.conexion_sql import ConexionSQL
-from Config.conexion_config import CONFIG_HANA
-from Procesamiento.Importador import Importador
+# Imports de migrador y procesamiento
 from Procesamiento.Importador_organoleptico import ImportadorOrganoleptico
+from Migrador.multi_almacen import condicion_almacenes
+from Migrador.motor import EspecificacionTabla, MotorMigracion
+from Migrador.extracto_owtr import filtrar
 
 # Configuracion de logs
 LOG_DIR = "Logs"
@@ -28,22 +27,22 @@ class MigracionOrganolepticoRequest(BaseModel):
     fecha: datetime
     almacen_id: str = "*"
 
-class MigradorOrganoleptico:
-    def __init__(self, fecha: datetime, almacen_id: str):
-        self.fecha = datetime.strptime(fecha, "%Y-%m-%d") if isinstance(fecha, str) else fecha
-        self.almacen_id = almacen_id
-        self.importador_generico = Importador()
-        self.tablas_objetivo = ['ORGANOLEPTICO', 'OWHS']
-        self.queries = self._construir_queries()
+class MigradorOrganoleptico(MotorMigracion):
+    # Indice de ToWhsCode en la fila ORGANOLEPTICO (reparto multi-almacen)
+    COLUMNAS_ALMACEN = {'ORGANOLEPTICO': 4}
 
-    def _esquema(self, tabla):
-        return CONFIG_HANA.get("schema", "SBO_SCHEMA")
+    ESPECIFICACIONES = {
+        # Ejecutamos en orden de jerarquia (Cabecera primero, detalles despues)
+        'ORGANOLEPTICO': EspecificacionTabla(
+            ImportadorOrganoleptico, orden=['OWTR', 'WTR1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM'], extracto_owtr=True),
+        # Maestro global: nunca se limpia (otros almacenes lo comparten)
+        'OWHS': EspecificacionTabla(),
+    }
 
     def _construir_queries(self):
-        fecha_str = self.fecha.strftime('%Y-%m-%d')
         # Filtro de Identidad: Identifica que la fila es de Organoleptico y no un traslado comun
         filtro_modulo = "AND OWTR.\"U_SYP_MDSD\" IS NOT NULL AND OWTR.\"U_SYP_MDCD\" IS NOT NULL"
-        condicion_almacen = f"AND OWTR.\"ToWhsCode\" = '{self.almacen_id}'" if self.almacen_id != "*" else ""
+        condicion_almacen = "AND " + condicion_almacenes('OWTR."ToWhsCode"', self.almacen_id) if self.almacen_id != "*" else ""
         
         consulta = f"""
         SELECT OWTR."DocEntry", OWTR."DocNum", OWTR."DocDate", OWTR."Filler", OWTR."ToWhsCode", OWTR."U_SYP_MDTD", OWTR."U_SYP_MDSD", 
@@ -62,7 +61,7 @@ class MigradorOrganoleptico:
         LEFT JOIN {self._esquema("OBTN")}.OBTN OBTN ON OBTN."SysNumber" = ITL1."SysNumber" AND OBTN."ItemCode" = WTR1."ItemCode"
         LEFT JOIN {self._esquema("OBTW")}.OBTW OBTW ON OBTW."ItemCode" = WTR1."ItemCode" AND OBTW."MdAbsEntry" = ITL1."MdAbsEntry"
         LEFT JOIN {self._esquema("OITM")}.OITM OITM ON OITM."ItemCode" = WTR1."ItemCode"
-        WHERE TO_VARCHAR(OWTR."U_BPP_FECINITRA", 'YYYY-MM-DD') = '{fecha_str}'
+        WHERE {self._rango_fecha_hana('OWTR."U_BPP_FECINITRA"', self.fecha)}
           AND OWTR."CANCELED" = 'N' AND OWTR."U_SYP_STATUS" = 'V'
           {filtro_modulo} {condicion_almacen}
         """
@@ -71,85 +70,28 @@ class MigradorOrganoleptico:
             'OWHS': f"SELECT \"WhsCode\", \"WhsName\", \"TaxOffice\" FROM {self._esquema('OWHS')}.OWHS"
         }
 
-    def _limpiar_sql_quirurgico(self, tabla_sql):
+    def _alcance_limpieza(self, tabla_sql, registros=None):
         """Borra solo los datos del almacen actual y del modulo especifico para evitar cruces."""
-        if not self.almacen_id or self.almacen_id == "*": return True
+        if not self.almacen_id or self.almacen_id == "*": return None
+        if tabla_sql != 'ORGANOLEPTICO': return None
 
         # Este filtro garantiza que NO borraremos datos de otros almacenes o de otros modulos (como Traslados simples)
         filtro_identidad = "AND T_PADRE.U_SYP_MDSD IS NOT NULL AND T_PADRE.U_SYP_MDCD IS NOT NULL AND T_PADRE.CANCELED = 'N'"
         filtro_almacen = f"WHERE T_PADRE.ToWhsCode = '{self.almacen_id}'"
+        return {
+            "descripcion": f"{tabla_sql} almacen {self.almacen_id}",
+            "seleccion": f"SELECT DISTINCT T_PADRE.DocEntry, T_PADRE.ObjType FROM dbo.OWTR T_PADRE {filtro_almacen} {filtro_identidad}",
+            "pasos": [
+                ('ITL1', "DELETE TOP (?) T1 FROM dbo.ITL1 T1 JOIN dbo.OITL T2 ON T1.LogEntry = T2.LogEntry "
+                         "JOIN #BORRADO B ON T2.DocEntry = B.DocEntry AND T2.DocType = B.ObjType"),
+                ('OITL', "DELETE TOP (?) T1 FROM dbo.OITL T1 JOIN #BORRADO B ON T1.DocEntry = B.DocEntry AND T1.DocType = B.ObjType"),
+                ('WTR1', "DELETE TOP (?) T1 FROM dbo.WTR1 T1 JOIN #BORRADO B ON T1.DocEntry = B.DocEntry"),
+                ('OWTR', "DELETE TOP (?) T_PADRE FROM dbo.OWTR T_PADRE JOIN #BORRADO B ON T_PADRE.DocEntry = B.DocEntry"),
+            ],
+        }
 
-        if tabla_sql == 'ORGANOLEPTICO':
-            script = f"""
-            DELETE T1 FROM dbo.ITL1 T1 
-            JOIN dbo.OITL T2 ON T1.LogEntry = T2.LogEntry 
-            JOIN dbo.OWTR T_PADRE ON T2.DocEntry = T_PADRE.DocEntry AND T2.DocType = T_PADRE.ObjType
-            {filtro_almacen} {filtro_identidad};
-
-            DELETE T1 FROM dbo.OITL T1 
-            JOIN dbo.OWTR T_PADRE ON T1.DocEntry = T_PADRE.DocEntry AND T1.DocType = T_PADRE.ObjType
-            {filtro_almacen} {filtro_identidad};
-
-            DELETE T1 FROM dbo.WTR1 T1 
-            JOIN dbo.OWTR T_PADRE ON T1.DocEntry = T_PADRE.DocEntry
-            {filtro_almacen} {filtro_identidad};
-
-            DELETE T_PADRE FROM dbo.OWTR T_PADRE 
-            {filtro_almacen} {filtro_identidad};
-            """
-            try:
-                with ConexionSQL() as sql:
-                    if sql.db_estado:
-                        sql.cursor.execute(script)
-                        sql.conexion.commit()
-                        logger.info(f"Limpieza quirúrgica para Almacen {self.almacen_id} completada.")
-            except Exception as e:
-                logger.error(f"Error en limpieza blindada: {e}")
-        return True
-
-    def migracion_hana_sql(self, query, tabla_sql):
-        logger.info(f"--- Procesando: {tabla_sql} (Almacen: {self.almacen_id}) ---")
-        
-        # 1. Limpieza segura antes de procesar
-        self._limpiar_sql_quirurgico(tabla_sql)
-
-        # 2. Obtencion de datos desde HANA
-        with ConexionHANA(query) as hana:
-            if not hana.db_estado: return 0
-            registros = hana.obtener_tabla()
-            if not registros: return 0
-        
-        # 3. Procesamiento e Insercion en SQL Server
-        exitos, errores = 0, {}
-        with ConexionSQL() as sql:
-            if not sql.db_estado: return 0
-            
-            if tabla_sql == 'ORGANOLEPTICO':
-                imp = ImportadorOrganoleptico()
-                for f in registros: imp.procesar_fila(f)
-                # Ejecutamos en orden de jerarquia (Cabecera primero, detalles despues)
-                orden_tablas = ['OWTR', 'WTR1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM']
-                for t in orden_tablas:
-                    for bloque in imp.obtener_bloques(t):
-                        try:
-                            sql.cursor.execute(bloque); exitos += 1
-                        except Exception as e:
-                            msg = str(e)
-                            # Ignoramos errores de duplicados en maestros (Articulos compartidos entre almacenes)
-                            if not ('PRIMARY KEY' in msg or '2627' in msg):
-                                errores[msg] = errores.get(msg, 0) + 1
-            else:
-                # Logica para tablas maestras globales como OWHS
-                self.importador_generico.query_sql, self.importador_generico.bloque_actual = [], []
-                for f in registros: self.importador_generico.query_transaccion(f, tabla_sql)
-                for bloque in self.importador_generico.obtener_query_final():
-                    try: sql.cursor.execute(bloque); exitos += 1
-                    except Exception as e: errores[str(e)] = errores.get(str(e), 0) + 1
-            
-            sql.conexion.commit()
-
-        logger.info(f"[OK] {tabla_sql}: {exitos} bloques procesados correctamente.")
-        return len(registros)
-
-    def migrar_todas(self) -> list:
-        return [{"tabla": t, "registros": self.migracion_hana_sql(self.queries[t], t)} for t in self.tablas_objetivo]
\ No newline at end of file
+    def _del_extracto_dia(self, filas):
+        """ORGANOLEPTICO desde el extracto OWTR compartido (mismas uniones): solo el almacen destino."""
+        if self.almacen_id == "*": return list(filas)
+        almacenes = self.almacen_id if isinstance(self.almacen_id, list) else [self.almacen_id]
+        return filtrar(filas, 4, set(almacenes))
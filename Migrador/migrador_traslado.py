@@ -4,13 +4,12 @@ import os
 from datetime import datetime
 from pydantic import BaseModel
 
-# Imports de Conexion y Config
-from Conexion.conexion_hana import ConexionHANA
-from Conexion.conexion_sql import ConexionSQL
-from Config.conexion_config import CONFIG_HANA
+# Imports de Migrador
+from Migrador.multi_almacen import condicion_almacenes
+from Migrador.motor import EspecificacionTabla, MotorMigracion
+from Migrador.extracto_owtr import filtrar, uniones_estrictas
 
 # Imports de Procesamiento
-from Procesamiento.Importador import Importador
 from Procesamiento.Importador_traslado import ImportadorTraslado
 
 # ==========================================
@@ -36,32 +35,37 @@ class MigracionTrasladoRequest(BaseModel):
     fecha: datetime
     almacen_id: str = "*"
 
-class MigradorTraslados:
-    def __init__(self, fecha: datetime, almacen_id: str):
-        self.fecha = datetime.strptime(fecha, "%Y-%m-%d") if isinstance(fecha, str) else fecha
-        self.almacen_id = almacen_id
-        
-        # Instancia generica para tablas simples (OWHS)
-        self.importador_generico = Importador()
-        
-        self.tablas_objetivo = ['TRASLADOS', 'OWHS']
-        self.queries = self._construir_queries()
-
-    def _esquema(self, tabla):
-        return CONFIG_HANA.get("schema", "SBO_SCHEMA")
-
-    def _formato_fecha_hana(self, columna):
-        return f"TO_VARCHAR({columna}, 'YYYY-MM-DD')"
+class MigradorTraslados(MotorMigracion):
+    # Indice de Filler en la fila TRASLADOS (reparto multi-almacen)
+    COLUMNAS_ALMACEN = {'TRASLADOS': 3}
+
+    ESPECIFICACIONES = {
+        # Orden de insercion para respetar FKs.
+        # La limpieza borra lotes OBTN/OBTW: no se prefiltran ni quedan en la cache
+        'TRASLADOS': EspecificacionTabla(
+            ImportadorTraslado, orden=['OWTR', 'WTR1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM'],
+            maestros=('OITM',), invalidar=('OBTN', 'OBTW'), extracto_owtr=True),
+        'OWHS': EspecificacionTabla(invalidar_todos=('OWHS',)),
+    }
+
+    def _valores_almacen(self):
+        """Valores de Filler que cubre el almacen (o lista de almacenes) de esta instancia."""
+        almacenes = self.almacen_id if isinstance(self.almacen_id, list) else [self.almacen_id]
+        valores = set()
+        for almacen in almacenes:
+            valores.update(('15', '16') if almacen == '16' else (almacen,))
+        return valores
 
     def _condicion_filler(self):
         """Logica de filtro especifica para Almacen Origen (Filler)."""
+        if isinstance(self.almacen_id, list):
+            return condicion_almacenes("", sorted(self._valores_almacen())).strip()
         if self.almacen_id == '16':
             return "IN ('15', '16')"
         else:
             return f"= '{self.almacen_id}'"
 
     def _construir_queries(self):
-        fecha_str = self.fecha.strftime('%Y-%m-%d')
         cond_filler = self._condicion_filler()
         
         # 1. QUERY TRASLADOS (OWTR)
@@ -83,7 +87,7 @@ class MigradorTraslados:
         LEFT JOIN {self._esquema("OBTN")}.OBTN OBTN ON OBTN."SysNumber" = ITL1."SysNumber" AND OBTN."ItemCode" = WTR1."ItemCode"
         LEFT JOIN {self._esquema("OBTW")}.OBTW OBTW ON OBTW."ItemCode" = WTR1."ItemCode" AND OBTW."MdAbsEntry" = ITL1."MdAbsEntry" AND OBTW."WhsCode" = WTR1."WhsCode"
         LEFT JOIN {self._esquema("OITM")}.OITM OITM ON OITM."ItemCode" = WTR1."ItemCode"
-        WHERE {self._formato_fecha_hana('OWTR."U_BPP_FECINITRA"')} = '{fecha_str}'
+        WHERE {self._rango_fecha_hana('OWTR."U_BPP_FECINITRA"', self.fecha)}
           AND OWTR."CANCELED" = 'N'
           AND OWTR."U_SYP_STATUS" = 'V'
           AND OWTR."U_SYP_MDSD" IS NOT NULL
@@ -100,119 +104,43 @@ class MigradorTraslados:
             'OWHS': consulta_owhs
         }
 
-    def _limpiar_sql_previo(self, tabla_sql: str) -> bool:
+    def _alcance_limpieza(self, tabla_sql: str, registros=None):
         """Limpieza inteligente basada en Filler (Almacen Origen)."""
-        if not self.almacen_id: return True
-
-        # Definir condicion WHERE para SQL Server
-        condicion_filler = ""
-        if self.almacen_id == '16':
-            condicion_filler = "IN ('15', '16')"
-        else:
-            condicion_filler = f"= '{self.almacen_id}'"
-            
-        filtro_almacen = f"WHERE T_PADRE.Filler {condicion_filler}"
-        script = ""
-
-        if tabla_sql == 'TRASLADOS':
-            if self.almacen_id == "*": return "TRUNCATE TABLE dbo.OWTR;"
-
-            # Orden de borrado: Hijos -> Padres
-            script = f"""
-                DELETE T1 FROM dbo.ITL1 T1 INNER JOIN dbo.OITL T2 ON T1.LogEntry = T2.LogEntry INNER JOIN dbo.OWTR T_PADRE ON T2.DocEntry = T_PADRE.DocEntry AND T2.DocType = T_PADRE.ObjType {filtro_almacen};
-                DELETE T1 FROM dbo.OITL T1 INNER JOIN dbo.OWTR T_PADRE ON T1.DocEntry = T_PADRE.DocEntry AND T1.DocType = T_PADRE.ObjType {filtro_almacen};
-                DELETE T1 FROM dbo.OBTW T1 INNER JOIN dbo.WTR1 T2 ON T1.ItemCode = T2.ItemCode AND T1.WhsCode = T2.WhsCode INNER JOIN dbo.OWTR T_PADRE ON T2.DocEntry = T_PADRE.DocEntry {filtro_almacen};
-                DELETE T1 FROM dbo.OBTN T1 INNER JOIN dbo.WTR1 T2 ON T1.ItemCode = T2.ItemCode INNER JOIN dbo.OWTR T_PADRE ON T2.DocEntry = T_PADRE.DocEntry {filtro_almacen};
-                DELETE T1 FROM dbo.WTR1 T1 INNER JOIN dbo.OWTR T_PADRE ON T1.DocEntry = T_PADRE.DocEntry {filtro_almacen};
-                DELETE T_PADRE FROM dbo.OWTR T_PADRE {filtro_almacen};
-            """
-        
-        elif tabla_sql == 'OWHS' and self.almacen_id == "*":
-            script = "TRUNCATE TABLE dbo.OWHS;"
-
-        if not script: return True
-
-        try:
-            with ConexionSQL() as sql:
-                if sql.db_estado:
-                    sql.cursor.execute(script)
-                    sql.conexion.commit()
-            return True
-        except Exception as e:
-            logger.critical(f"Error limpieza SQL {tabla_sql}: {e}")
-            return False
-
-    def migracion_hana_sql(self, query: str, tabla_sql: str) -> int:
-        logger.info(f"--- Procesando TRASLADOS: {tabla_sql} (Almacen: {self.almacen_id}) ---")
-
-        # 1. Limpieza
-        if not self._limpiar_sql_previo(tabla_sql): return 0
-
-        # 2. Leer HANA
-        try:
-            with ConexionHANA(query) as hana:
-                if not hana.db_estado: return 0
-                registros = hana.obtener_tabla()
-                total = len(registros)
-                logger.info(f"Registros leidos de HANA: {total}")
-                if total == 0: return 0
-        except Exception as e:
-            logger.error(f"Error leyendo HANA: {e}")
-            return 0
-
-        # 3. Procesar y Generar SQL
-        inserts_generados = []
+        if not self.almacen_id: return None
 
         if tabla_sql == 'TRASLADOS':
-            importador = ImportadorTraslado()
-            for fila in registros:
-                importador.procesar_fila(fila)
-            
-            # Orden de insercion para respetar FKs
-            orden = ['OWTR', 'WTR1', 'OITL', 'ITL1', 'OBTN', 'OBTW', 'OITM']
-            for t in orden:
-                inserts_generados.extend(importador.obtener_bloques(t))
-        
-        else: # Generico (OWHS)
-            importador = self.importador_generico
-            importador.query_sql = [] 
-            importador.bloque_actual = []
-            for fila in registros:
-                importador.query_transaccion(fila, tabla_sql)
-            inserts_generados = importador.obtener_query_final()
-
-        # 4. Insertar en SQL Server
-        exitos = 0
-        errores = {}
-        
-        with ConexionSQL() as sql:
-            if not sql.db_estado: return 0
-            for bloque in inserts_generados:
-                if not bloque.strip(): continue
-                try:
-                    sql.cursor.execute(bloque)
-                    exitos += 1
-                except Exception as e:
-                    msg = str(e)
-                    errores[msg] = errores.get(msg, 0) + 1
-            sql.conexion.commit()
-
-        logger.info(f"[OK] {tabla_sql}: {exitos} bloques insertados.")
-        if errores:
-            logger.warning(f"[WARNING] Errores en {tabla_sql}:")
-            for msg, count in errores.items():
-                logger.warning(f"   -> {count} veces: {msg[:100]}...")
-
-        return total
-
-    def migrar_todas(self) -> list:
-        resultados = []
-        for tabla in self.tablas_objetivo:
-            cantidad = self.migracion_hana_sql(self.queries[tabla], tabla)
-            resultados.append({
-                "tabla": tabla,
-                "fecha": self.fecha.strftime("%Y-%m-%d"),
-                "registros": cantidad,
-                "exito": True
-            })
-        return resultados
\ No newline at end of file
+            # Con "*" no se borra: un TRUNCATE de OWTR se llevaria recepcion y organoleptico
+            if self.almacen_id == "*": return None
+
+            # Definir condicion WHERE para SQL Server
+            if self.almacen_id == '16':
+                condicion_filler = "IN ('15', '16')"
+            else:
+                condicion_filler = f"= '{self.almacen_id}'"
+            filtro_almacen = f"WHERE T_PADRE.Filler {condicion_filler}"
+
+            # Orden de borrado: Hijos -> Padres (por lotes sobre las claves de OWTR)
+            return {
+                "descripcion": f"{tabla_sql} almacen {self.almacen_id}",
+                "seleccion": f"SELECT DISTINCT T_PADRE.DocEntry, T_PADRE.ObjType FROM dbo.OWTR T_PADRE {filtro_almacen}",
+                "pasos": [
+                    ('ITL1', "DELETE TOP (?) T1 FROM dbo.ITL1 T1 INNER JOIN dbo.OITL T2 ON T1.LogEntry = T2.LogEntry "
+                             "INNER JOIN #BORRADO B ON T2.DocEntry = B.DocEntry AND T2.DocType = B.ObjType"),
+                    ('OITL', "DELETE TOP (?) T1 FROM dbo.OITL T1 INNER JOIN #BORRADO B ON T1.DocEntry = B.DocEntry AND T1.DocType = B.ObjType"),
+                    ('OBTW', "DELETE TOP (?) T1 FROM dbo.OBTW T1 INNER JOIN dbo.WTR1 T2 ON T1.ItemCode = T2.ItemCode AND T1.WhsCode = T2.WhsCode "
+                             "INNER JOIN #BORRADO B ON T2.DocEntry = B.DocEntry"),
+                    ('OBTN', "DELETE TOP (?) T1 FROM dbo.OBTN T1 INNER JOIN dbo.WTR1 T2 ON T1.ItemCode = T2.ItemCode "
+                             "INNER JOIN #BORRADO B ON T2.DocEntry = B.DocEntry"),
+                    ('WTR1', "DELETE TOP (?) T1 FROM dbo.WTR1 T1 INNER JOIN #BORRADO B ON T1.DocEntry = B.DocEntry"),
+                    ('OWTR', "DELETE TOP (?) T_PADRE FROM dbo.OWTR T_PADRE INNER JOIN #BORRADO B ON T_PADRE.DocEntry = B.DocEntry"),
+                ],
+            }
+
+        if tabla_sql == 'OWHS' and self.almacen_id == "*":
+            return {"script": "TRUNCATE TABLE dbo.OWHS;"}
+        return None
+
+    def _del_extracto_dia(self, filas):
+        """TRASLADOS desde el extracto OWTR compartido: uniones propias, Filler del almacen y destino 01/09."""
+        filas = filtrar(uniones_estrictas(filas), 4, {'01', '09'})
+        return filtrar(filas, 3, self._valores_almacen())
@@ -1,17 +1,15 @@
 import logging
 import sys
 import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from pydantic import BaseModel
 
-# --- IMPORTS DE TUS CLASES (Respetando nombres) ---
-from Conexion.conexion_hana import ConexionHANA
-from Conexion.conexion_sql import ConexionSQL
-from Config.conexion_config import CONFIG_HANA
-
-# Importamos la clase PADRE (Genérica) y la HIJA (Especializada)
-from Procesamiento.Importador import Importador
+# Importamos la clase HIJA (Especializada); las tablas simples usan el Importador genérico del motor
 from Procesamiento.importador_ventas import ImportadorVentas
+from Migrador.multi_almacen import condicion_almacenes
+from Migrador.motor import EspecificacionTabla, MotorMigracion
+from Migrador.extraccion_normalizada import armar_plan
+from Migrador.ventana import VentanaFechas
 
 # ==========================================
 # CONFIGURACION DE LOGS CENTRALIZADA
@@ -32,39 +30,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Dias antes/despues del dia migrado en la ventana de facturas (OINV/INV1).
+# La extraccion y la limpieza usan la misma ventana; 0 = solo el dia migrado.
+MARGEN_FACTURAS_DIAS = int(os.getenv("MIGRACION_VENTAS_MARGEN_FACTURAS", "0"))
+
 class MigracionVentasRequest(BaseModel):
     fecha: datetime
     almacen_id: str = "*"
 
-class MigradorVentas:
-    def __init__(self, fecha: datetime, almacen_id: str):
-        # Normalización de fecha
-        self.fecha = datetime.strptime(fecha, "%Y-%m-%d") if isinstance(fecha, str) else fecha
-        self.almacen_id = almacen_id
-        
-        # Instancia genérica para tablas simples (OWHS)
-        self.importador_generico = Importador()
-        
-        # Definimos qué tablas procesar
-        self.tablas_objetivo = ['VENTAS', 'OINV', 'INV1', 'OWHS']
-        self.queries = self._construir_queries()
-
-    def _esquema(self, tabla):
-        return CONFIG_HANA.get("schema", "SBO_SCHEMA")
-
-    def _formato_fecha_hana(self, columna):
-        return f"TO_VARCHAR({columna}, 'YYYY-MM-DD')"
-
-    def _construir_queries(self):
-        fecha_str = self.fecha.strftime('%Y-%m-%d')
-        # Rango para facturas
-        fecha_inicio = (self.fecha - timedelta(days=7)).strftime('%Y-%m-%d')
-        fecha_fin = (self.fecha + timedelta(days=7)).strftime('%Y-%m-%d')
-
+class MigradorVentas(MotorMigracion):
+    # Indice de U_COB_LUGAREN en cada extraccion (reparto multi-almacen)
+    COLUMNAS_ALMACEN = {'VENTAS': 11, 'OINV': 12, 'INV1': 9}
+
+    ESPECIFICACIONES = {
+        # VENTAS usa ImportadorVentas; los bloques van en orden de integridad referencial
+        # (primero cabeceras, luego detalles)
+        'VENTAS': EspecificacionTabla(
+            ImportadorVentas, orden=['ODLN', 'DLN1', 'IBT1', 'OBTN', 'OBTW', 'OITL', 'ITL1', 'OITM'], normalizable=True),
+        # Facturas y almacenes: Importador genérico
+        'OINV': EspecificacionTabla(particion='DocEntry'),
+        'INV1': EspecificacionTabla(particion='DocEntry'),
+        'OWHS': EspecificacionTabla(invalidar_todos=('OWHS',)),  # La limpieza (TRUNCATE) deja la cache sin valor
+    }
+
+    def __init__(self, fecha: datetime, almacen_id: str, **opciones):
+        # La ventana de facturas la usan las consultas: se arma antes que ellas
+        fecha = datetime.strptime(fecha, "%Y-%m-%d") if isinstance(fecha, str) else fecha
+        self.ventana_facturas = VentanaFechas.alrededor(fecha, MARGEN_FACTURAS_DIAS)
+        super().__init__(fecha, almacen_id, **opciones)
+
+    def _filtro_ventas(self):
+        """Filtro de las guias del dia (alias ODLN): lo usan el join ancho y la extraccion normalizada."""
         condicion_almacen = ""
         if self.almacen_id != "*":
-            condicion_almacen = f"AND ODLN.\"U_COB_LUGAREN\" = '{self.almacen_id}'"
+            condicion_almacen = "AND " + condicion_almacenes('ODLN."U_COB_LUGAREN"', self.almacen_id)
+        return f"""{self._rango_fecha_hana('ODLN."U_BPP_FECINITRA"', self.fecha)}
+                AND ODLN."CANCELED" = 'N' 
+                AND ODLN."U_SYP_STATUS" = 'V'
+                AND ODLN."U_SYP_MDSD" IS NOT NULL 
+                AND ODLN."U_SYP_MDCD" IS NOT NULL
+                {condicion_almacen}"""
 
+    def _construir_queries(self):
         # 1. QUERY VENTAS (ODLN) - Compleja con Joins
         consulta_ventas = f"""
             SELECT
@@ -93,12 +100,7 @@ class MigradorVentas:
             INNER JOIN {self._esquema("OBTW")}.OBTW OBTW 
                 ON OBTW."ItemCode" = DLN1."ItemCode" AND OBTW."MdAbsEntry" = ITL1."MdAbsEntry" AND OBTW."WhsCode" = DLN1."WhsCode"
             INNER JOIN {self._esquema("OITM")}.OITM OITM ON OITM."ItemCode" = DLN1."ItemCode"
-            WHERE {self._formato_fecha_hana('ODLN."U_BPP_FECINITRA"')} = '{fecha_str}'
-                AND ODLN."CANCELED" = 'N' 
-                AND ODLN."U_SYP_STATUS" = 'V'
-                AND ODLN."U_SYP_MDSD" IS NOT NULL 
-                AND ODLN."U_SYP_MDCD" IS NOT NULL
-                {condicion_almacen}
+            WHERE {self._filtro_ventas()}
         """
 
         # 2. QUERY OINV
@@ -107,19 +109,19 @@ class MigradorVentas:
                    T0."DocDate", T0."TaxDate", T0."U_SYP_MDTD", T0."U_SYP_MDSD", T0."U_SYP_MDCD", T0."U_COB_LUGAREN", T0."U_BPP_FECINITRA"
             FROM {self._esquema("OINV")}.OINV T0
             WHERE T0."CANCELED" = 'N'
-            AND T0."U_BPP_FECINITRA" BETWEEN '{fecha_inicio}' AND '{fecha_fin}'
-            AND T0."U_COB_LUGAREN" = '{self.almacen_id}'
+            AND {self.ventana_facturas.condicion('T0."U_BPP_FECINITRA"')}
+            AND {condicion_almacenes('T0."U_COB_LUGAREN"', self.almacen_id)}
         """
 
-        # 3. QUERY INV1
+        # 3. QUERY INV1 (U_COB_LUGAREN al final solo para el reparto multi-almacen)
         consulta_inv1 = f"""
             SELECT T0."DocEntry", T0."ObjType", T0."WhsCode", T0."ItemCode", T0."LineNum", T0."Dscription",
-                   T0."UomCode", T0."BaseType", T0."BaseEntry"
+                   T0."UomCode", T0."BaseType", T0."BaseEntry", T1."U_COB_LUGAREN"
             FROM {self._esquema("INV1")}.INV1 T0
             INNER JOIN {self._esquema("OINV")}.OINV T1 ON T0."DocEntry" = T1."DocEntry"
             WHERE T1."CANCELED" = 'N'
-            AND T1."U_BPP_FECINITRA" BETWEEN '{fecha_inicio}' AND '{fecha_fin}'
-            AND T1."U_COB_LUGAREN" = '{self.almacen_id}'
+            AND {self.ventana_facturas.condicion('T1."U_BPP_FECINITRA"')}
+            AND {condicion_almacenes('T1."U_COB_LUGAREN"', self.almacen_id)}
         """
 
         # 4. QUERY OWHS
@@ -132,201 +134,125 @@ class MigradorVentas:
             'OWHS': consulta_owhs,
         }
 
-    def _limpiar_sql_previo(self, tabla_sql: str) -> bool:
+    def _plan_normalizado(self) -> dict:
+        """
+        VENTAS en modo normalizado: cada tabla por separado, filtrada en HANA por las guias
+        del dia, y las mismas uniones (INNER) del join ancho aplicadas en memoria.
+        """
+        e = self._esquema("ODLN")
+        guias = f'SELECT ODLN."DocEntry" FROM {e}.ODLN ODLN WHERE {self._filtro_ventas()}'
+        articulos = f'SELECT DLN1."ItemCode" FROM {e}.DLN1 DLN1 WHERE DLN1."DocEntry" IN ({guias})'
+        filtro_ibt1 = (f'EXISTS (SELECT 1 FROM {e}.ODLN ODLN WHERE ODLN."DocEntry" = IBT1."BaseEntry" '
+                       f'AND ODLN."ObjType" = IBT1."BaseType" AND {self._filtro_ventas()})')
+        filtro_oitl = (f'OITL."StockEff" = 1 AND EXISTS (SELECT 1 FROM {e}.ODLN ODLN WHERE ODLN."DocEntry" = OITL."DocEntry" '
+                       f'AND ODLN."ObjType" = OITL."DocType" AND {self._filtro_ventas()})')
+        logs = f'SELECT OITL."LogEntry" FROM {e}.OITL OITL WHERE {filtro_oitl}'
+        tablas = [
+            ("ODLN", None, ["DocEntry", "ObjType", "DocNum", "CardCode", "CardName", "NumAtCard", "DocDate", "TaxDate",
+                            "U_SYP_MDTD", "U_SYP_MDSD", "U_SYP_MDCD", "U_COB_LUGAREN", "U_BPP_FECINITRA"],
+             self._filtro_ventas(), []),
+            ("DLN1", "inner", ["DocEntry", "ObjType", "WhsCode", "ItemCode", "LineNum", "Dscription", "UomCode"],
+             f'DLN1."DocEntry" IN ({guias})', [("DocEntry", "ODLN", "DocEntry")]),
+            ("IBT1", "inner", ["ItemCode", "BatchNum", "WhsCode", "BaseEntry", "BaseType", "BaseLinNum", "Quantity"],
+             filtro_ibt1,
+             [("BaseEntry", "DLN1", "DocEntry"), ("BaseType", "DLN1", "ObjType"), ("WhsCode", "DLN1", "WhsCode"),
+              ("ItemCode", "DLN1", "ItemCode"), ("BaseLinNum", "DLN1", "LineNum")]),
+            ("OBTN", "inner", ["ItemCode", "DistNumber", "SysNumber", "AbsEntry", "MnfSerial", "ExpDate"],
+             f'OBTN."ItemCode" IN ({articulos}) AND OBTN."DistNumber" IN (SELECT IBT1."BatchNum" FROM {e}.IBT1 IBT1 WHERE {filtro_ibt1})',
+             [("ItemCode", "DLN1", "ItemCode"), ("DistNumber", "IBT1", "BatchNum")]),
+            ("OITL", "inner", ["LogEntry", "ItemCode", "DocEntry", "DocLine", "DocType", "StockEff", "LocCode"],
+             filtro_oitl,
+             [("DocEntry", "DLN1", "DocEntry"), ("ItemCode", "IBT1", "ItemCode"), ("DocType", "DLN1", "ObjType"),
+              ("DocLine", "DLN1", "LineNum")]),
+            ("ITL1", "inner", ["LogEntry", "ItemCode", "Quantity", "SysNumber", "MdAbsEntry"],
+             f'ITL1."LogEntry" IN ({logs})',
+             [("LogEntry", "OITL", "LogEntry"), ("SysNumber", "OBTN", "SysNumber")]),
+            ("OBTW", "inner", ["ItemCode", "MdAbsEntry", "WhsCode", "Location", "AbsEntry"],
+             f'OBTW."ItemCode" IN ({articulos}) AND OBTW."MdAbsEntry" IN (SELECT ITL1."MdAbsEntry" FROM {e}.ITL1 ITL1 WHERE ITL1."LogEntry" IN ({logs}))',
+             [("ItemCode", "DLN1", "ItemCode"), ("MdAbsEntry", "ITL1", "MdAbsEntry"), ("WhsCode", "DLN1", "WhsCode")]),
+            ("OITM", "inner", ["ItemCode", "ItemName", "FrgnName", "U_SYP_CONCENTRACION", "U_SYP_FORPR",
+                               "U_SYP_FFDET", "U_SYP_FABRICANTE"],
+             f'OITM."ItemCode" IN ({articulos})', [("ItemCode", "DLN1", "ItemCode")]),
+        ]
+        # Orden de columnas del join ancho (el que espera ImportadorVentas)
+        return armar_plan(tablas, ["ODLN", "DLN1", "IBT1", "OBTN", "OBTW", "OITL", "ITL1", "OITM"], e)
+
+    def _columna_particion(self, tabla_sql: str):
+        # Facturas de un solo dia: un cursor alcanza (la particion es para ventanas de varios dias)
+        if tabla_sql in ('OINV', 'INV1') and self.ventana_facturas.dias == 1: return None
+        return super()._columna_particion(tabla_sql)
+
+    def _alcance_limpieza(self, tabla_sql: str, registros=None):
         """Limpia los datos en SQL Server antes de insertar."""
-        if not self.almacen_id: return True
-
-        script = ""
-        filtro_almacen = f"WHERE T_PADRE.U_COB_LUGAREN = '{self.almacen_id}'"
+        if not self.almacen_id: return None
 
-        # 1. CASO VENTAS (ODLN) - Borra todo el árbol de una vez
+        # 1. CASO VENTAS (ODLN) - Borra todo el árbol del almacén
         if tabla_sql == 'VENTAS':
-            if self.almacen_id == "*": return "TRUNCATE TABLE dbo.ODLN;" 
-            
-            script = f"""
-                BEGIN TRAN;
-
-                -- =========================
-                -- 1. ITL1 (detalle log)
-                -- =========================
-                DELETE FROM dbo.ITL1
-                WHERE LogEntry IN (
-                    SELECT OITL.LogEntry
-                    FROM dbo.OITL
-                    WHERE OITL.DocEntry IN (
-                        SELECT DocEntry
-                        FROM dbo.ODLN
-                        WHERE U_COB_LUGAREN = '{self.almacen_id}'
-                    )
-                );
-
-                -- =========================
-                -- 2. OITL (log inventario)
-                -- =========================
-                DELETE FROM dbo.OITL
-                WHERE DocEntry IN (
-                    SELECT DocEntry
-                    FROM dbo.ODLN
-                    WHERE U_COB_LUGAREN = '{self.almacen_id}'
-                );
-
-                -- =========================
-                -- 3. IBT1 (lotes por doc)
-                -- =========================
-                DELETE FROM dbo.IBT1
-                WHERE BaseEntry IN (
-                    SELECT DocEntry
-                    FROM dbo.ODLN
-                    WHERE U_COB_LUGAREN = '{self.almacen_id}'
-                );
-
-                -- =========================
-                -- 4. DLN1 (detalle)
-                -- =========================
-                DELETE FROM dbo.DLN1
-                WHERE DocEntry IN (
-                    SELECT DocEntry
-                    FROM dbo.ODLN
-                    WHERE U_COB_LUGAREN = '{self.almacen_id}'
-                );
-
-                -- =========================
-                -- 5. ODLN (cabecera)
-                -- =========================
-                DELETE FROM dbo.ODLN
-                WHERE U_COB_LUGAREN = '{self.almacen_id}';
-
-                COMMIT TRAN;
-                """
+            # Con "*" no se borra: no hay un almacen por el que acotar el árbol
+            if self.almacen_id == "*": return None
+            return {
+                "descripcion": f"{tabla_sql} almacen {self.almacen_id}",
+                "seleccion": f"SELECT DISTINCT DocEntry FROM dbo.ODLN WHERE U_COB_LUGAREN = '{self.almacen_id}'",
+                "pasos": [
+                    # 1. ITL1 (detalle log)
+                    ('ITL1', "DELETE TOP (?) T1 FROM dbo.ITL1 T1 JOIN dbo.OITL T2 ON T1.LogEntry = T2.LogEntry "
+                             "JOIN #BORRADO B ON T2.DocEntry = B.DocEntry"),
+                    # 2. OITL (log inventario)
+                    ('OITL', "DELETE TOP (?) T1 FROM dbo.OITL T1 JOIN #BORRADO B ON T1.DocEntry = B.DocEntry"),
+                    # 3. IBT1 (lotes por doc)
+                    ('IBT1', "DELETE TOP (?) T1 FROM dbo.IBT1 T1 JOIN #BORRADO B ON T1.BaseEntry = B.DocEntry"),
+                    # 4. DLN1 (detalle)
+                    ('DLN1', "DELETE TOP (?) T1 FROM dbo.DLN1 T1 JOIN #BORRADO B ON T1.DocEntry = B.DocEntry"),
+                    # 5. ODLN (cabecera)
+                    ('ODLN', "DELETE TOP (?) T_PADRE FROM dbo.ODLN T_PADRE JOIN #BORRADO B ON T_PADRE.DocEntry = B.DocEntry"),
+                ],
+            }
+
+        # Misma ventana que la extraccion: se borra solo lo que se vuelve a cargar
+        facturas = f"""
+            SELECT DISTINCT DocEntry FROM dbo.OINV
+            WHERE U_COB_LUGAREN='{self.almacen_id}' AND {self.ventana_facturas.condicion('U_BPP_FECINITRA')}
+        """
 
-        # 2. CASO OINV (Cabecera) - Aquí SÍ borramos todo para empezar limpio
-        elif tabla_sql == 'OINV':
-            fecha_inicio = (self.fecha - timedelta(days=7)).strftime('%Y-%m-%d')
-            fecha_fin = (self.fecha + timedelta(days=7)).strftime('%Y-%m-%d')
-            script = f"""
-                -- Borramos primero hijos (INV1) para evitar error de FK
-                DELETE T1 FROM dbo.INV1 T1 INNER JOIN dbo.OINV T_PADRE ON T1.DocEntry=T_PADRE.DocEntry 
-                WHERE T_PADRE.U_COB_LUGAREN='{self.almacen_id}' AND T_PADRE.U_BPP_FECINITRA BETWEEN '{fecha_inicio}' AND '{fecha_fin}';
-                
-                -- Borramos Padres (OINV)
-                DELETE T_PADRE FROM dbo.OINV T_PADRE 
-                WHERE T_PADRE.U_COB_LUGAREN='{self.almacen_id}' AND T_PADRE.U_BPP_FECINITRA BETWEEN '{fecha_inicio}' AND '{fecha_fin}';
-            """
+        # 2. CASO OINV (Cabecera) - Borramos la ventana de facturas completa (padres e hijos)
+        if tabla_sql == 'OINV':
+            return {
+                "descripcion": f"{tabla_sql} almacen {self.almacen_id}",
+                "seleccion": facturas,
+                "pasos": [
+                    # Borramos primero hijos (INV1) para evitar error de FK
+                    ('INV1', "DELETE TOP (?) T1 FROM dbo.INV1 T1 JOIN #BORRADO B ON T1.DocEntry = B.DocEntry"),
+                    # Borramos Padres (OINV)
+                    ('OINV', "DELETE TOP (?) T_PADRE FROM dbo.OINV T_PADRE JOIN #BORRADO B ON T_PADRE.DocEntry = B.DocEntry"),
+                ],
+            }
 
         # 3. CASO INV1 (Detalle) - ¡CORRECCIÓN CRÍTICA!
-        elif tabla_sql == 'INV1':
+        if tabla_sql == 'INV1':
             # NO BORRAMOS NADA.
             # ¿Por qué? Porque el paso anterior ('OINV') ya borró todo (padres e hijos).
             # Si borramos aquí de nuevo, corremos riesgo de borrar las OINV que acabamos de insertar.
-            # Además, OINV e INV1 se migran juntas en bloque por fecha.
-            return True 
+            # Además, OINV e INV1 se migran juntas en bloque por la misma ventana de fechas.
+            # EXCEPCIÓN: si OINV no cambió (huella) no se borró nada, así que limpiamos solo INV1.
+            if self.estado.get('OINV') != 'unchanged': return None
+            return {
+                "descripcion": f"{tabla_sql} almacen {self.almacen_id}",
+                "seleccion": facturas,
+                "pasos": [('INV1', "DELETE TOP (?) T1 FROM dbo.INV1 T1 JOIN #BORRADO B ON T1.DocEntry = B.DocEntry")],
+            }
 
         # 4. CASO OWHS (Almacenes)
-        elif tabla_sql == 'OWHS':
-            if self.almacen_id == "*":
-                script = "TRUNCATE TABLE dbo.OWHS;"
-            else:
-                # Si filtramos por almacén, NO borramos OWHS porque contiene otros almacenes
-                # Solo dejamos pasar para que intente insertar (y falle si ya existe, que es lo esperado)
-                return True
-
-        if not script: return True
-
-        try:
-            with ConexionSQL() as sql:
-                if sql.db_estado:
-                    sql.cursor.execute(script)
-                    sql.conexion.commit()
-            return True
-        except Exception as e:
-            logger.critical(f"Error limpieza SQL {tabla_sql}: {e}")
-            return False
-
-    def migracion_hana_sql(self, query: str, tabla_sql: str) -> int:
-        """
-        Orquestador principal.
-        Conecta HANA -> Obtiene Datos -> Instancia ImportadorVentas -> Obtiene SQL -> Inserta SQL
-        """
-        logger.info(f"--- Procesando: {tabla_sql} (Almacén: {self.almacen_id}) ---")
-
-        # 1. Limpieza
-        if not self._limpiar_sql_previo(tabla_sql): return 0
-
-        # 2. Leer HANA
-        try:
-            with ConexionHANA(query) as hana:
-                if not hana.db_estado: return 0
-                registros = hana.obtener_tabla()
-                logger.info(f"Registros leídos de HANA: {len(registros)}")
-                if not registros: return 0
-        except Exception as e:
-            logger.error(f"Error leyendo HANA: {e}")
-            return 0
-
-        # 3. Procesar Datos y Generar SQL
-        inserts_generados = []
-        
-        # CASO A: TABLAS COMPLEJAS (VENTAS) - Usan la clase hija ImportadorVentas
-        if tabla_sql == 'VENTAS':
-            importador = ImportadorVentas() # Usamos la clase especializada
-            for fila in registros:
-                importador.procesar_fila(fila)
-            
-            # Extraemos los bloques en orden de integridad referencial
-            # Primero cabeceras, luego detalles
-            orden_tablas = ['ODLN', 'DLN1', 'IBT1', 'OBTN', 'OBTW', 'OITL', 'ITL1', 'OITM']
-            for t in orden_tablas:
-                inserts_generados.extend(importador.obtener_bloques(t))
-
-        # CASO B: FACTURAS (OINV/INV1) - Usamos ImportadorVentas (si tiene los métodos) o el Genérico
-        # Nota: Aquí asumo que usaremos el Genérico para OINV/INV1 si no implementaste procesar_fila_oinv en la clase anterior
-        # Si prefieres usar la lógica genérica simple para esto:
-        elif tabla_sql in ['OINV', 'INV1', 'OWHS']:
-            importador = self.importador_generico # Usamos la clase padre
-            importador.query_sql = [] # Limpiamos buffer anterior
-            importador.bloque_actual = []
-            
-            for fila in registros:
-                importador.query_transaccion(fila, tabla_sql)
-            
-            inserts_generados = importador.obtener_query_final()
-
-        # 4. Insertar en SQL Server
-        exitos = 0
-        errores = {}
-        
-        with ConexionSQL() as sql:
-            if not sql.db_estado: return 0
-            
-            # Ejecutamos bloque por bloque
-            for bloque in inserts_generados:
-                if not bloque.strip(): continue
-                try:
-                    sql.cursor.execute(bloque)
-                    exitos += 1
-                except Exception as e:
-                    msg = str(e)
-                    errores[msg] = errores.get(msg, 0) + 1
-
-            sql.conexion.commit() # Un solo commit al final es suficiente y más rápido
-
-        # Resumen limpio
-        logger.info(f"✅ {tabla_sql}: {exitos} bloques insertados correctamente.")
-        if errores:
-            logger.warning(f"⚠️ Errores en {tabla_sql}:")
-            for msg, count in errores.items():
-                logger.warning(f"   -> {count} veces: {msg[:100]}...")
-
-        return exitos
-
-    def migrar_todas(self) -> list:
-        resultados = []
-        for tabla in self.tablas_objetivo:
-            cantidad = self.migracion_hana_sql(self.queries[tabla], tabla)
-            resultados.append({
-                "tabla": tabla,
-                "fecha": self.fecha.strftime("%Y-%m-%d"),
-                "registros": cantidad,
-                "exito": True
-            })
-        return resultados
\ No newline at end of file
+        # Si filtramos por almacén, NO borramos OWHS porque contiene otros almacenes
+        # Solo dejamos pasar para que intente insertar (y falle si ya existe, que es lo esperado)
+        if tabla_sql == 'OWHS' and self.almacen_id == "*":
+            return {"script": "TRUNCATE TABLE dbo.OWHS;"}
+        return None
+
+    def _resumen_tabla(self, tabla_sql, total, exitos=0, rechazadas=0, importador=None):
+        return exitos  # Bloques insertados
+
+    def _resultado(self, tabla, cantidad) -> dict:
+        resultado = super()._resultado(tabla, cantidad)
+        if tabla in ('OINV', 'INV1'):
+            resultado["ventana"] = self.ventana_facturas.como_dict()
+        return resultado
@@ -0,0 +1,469 @@
+import logging
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from Conexion.conexion_hana import ConexionHANA
+from Conexion.conexion_sql import ConexionSQL
+from Conexion.diagnostico_hana import acumular_por_clave, acumular_transferencia, registrar_transferencia
+from Config.conexion_config import CONFIG_HANA
+from Procesamiento.Importador import Importador
+from Procesamiento.cache_maestros import cache_maestros
+from Migrador.control_migracion import huella_registros, huella_sin_cambios, invalidar_afectados, registrar_huella
+from Migrador.borrado_lotes import borrar_por_lotes
+from Migrador.puntos_control import BitacoraMigracion
+from Migrador.cargador import CLAVES_MAESTRAS, RECHAZOS_DIR, descartar_maestros_existentes
+from Migrador.estrategia_commit import ESTRATEGIA_COMMIT, PoliticaCommit, cargar_plan
+from Migrador.estimador import estimar_migracion, registrar_rendimiento
+from Migrador.snapshots import SNAPSHOT_MODO, cargar_snapshot, guardar_snapshot
+from Migrador.extraccion_normalizada import EXTRACCION_MODO, extraer_normalizado
+from Migrador.extracto_owtr import extracto_owtr
+from Migrador.extraccion_particionada import EXTRACCION_PARTICIONES, extraer_particionado
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# MOTOR DE MIGRACION (un solo flujo para todos los modulos)
+# ==========================================
+# Cada modulo declara QUE migra: ESPECIFICACIONES por tabla, consultas HANA y alcance
+# de la limpieza. El motor hace el COMO, igual para todos: extraccion en una sesion
+# HANA (snapshot, extracto OWTR compartido, normalizada), diario de reanudacion,
+# huella, plan de sentencias, prefiltro de maestros, carga con la estrategia de commit
+# (staging, escritores paralelos, biseccion de rechazos) y metricas.
+# Una optimizacion del flujo se hace aqui una sola vez.
+
+
+class EspecificacionTabla:
+    """
+    Como se migra una tabla (o extracto compuesto) de un modulo:
+    - importador: clase del importador especializado (procesar_fila / obtener_bloques).
+      None = Importador generico (query_transaccion, bloques de sentencias)
+    - orden: tablas destino del importador especializado, en orden de carga
+    - maestros: maestros que se prefiltran contra SQL Server antes de cargar
+      (sin los que la limpieza del modulo borra: se vuelven a insertar)
+    - invalidar: tablas de la cache de maestros que la limpieza deja sin valor
+    - invalidar_todos: idem, solo al migrar todos los almacenes ("*")
+    - extracto_owtr: se sirve del extracto OWTR compartido del dia (_del_extracto_dia)
+    - normalizable: admite la extraccion normalizada (_plan_normalizado)
+    - limpiar_vacio: un extracto vacio limpia igual el dia (False: no se toca nada)
+    - limpia_con_extracto: la limpieza necesita el extracto (tambien al reanudar)
+    - particion: columna clave (unica en la consulta) para leer por rangos en paralelo
+    """
+
+    def __init__(self, importador=None, orden=(), maestros=tuple(CLAVES_MAESTRAS), invalidar=(), invalidar_todos=(),
+                 extracto_owtr: bool = False, normalizable: bool = False, limpiar_vacio: bool = True,
+                 limpia_con_extracto: bool = False, particion: str = None):
+        self.importador = importador
+        self.orden = tuple(orden)
+        self.maestros = tuple(maestros)
+        self.invalidar = tuple(invalidar)
+        self.invalidar_todos = tuple(invalidar_todos)
+        self.extracto_owtr = extracto_owtr
+        self.normalizable = normalizable
+        self.limpiar_vacio = limpiar_vacio
+        self.limpia_con_extracto = limpia_con_extracto
+        self.particion = particion
+
+
+class MotorMigracion:
+    """
+    Flujo comun extraccion -> limpieza -> transformacion -> carga. Las subclases definen:
+    - ESPECIFICACIONES {tabla: EspecificacionTabla}, en orden de migracion
+    - _construir_queries(): {tabla: consulta HANA}
+    - _alcance_limpieza(tabla_sql, registros): que se borra en SQL Server antes de publicar
+    y, si sus especificaciones lo piden, _del_extracto_dia / _plan_normalizado.
+    """
+    ESPECIFICACIONES = {}
+    COLUMNAS_ALMACEN = {}    # tabla -> indice de la columna almacen en la fila HANA (reparto multi-almacen)
+    PREFIJO_MODULO = ""      # Prefijo del diario, la huella y el rendimiento ("GENERAL_")
+    EXTRAER_JUNTAS = True    # migrar_todas lee todas las tablas en una sesion HANA antes de cargar
+    TOLERAR_ERRORES = False  # Un error inesperado en una tabla se registra y esa tabla devuelve 0
+
+    def __init__(self, fecha, almacen_id="*", forzar: bool = False, reanudar: bool = False, progreso=None,
+                 snapshot: str = SNAPSHOT_MODO, extraccion: str = EXTRACCION_MODO,
+                 estrategia_commit: str = ESTRATEGIA_COMMIT):
+        self.fecha = datetime.strptime(fecha, "%Y-%m-%d") if isinstance(fecha, str) else fecha
+        self.almacen_id = almacen_id
+        self.forzar = forzar  # Ignorar la huella y recargar siempre
+        self.reanudar = reanudar  # Retomar el diario local de una corrida interrumpida
+        self.progreso = progreso  # Callback de avance (trabajos en segundo plano)
+        self.snapshot = snapshot  # "guardar" | "cargar": extracto local para repetir la carga sin HANA
+        self.extraccion = extraccion  # "ancha" | "normalizada": como se leen las tablas normalizables
+        self.estrategia_commit = estrategia_commit  # "todo" | "filas" | "segundos" (ver estrategia_commit)
+        self.estado = {}         # tabla -> "ok" | "unchanged" | "resumed" | "error"
+        self.transferencia = {}  # tabla -> volumen leido de HANA (consultas, tiempos, filas, bytes)
+        self.escritura = {}      # tabla -> {"borradas", "reinsertadas"} (amplificacion de escritura)
+        self.commits = {}        # tabla -> rendimiento de la carga con la estrategia de commit
+
+        # Instancia generica para tablas simples (OWHS, OINV, maestros)
+        self.importador_generico = Importador()
+        self.tablas_objetivo = list(self.ESPECIFICACIONES)
+        self.queries = self._construir_queries()
+
+    # --- Lo que declara cada modulo ---
+
+    def _construir_queries(self) -> dict:
+        raise NotImplementedError
+
+    def _alcance_limpieza(self, tabla_sql: str, registros=None):
+        """
+        None (no se borra nada), {"script": sql} o borrado por lotes:
+        {"descripcion", "seleccion", "pasos"} (ver borrado_lotes).
+        """
+        return None
+
+    def _del_extracto_dia(self, filas):
+        """Filas del modulo a partir del extracto OWTR compartido."""
+        raise NotImplementedError
+
+    def _plan_normalizado(self) -> dict:
+        raise NotImplementedError
+
+    def _diagnosticar(self, tabla_sql: str, registros):
+        """Gancho para inspeccionar el extracto recien leido (antes de pasarlo a tuplas)."""
+
+    def _resumen_tabla(self, tabla_sql: str, total: int, exitos: int = 0, rechazadas: int = 0, importador=None):
+        """Lo que devuelve migracion_hana_sql para la tabla (por defecto, filas del extracto)."""
+        return total
+
+    def _resultado(self, tabla: str, cantidad) -> dict:
+        """Entrada de la tabla en la respuesta de migrar_todas."""
+        return {
+            "tabla": tabla,
+            "fecha": self.fecha.strftime("%Y-%m-%d"),
+            "registros": cantidad,
+            "exito": self.estado.get(tabla) != "error",
+            "status": self.estado.get(tabla, "ok"),
+            "transferencia": self.transferencia.get(tabla),
+            "escritura": self.escritura.get(tabla),
+            "commit": self.commits.get(tabla),
+        }
+
+    # --- Utilidades de las consultas ---
+
+    def _esquema(self, tabla):
+        return CONFIG_HANA.get("schema", "SBO_SCHEMA")
+
+    def _formato_fecha_hana(self, columna):
+        return f"TO_VARCHAR({columna}, 'YYYY-MM-DD')"
+
+    def _rango_fecha_hana(self, columna, desde, dias=1):
+        # Rango semiabierto sobre la columna "cruda": HANA puede usar indices y poda de particiones
+        hasta = desde + timedelta(days=dias)
+        return f"{columna} >= '{desde.strftime('%Y-%m-%d')}' AND {columna} < '{hasta.strftime('%Y-%m-%d')}'"
+
+    # --- Flujo comun ---
+
+    def _especificacion(self, tabla_sql: str) -> EspecificacionTabla:
+        return self.ESPECIFICACIONES.get(tabla_sql) or EspecificacionTabla()
+
+    def _modulo(self, tabla_sql: str) -> str:
+        return f"{self.PREFIJO_MODULO}{tabla_sql}"
+
+    def _normalizar(self, tabla_sql: str) -> bool:
+        return self._especificacion(tabla_sql).normalizable and self.extraccion == "normalizada"
+
+    def _columna_particion(self, tabla_sql: str):
+        """Columna por la que se parte la lectura en rangos paralelos (None = un solo cursor)."""
+        if EXTRACCION_PARTICIONES < 2 or self._normalizar(tabla_sql): return None
+        return self._especificacion(tabla_sql).particion
+
+    def _extraer_por_rangos(self, query: str, tabla_sql: str, columna: str):
+        medidas = []
+        registros = extraer_particionado(query, columna, mediciones=medidas)
+        acumular_transferencia(self.transferencia, tabla_sql, medidas)
+        return registros
+
+    def _avisar(self, tabla, etapa, **datos):
+        """Informa el avance al trabajo en segundo plano (si lo hay)."""
+        if self.progreso:
+            self.progreso(tabla, etapa, almacen=self.almacen_id, **datos)
+
+    def _extraer(self, query: str, tabla_sql: str):
+        """Lee HANA. Devuelve None si falla la lectura (distinto de una lista vacia)."""
+        if self.snapshot == "cargar":
+            registros = cargar_snapshot(tabla_sql, self.fecha, self.almacen_id, query)
+            if registros is not None: return registros
+        if self._especificacion(tabla_sql).extracto_owtr and extracto_owtr.activo:
+            # Extracto OWTR del dia compartido con los otros modulos; si falla, se lee la consulta propia
+            medidas = []
+            filas = extracto_owtr.obtener(self.fecha, mediciones=medidas, forzar=self.forzar)
+            acumular_transferencia(self.transferencia, tabla_sql, medidas)
+            if filas is not None:
+                registros = self._del_extracto_dia(filas)
+                if self.snapshot: guardar_snapshot(tabla_sql, self.fecha, self.almacen_id, query, registros)
+                return registros
+        normalizar = self._normalizar(tabla_sql)
+        columna = self._columna_particion(tabla_sql)
+        try:
+            if columna:
+                # Rangos de la clave leidos en paralelo, cada uno en su sesion
+                registros = self._extraer_por_rangos(query, tabla_sql, columna)
+            else:
+                with ConexionHANA(None if normalizar else query) as hana:
+                    if not hana.db_estado:
+                        logger.error("Conexion a SAP HANA fallida")
+                        return None
+                    registros = extraer_normalizado(hana, self._plan_normalizado()) if normalizar else hana.obtener_tabla()
+                    acumular_transferencia(self.transferencia, tabla_sql, hana.metricas)
+        except Exception as e:
+            logger.error(f"Error leyendo HANA ({tabla_sql}): {e}")
+            return None
+        if registros is not None:
+            logger.info(f"Registros leidos de HANA para {tabla_sql}: {len(registros)}")
+            if self.snapshot: guardar_snapshot(tabla_sql, self.fecha, self.almacen_id, query, registros)
+        return registros
+
+    def _extraer_varias(self, tablas) -> dict:
+        """
+        Extrae varias tablas en UNA sesion HANA (consultas en secuencia sobre la misma conexion).
+        Respeta el modo snapshot. Devuelve {tabla: registros} (None si esa lectura falla).
+        """
+        extractos, pendientes = {}, {}
+        for tabla in tablas:
+            if self.snapshot == "cargar":
+                registros = cargar_snapshot(tabla, self.fecha, self.almacen_id, self.queries[tabla])
+                if registros is not None:
+                    extractos[tabla] = registros
+                    continue
+            pendientes[tabla] = self.queries[tabla]
+        if not pendientes:
+            return extractos
+        consultas = dict(pendientes)
+        # Las tablas particionadas abren sus propias sesiones: se leen despues de la compartida
+        particionadas = {t: self._columna_particion(t) for t in consultas if self._columna_particion(t)}
+        for tabla in particionadas:
+            del pendientes[tabla]
+        leidos = dict.fromkeys(consultas)
+        try:
+            # El extracto OWTR abre su sesion despues de su candado del dia: se lee antes de
+            # tomar la compartida (si falla, la tabla sigue pendiente con su consulta propia)
+            for tabla in [t for t in pendientes if self._especificacion(t).extracto_owtr and extracto_owtr.activo]:
+                medidas = []
+                filas = extracto_owtr.obtener(self.fecha, mediciones=medidas, forzar=self.forzar)
+                acumular_transferencia(self.transferencia, tabla, medidas)
+                if filas is not None:
+                    leidos[tabla] = self._del_extracto_dia(filas)
+                    del pendientes[tabla]
+            if pendientes:
+                with ConexionHANA() as hana:
+                    if hana.db_estado:
+                        for tabla in [t for t in pendientes if self._normalizar(t)]:
+                            medidas = len(hana.metricas)
+                            leidos[tabla] = extraer_normalizado(hana, self._plan_normalizado())
+                            del pendientes[tabla]
+                            acumular_transferencia(self.transferencia, tabla, hana.metricas[medidas:])
+                        if pendientes:
+                            medidas = len(hana.metricas)
+                            leidos.update(hana.obtener_tablas(pendientes))
+                            acumular_por_clave(self.transferencia, hana.metricas[medidas:], pendientes)
+            for tabla, columna in particionadas.items():
+                leidos[tabla] = self._extraer_por_rangos(consultas[tabla], tabla, columna)
+        except Exception as e:
+            logger.error(f"Error leyendo HANA: {e}")
+            leidos = dict.fromkeys(consultas)
+        for tabla, registros in leidos.items():
+            if registros is not None and self.snapshot:
+                guardar_snapshot(tabla, self.fecha, self.almacen_id, self.queries[tabla], registros)
+            extractos[tabla] = registros
+        return extractos
+
+    def _limpiar_sql_previo(self, tabla_sql: str, sql=None, registros=None, confirmar=None) -> bool:
+        """
+        Ejecuta el alcance de limpieza del modulo.
+        Sin `sql` abre su conexion y confirma cada lote. Con `sql` borra en esa conexion:
+        sin commits (dentro de la transaccion de quien llama) salvo `confirmar`.
+        """
+        alcance = self._alcance_limpieza(tabla_sql, registros)
+        if not alcance: return True
+
+        propia = sql is None
+        confirmar = propia if confirmar is None else confirmar
+        try:
+            with (ConexionSQL() if propia else nullcontext(sql)) as sql:
+                if sql.db_estado:
+                    if alcance.get("pasos"):
+                        resumen = borrar_por_lotes(sql, alcance["descripcion"], alcance["seleccion"], alcance["pasos"],
+                                                   confirmar=confirmar)
+                        self.escritura[tabla_sql] = {"borradas": sum(p["filas"] for p in resumen["pasos"].values())}
+                    else:
+                        sql.cursor.execute(alcance["script"])
+                        if confirmar: sql.conexion.commit()
+            return True
+        except Exception as e:
+            logger.critical(f"Error limpieza SQL {tabla_sql}: {e}")
+            return False
+
+    def _generar_plan(self, tabla_sql: str, registros) -> tuple:
+        """(importador, plan [(tabla, indice, bloque)]) segun la especificacion de la tabla."""
+        especificacion = self._especificacion(tabla_sql)
+        if especificacion.importador is None:
+            importador = self.importador_generico
+            importador.reiniciar()  # Limpiamos el buffer de la tabla anterior
+            for i, fila in enumerate(registros, 1):
+                importador.query_transaccion(fila, tabla_sql)
+                if i % 1000 == 0:
+                    logger.info(f"Generando SQL {tabla_sql}... {i}/{len(registros)}")
+            return importador, [(tabla_sql, i, b) for i, b in enumerate(importador.obtener_query_final())]
+
+        importador = especificacion.importador()
+        for fila in registros:
+            importador.procesar_fila(fila)
+        # Los maestros ya cargados no se mandan (antes fallaban por PK uno a uno)
+        if especificacion.maestros:
+            descartar_maestros_existentes(importador, tablas=especificacion.maestros)
+        plan = [(t, i, b) for t in especificacion.orden for i, b in enumerate(importador.obtener_bloques(t))]
+        return importador, plan
+
+    def migracion_hana_sql(self, query: str, tabla_sql: str, registros=None):
+        """
+        Migra una tabla del modulo: HANA -> huella -> plan -> SQL Server.
+        Si se recibe `registros` (extraccion compartida) no se consulta HANA.
+        Con `reanudar` se retoma el diario local (extracto y sentencias ya commiteadas).
+        """
+        logger.info(f"--- Procesando: {tabla_sql} ({self.__class__.__name__}, almacen: {self.almacen_id}) ---")
+        try:
+            return self._migrar_tabla(query, tabla_sql, registros)
+        except Exception as e:
+            if not self.TOLERAR_ERRORES: raise
+            logger.critical(f"Error general migrando {tabla_sql}: {e}", exc_info=True)
+            return 0
+
+    def _fallar(self, tabla_sql: str, motivo: str) -> int:
+        """Marca la tabla con error (estado y progreso). Devuelve 0 filas migradas."""
+        self.estado[tabla_sql] = "error"
+        self._avisar(tabla_sql, "error", error=motivo)
+        return 0
+
+    def _migrar_tabla(self, query: str, tabla_sql: str, registros):
+        especificacion = self._especificacion(tabla_sql)
+        modulo = self._modulo(tabla_sql)
+        inicio = time.perf_counter()
+        bitacora = BitacoraMigracion(modulo, self.fecha, self.almacen_id, self.reanudar)
+
+        if bitacora.plan is not None:
+            # Corrida interrumpida con el plan ya generado: no se lee HANA (la limpieza va con la carga)
+            self.estado[tabla_sql] = "resumed"
+            plan, huella, total = bitacora.plan, bitacora.huella, bitacora.total
+            importador = Importador()  # Sin pendientes de cache: las filas ya cargadas no se reconfirman
+            if especificacion.limpia_con_extracto:
+                registros = bitacora.extracto()
+        else:
+            # 1. Leer HANA (antes de limpiar: si HANA falla no se borra nada)
+            if registros is None:
+                registros = bitacora.extracto()
+            if registros is None:
+                registros = self._extraer(query, tabla_sql)
+                if registros is None:
+                    bitacora.cerrar()
+                    return self._fallar(tabla_sql, "lectura HANA fallida")
+            self._diagnosticar(tabla_sql, registros)
+            registros = bitacora.guardar_extracto(registros)
+            self._avisar(tabla_sql, "extraido", filas=len(registros))
+            total = len(registros)
+
+            if not registros and not especificacion.limpiar_vacio:
+                logger.warning(f"No hay registros en HANA para {tabla_sql}")
+                bitacora.cerrar()
+                self._avisar(tabla_sql, "ok", hechos=0, total=0)
+                return 0
+
+            # 2. Huella: extracto identico a la ultima carga -> no se borra ni se inserta
+            huella = huella_registros(registros)
+            if not self.forzar and huella_sin_cambios(modulo, self.fecha, self.almacen_id, huella):
+                logger.info(f"[SKIP] {tabla_sql}: sin cambios desde la ultima migracion.")
+                self.estado[tabla_sql] = "unchanged"
+                self._avisar(tabla_sql, "unchanged")
+                bitacora.cerrar()
+                return self._resumen_tabla(tabla_sql, total)
+            self.estado[tabla_sql] = "ok"
+            invalidar_afectados(modulo, self.fecha, self.almacen_id)
+
+            # 3. Limpieza: la hace cargar_plan (paso 5), por lotes confirmados.
+            #    La cache no puede dar por cargado lo que esa limpieza borra.
+            for maestro in especificacion.invalidar + (especificacion.invalidar_todos if self.almacen_id == "*" else ()):
+                cache_maestros.invalidar(maestro)
+            if not registros:
+                # Sin filas no hay carga: se limpia aqui y se termina
+                if not self._limpiar_sql_previo(tabla_sql, registros=registros): return 0
+                logger.warning(f"HANA devolvio 0 registros para {tabla_sql}.")
+                registrar_huella(modulo, self.fecha, self.almacen_id, huella, 0)
+                bitacora.cerrar()
+                self._avisar(tabla_sql, "ok", hechos=0, total=0)
+                return 0
+
+            # 4. Transformar y generar el plan de sentencias
+            try:
+                importador, plan = self._generar_plan(tabla_sql, registros)
+            except Exception as e:
+                # La limpieza no corrio pero la huella y la cache ya se invalidaron: la proxima
+                # corrida recarga. El extracto guardado no se reanuda (el plan no se genero).
+                logger.error(f"Error transformando {tabla_sql}: {e}")
+                bitacora.cerrar()
+                return self._fallar(tabla_sql, f"error transformando: {e}")
+            bitacora.guardar_plan(plan, huella, total)
+
+        # 5. Insertar en SQL Server con la estrategia de commit, desde el ultimo punto de control.
+        # Un bloque con filas malas se parte por mitades: las buenas entran, las malas van a Rechazos/
+        errores = {}
+        with ConexionSQL() as sql:
+            if not sql.db_estado:
+                logger.error("Conexion a SQL Server fallida")
+                return self._fallar(tabla_sql, "sin conexion a SQL Server")  # El plan queda para reanudar
+            carga = cargar_plan(
+                sql, plan, bitacora, importador,
+                limpiar=lambda conexion, confirmar: self._limpiar_sql_previo(tabla_sql, conexion, registros, confirmar),
+                avisar=lambda hechos: self._avisar(tabla_sql, "cargando", hechos=hechos, total=len(plan)),
+                errores=errores, politica=PoliticaCommit(self.estrategia_commit),
+            )
+        if carga is None: return self._fallar(tabla_sql, "limpieza previa fallida")
+        exitos, graves, cargador = carga["exitos"], carga["graves"], carga["cargador"]
+        self.commits[tabla_sql] = carga["commit"]
+        bitacora.cerrar()
+        self._avisar(tabla_sql, self.estado[tabla_sql], hechos=len(plan), total=len(plan), errores=graves)
+
+        if tabla_sql in self.escritura:
+            self.escritura[tabla_sql]["reinsertadas"] = total
+            logger.info(f"{tabla_sql}: {self.escritura[tabla_sql]['borradas']} filas borradas / {total} filas reinsertadas")
+        if cargador.reintentos:
+            logger.info(f"{tabla_sql}: {cargador.resumen()}")
+
+        # Duplicados de PK (maestros compartidos) no invalidan la carga
+        if graves == 0:
+            registrar_huella(modulo, self.fecha, self.almacen_id, huella, total)
+            if self.estado[tabla_sql] == "ok":
+                registrar_rendimiento(modulo, total, time.perf_counter() - inicio)
+            logger.info(f"[OK] {tabla_sql}: {exitos} bloques insertados.")
+        else:
+            logger.warning(f"{tabla_sql}: {graves} filas rechazadas (ver {RECHAZOS_DIR}/{bitacora.id}.jsonl).")
+        if importador.omitidos_cache:
+            logger.info(f"[CACHE] {tabla_sql}: {importador.omitidos_cache} filas maestras sin cambios omitidas.")
+        if importador.omitidos_existentes:
+            logger.info(f"[MAESTROS] {tabla_sql}: {importador.omitidos_existentes} filas maestras ya existentes no enviadas.")
+        if errores:
+            logger.warning(f"Errores en {tabla_sql}:")
+            for msg, count in errores.items():
+                logger.warning(f"   -> {count} veces: {msg[:100]}...")
+
+        return self._resumen_tabla(tabla_sql, total, exitos, cargador.rechazadas, importador)
+
+    def migrar_todas(self, dry_run: bool = False) -> list:
+        """
+        Migra todas las tablas del modulo en orden.
+        Con dry_run solo estima filas, bytes y duracion (no limpia ni inserta).
+        """
+        if dry_run:
+            return estimar_migracion(self, prefijo=self.PREFIJO_MODULO)
+        # Una sola sesion HANA para todas las extracciones del modulo.
+        # Al reanudar no se lee antes: cada tabla retoma su diario local.
+        extractos = {} if self.reanudar or not self.EXTRAER_JUNTAS else self._extraer_varias(
+            [t for t in self.tablas_objetivo if t in self.queries])
+        resultados = []
+        for tabla in self.tablas_objetivo:
+            if tabla not in self.queries:
+                logger.error(f"Query no definida para la tabla {tabla}")
+                continue
+            cantidad = self.migracion_hana_sql(self.queries[tabla], tabla, extractos.get(tabla))
+            resultados.append(self._resultado(tabla, cantidad))
+        registrar_transferencia(f"{self.__class__.__name__} {self.fecha:%Y-%m-%d}", self.transferencia)
+        return resultados
@@ -0,0 +1,131 @@
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Hilos de carga simultanea (uno por almacen como maximo)
+MAX_HILOS_ALMACENES = int(os.getenv("MIGRACION_HILOS_ALMACEN", "4"))
+
+
+def condicion_almacenes(columna: str, almacenes) -> str:
+    """
+    Filtro SQL para uno o varios almacenes.
+    '01' -> col = '01' | ['01', '09'] -> col IN ('01', '09')
+    """
+    if isinstance(almacenes, (list, tuple, set)):
+        lista = ", ".join(f"'{a}'" for a in almacenes)
+        return f"{columna} IN ({lista})"
+    return f"{columna} = '{almacenes}'"
+
+
+def particionar(registros, indice: int, valores: set) -> list:
+    """Filtra en memoria las filas cuyo almacen (columna `indice`) esta en `valores`."""
+    return [fila for fila in registros if str(fila[indice]) in valores]
+
+
+def sin_solapes(almacenes: list, valores: dict) -> list:
+    """
+    Quita los almacenes cuyos valores ya cubre otro almacen de la lista
+    (traslados: '16' cubre los Filler 15 y 16, asi que '15' sobra). Dos particiones
+    con valores comunes borrarian y cargarian los mismos documentos en paralelo.
+    """
+    quedan = []
+    for i, a in enumerate(almacenes):
+        # Con valores iguales se queda el primero
+        if not any(valores[a] < valores[b] or (valores[a] == valores[b] and j < i)
+                   for j, b in enumerate(almacenes) if j != i):
+            quedan.append(a)
+    return quedan
+
+
+def migrar_multi_almacen(clase_migrador, fecha, almacenes: list, max_hilos: int = None, **opciones) -> dict:
+    """
+    Migra varios almacenes con UNA sola extraccion HANA por tabla.
+
+    La clase del migrador debe exponer COLUMNAS_ALMACEN ({tabla: indice de la
+    columna almacen en la fila HANA}) y aceptar `registros` en migracion_hana_sql.
+    1. Extrae cada tabla particionada con filtro IN (...)
+    2. Reparte las filas por almacen en memoria
+    3. Carga las particiones en paralelo (limpieza + insercion por almacen)
+    4. Tablas globales (OWHS) se migran una sola vez
+    `opciones` se pasan tal cual al constructor del migrador (p. ej. forzar).
+    """
+    almacenes = list(dict.fromkeys(almacenes))
+    if hasattr(clase_migrador, "_valores_almacen"):
+        valores = {a: clase_migrador(fecha, a, **opciones)._valores_almacen() for a in almacenes}
+        quedan = sin_solapes(almacenes, valores)
+        if len(quedan) < len(almacenes):
+            logger.info(f"Almacenes ya cubiertos por otro de la lista (no se cargan aparte): "
+                        f"{[a for a in almacenes if a not in quedan]}")
+            almacenes = quedan
+        if any(valores[a] & valores[b] for a in almacenes for b in almacenes if a < b):
+            raise ValueError(f"Almacenes con valores superpuestos: {[(a, sorted(valores[a])) for a in almacenes]}")
+    migrador = clase_migrador(fecha, almacenes, **opciones)
+    columnas = clase_migrador.COLUMNAS_ALMACEN
+    resultado = {"extraccion": {}, "almacenes": {}, "globales": []}
+
+    # 1. Extraccion compartida (todas las tablas particionadas en una sola sesion HANA)
+    inicio = time.perf_counter()
+    extractos = migrador._extraer_varias([t for t in migrador.tablas_objetivo if t in columnas])
+    resultado["tiempo_extraccion"] = round(time.perf_counter() - inicio, 2)
+    for tabla, registros in extractos.items():
+        resultado["extraccion"][tabla] = {
+            "registros": len(registros) if registros is not None else 0,
+            "exito": registros is not None,
+            "transferencia": migrador.transferencia.get(tabla),
+        }
+        logger.info(f"Extraccion compartida {tabla} ({len(almacenes)} almacenes): "
+                    f"{resultado['extraccion'][tabla]['registros']} filas")
+
+    # 2 y 3. Particion y carga paralela
+    def cargar_almacen(almacen):
+        inicio_almacen = time.perf_counter()
+        m = clase_migrador(fecha, almacen, **opciones)
+        valores = m._valores_almacen() if hasattr(m, "_valores_almacen") else {almacen}
+        resultados = []
+        for tabla in m.tablas_objetivo:
+            if tabla not in extractos:
+                continue
+            if extractos[tabla] is None:
+                resultados.append({"tabla": tabla, "registros": 0, "exito": False, "tiempo": 0})
+                continue
+            particion = particionar(extractos[tabla], columnas[tabla], valores)
+            inicio = time.perf_counter()
+            cantidad = m.migracion_hana_sql(m.queries[tabla], tabla, registros=particion)
+            resultados.append({
+                "tabla": tabla,
+                "filas_particion": len(particion),
+                "registros": cantidad,
+                "exito": m.estado.get(tabla) != "error",
+                "status": m.estado.get(tabla, "ok"),
+                "tiempo": round(time.perf_counter() - inicio, 2),
+            })
+        return {"resultados": resultados, "tiempo": round(time.perf_counter() - inicio_almacen, 2)}
+
+    hilos = max(1, min(max_hilos or MAX_HILOS_ALMACENES, len(almacenes)))
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        futuros = {almacen: pool.submit(cargar_almacen, almacen) for almacen in almacenes}
+        for almacen, futuro in futuros.items():
+            try:
+                resultado["almacenes"][almacen] = futuro.result()
+            except Exception as e:
+                logger.error(f"Error cargando almacen {almacen}: {e}", exc_info=True)
+                resultado["almacenes"][almacen] = {"error": str(e)}
+
+    # 4. Tablas globales
+    for tabla in migrador.tablas_objetivo:
+        if tabla in columnas:
+            continue
+        inicio = time.perf_counter()
+        cantidad = migrador.migracion_hana_sql(migrador.queries[tabla], tabla)
+        resultado["globales"].append({
+            "tabla": tabla,
+            "registros": cantidad,
+            "exito": migrador.estado.get(tabla) != "error",
+            "status": migrador.estado.get(tabla, "ok"),
+            "tiempo": round(time.perf_counter() - inicio, 2),
+        })
+
+    return resultado
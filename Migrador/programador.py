@@ -0,0 +1,178 @@
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from Config.almacenes import ALMACENES
+from Conexion.conexion_sql import ConexionSQL
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# PROGRAMADOR (pre-migracion del dia anterior)
+# ==========================================
+# Reglas tipo cron (min hora dia mes dia_semana), varias separadas por ';'.
+# dia_semana: 0 = domingo ... 6 = sabado. Soporta *, */n, a-b, a,b
+# Se activa a proposito (MIGRACION_PROGRAMADOR=1): cada proceso de la API tendria su
+# propio programador. Si igual corre en varios procesos, cada disparo toma un candado
+# de aplicacion en SQL Server (sp_getapplock) y solo uno migra; los demas lo saltan.
+# Un disparo que llega cuando el otro ya termino solo relee HANA: con las huellas sin
+# cambios no se borra ni se carga de nuevo.
+PROGRAMADOR_ACTIVO = os.getenv("MIGRACION_PROGRAMADOR", "0") == "1"
+PROGRAMA_CANDADO = os.getenv("MIGRACION_PROGRAMA_CANDADO", "MIGRACION_PROGRAMADA")
+PROGRAMA = os.getenv("MIGRACION_PROGRAMA", "30 2 * * *")
+PROGRAMA_MODULOS = [m.strip() for m in os.getenv(
+    "MIGRACION_PROGRAMA_MODULOS", "ventas,despacho,traslados,recepcion,organoleptico").split(",") if m.strip()]
+PROGRAMA_JITTER = int(os.getenv("MIGRACION_PROGRAMA_JITTER", "300"))  # segundos aleatorios antes de arrancar
+PROGRAMA_HILOS = int(os.getenv("MIGRACION_PROGRAMA_HILOS", "2"))      # modulos a la vez
+
+_RANGOS = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+
+def _tomar_candado(sql, recurso: str) -> bool:
+    """Candado exclusivo de la sesion, sin espera. False si otro proceso lo tiene."""
+    sql.cursor.execute(
+        "SET NOCOUNT ON; DECLARE @r INT; "
+        "EXEC @r = sp_getapplock @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Session', @LockTimeout = 0; "
+        "SELECT @r", recurso
+    )
+    return sql.cursor.fetchone()[0] >= 0
+
+
+def _campo(texto: str, minimo: int, maximo: int) -> set:
+    valores = set()
+    for parte in texto.split(","):
+        paso = 1
+        if "/" in parte:
+            parte, paso = parte.split("/")
+            paso = int(paso)
+        if parte == "*":
+            inicio, fin = minimo, maximo
+        elif "-" in parte:
+            inicio, fin = (int(x) for x in parte.split("-"))
+        else:
+            inicio = fin = int(parte)
+        valores.update(range(inicio, fin + 1, paso))
+    return valores
+
+
+class ReglaCron:
+    def __init__(self, expresion: str):
+        campos = expresion.split()
+        if len(campos) != 5:
+            raise ValueError(f"Regla cron invalida (se esperan 5 campos): '{expresion}'")
+        self.expresion = expresion
+        self.minutos, self.horas, self.dias, self.meses, self.dias_semana = (
+            _campo(c, *r) for c, r in zip(campos, _RANGOS))
+
+    def coincide(self, momento: datetime) -> bool:
+        return (momento.minute in self.minutos and momento.hour in self.horas
+                and momento.day in self.dias and momento.month in self.meses
+                and (momento.weekday() + 1) % 7 in self.dias_semana)
+
+    def siguiente(self, desde: datetime) -> datetime:
+        """Primer minuto despues de `desde` que cumple la regla (busca hasta un año)."""
+        momento = desde.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(366 * 24 * 60):
+            if self.coincide(momento):
+                return momento
+            momento += timedelta(minutes=1)
+        raise ValueError(f"La regla '{self.expresion}' no se cumple nunca")
+
+
+class ProgramadorMigraciones:
+    """
+    Hilo de fondo que, en cada disparo de las reglas, migra el dia anterior
+    para cada modulo y todos los almacenes de Config/almacenes.ALMACENES.
+    `lanzar(modulo, fecha, almacenes)` es la funcion de migracion de la API
+    (pasa por el coalescedor: si un usuario pide lo mismo se une a la corrida).
+    Cada carga exitosa queda en MIGRACION_CONTROL, que consulta verificar_migracion.
+    """
+
+    def __init__(self, lanzar, reglas: str = PROGRAMA, modulos=None,
+                 jitter: int = PROGRAMA_JITTER, hilos: int = PROGRAMA_HILOS):
+        self.lanzar = lanzar
+        self.reglas = [ReglaCron(r.strip()) for r in reglas.split(";") if r.strip()]
+        self.modulos = modulos or PROGRAMA_MODULOS
+        self.jitter = jitter
+        self.hilos = max(1, hilos)
+        self.proxima = None
+        self.ultima_corrida = None
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name="programador-migracion", daemon=True)
+        self._hilo.start()
+        logger.info(f"Programador de migraciones activo: {[r.expresion for r in self.reglas]} -> {self.modulos}")
+
+    def detener(self):
+        self._parar.set()
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            ahora = datetime.now()
+            self.proxima = min(regla.siguiente(ahora) for regla in self.reglas)
+            espera = (self.proxima - ahora).total_seconds() + random.uniform(0, self.jitter)
+            if self._parar.wait(espera):
+                return
+            try:
+                self.ejecutar_ahora()
+            except Exception as e:
+                logger.error(f"Error en la migracion programada: {e}", exc_info=True)
+
+    def ejecutar_ahora(self, fecha=None) -> dict:
+        """
+        Migra `fecha` (por defecto ayer) para todos los modulos y almacenes.
+        Con el candado de SQL Server tomado por otro proceso no hace nada.
+        """
+        fecha = fecha or (datetime.now().date() - timedelta(days=1))
+        # La sesion que toma el candado queda abierta hasta terminar (al cerrarla se libera)
+        with ConexionSQL() as sql:
+            if not sql.db_estado:
+                raise ConnectionError("Sin conexion a SQL Server para el candado del programador")
+            if not _tomar_candado(sql, PROGRAMA_CANDADO):
+                logger.info(f"Migracion programada {fecha}: otro proceso la esta ejecutando, se omite")
+                return {"fecha": str(fecha), "omitida": "candado tomado por otro proceso"}
+            try:
+                return self._migrar_dia(fecha)
+            finally:
+                sql.cursor.execute("EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'", PROGRAMA_CANDADO)
+
+    def _migrar_dia(self, fecha) -> dict:
+        almacenes = list(ALMACENES)
+        inicio = time.perf_counter()
+        corrida = {"fecha": str(fecha), "inicio": datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "modulos": {}}
+        self.ultima_corrida = corrida
+        logger.info(f"Migracion programada {fecha}: {self.modulos} x {almacenes}")
+
+        def migrar(modulo):
+            t0 = time.perf_counter()
+            try:
+                self.lanzar(modulo, fecha, almacenes)
+                corrida["modulos"][modulo] = {"estado": "done", "tiempo": round(time.perf_counter() - t0, 2)}
+            except Exception as e:
+                logger.error(f"Migracion programada {modulo} {fecha} fallida: {e}", exc_info=True)
+                corrida["modulos"][modulo] = {"estado": "error", "error": str(e)}
+
+        with ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="programada") as pool:
+            list(pool.map(migrar, self.modulos))
+
+        corrida["tiempo"] = round(time.perf_counter() - inicio, 2)
+        logger.info(f"Migracion programada {fecha} terminada en {corrida['tiempo']}s")
+        return corrida
+
+    def estado(self) -> dict:
+        return {
+            "activo": bool(self._hilo and self._hilo.is_alive()),
+            "reglas": [r.expresion for r in self.reglas],
+            "modulos": self.modulos,
+            "proxima": self.proxima.strftime('%Y-%m-%d %H:%M') if self.proxima else None,
+            "ultima_corrida": self.ultima_corrida,
+        }
@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import pickle
+import re
+
+from Migrador.control_migracion import clave_almacen
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# PUNTOS DE CONTROL (diario local en disco)
+# ==========================================
+# Una corrida (modulo, fecha, almacen) deja en CHECKPOINT_DIR:
+#   <id>.json          -> etapa, huella, sentencias confirmadas
+#   <id>.extracto.pkl  -> extracto HANA (etapa "extraido")
+#   <id>.plan.pkl      -> sentencias generadas (etapa "planificado")
+# Si el servicio o SQL Server caen, la siguiente llamada con reanudar=True no
+# vuelve a leer HANA: sigue desde el ultimo commit registrado (en el staging, ver
+# estrategia_commit; la limpieza va en la transaccion que publica la carga).
+CHECKPOINT_DIR = os.getenv("MIGRACION_CHECKPOINT_DIR", "Checkpoints")
+# Serializar y sincronizar a disco el extracto y el plan cuesta en cada corrida. Por
+# defecto solo llevan diario las corridas pedidas con reanudar=True; con 1 todas.
+# Reanudar una corrida sin diario vuelve a leer HANA y carga desde el principio.
+DIARIO_COMPLETO = os.getenv("MIGRACION_DIARIO_COMPLETO", "0") == "1"
+
+# Filas ejecutadas entre commits intermedios con la estrategia "filas" (cada commit es un punto de control)
+COMMIT_CADA = int(os.getenv("MIGRACION_COMMIT_CADA", "200"))
+
+# SQLSTATE de conexion caida / timeout: se corta la carga en vez de seguir acumulando errores
+SQLSTATE_CONEXION = ('08S01', '08001', '08003', '08004', '08007', 'HYT00', 'HYT01')
+
+
+def error_de_conexion(e: Exception) -> bool:
+    """True si el error de pyodbc indica que se perdio la conexion con SQL Server."""
+    estado = e.args[0] if getattr(e, 'args', None) else ''
+    return isinstance(estado, str) and estado in SQLSTATE_CONEXION
+
+
+def _escribir_atomico(ruta: str, datos: bytes):
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+class BitacoraMigracion:
+    """
+    Diario de una corrida. Con reanudar=False se descarta cualquier diario previo y,
+    sin DIARIO_COMPLETO, no se escribe uno nuevo.
+    Atributos tras abrir un diario reanudable:
+    - plan: lista [(tabla, indice, sentencia)] o None si aun no se genero
+    - huella, total: del extracto que origino el plan
+    - confirmados: sentencias del plan ya commiteadas
+    - errores: errores graves (no PK) de sesiones anteriores
+    - orden: "plan" o "paralelo" (staging llenado en paralelo, ver estrategia_commit):
+      como se cuentan los confirmados
+    """
+
+    def __init__(self, modulo: str, fecha, almacen, reanudar: bool = False):
+        fecha_txt = fecha if isinstance(fecha, str) else fecha.strftime('%Y-%m-%d')
+        almacen_txt = "TODOS" if almacen == "*" else re.sub(r'[^\w-]', '-', clave_almacen(almacen))
+        base = os.path.join(CHECKPOINT_DIR, f"{modulo}_{fecha_txt}_{almacen_txt}")
+        self.id = os.path.basename(base)
+        self._ruta_estado = base + ".json"
+        self._ruta_extracto = base + ".extracto.pkl"
+        self._ruta_plan = base + ".plan.pkl"
+
+        self.modulo = modulo
+        self.etapa = None
+        self.plan = None
+        self.huella = None
+        self.total = 0
+        self.confirmados = 0
+        self.errores = 0
+        self.orden = "plan"
+        self.persistir = DIARIO_COMPLETO or reanudar
+
+        if not reanudar:
+            self.cerrar()
+            return
+        self._cargar()
+
+    # --- Lectura ---
+
+    def _cargar(self):
+        try:
+            if not os.path.exists(self._ruta_estado):
+                return
+            with open(self._ruta_estado, encoding="utf-8") as f:
+                estado = json.load(f)
+            self.etapa = estado.get("etapa")
+            self.huella = estado.get("huella")
+            self.total = estado.get("total", 0)
+            self.confirmados = estado.get("confirmados", 0)
+            self.errores = estado.get("errores", 0)
+            self.orden = estado.get("orden", "plan")
+            if self.etapa == "planificado":
+                with open(self._ruta_plan, "rb") as f:
+                    self.plan = pickle.load(f)
+                logger.info(f"[CHECKPOINT] {self.id}: reanudando en {self.confirmados}/{len(self.plan)}")
+        except Exception as e:
+            logger.warning(f"[CHECKPOINT] Diario {self.id} ilegible, se empieza de cero: {e}")
+            self.cerrar()
+
+    def extracto(self):
+        """Extracto HANA guardado por una corrida anterior (o None)."""
+        if self.etapa not in ("extraido", "planificado"):
+            return None
+        try:
+            with open(self._ruta_extracto, "rb") as f:
+                registros = pickle.load(f)
+            logger.info(f"[CHECKPOINT] {self.id}: extracto recuperado de disco ({len(registros)} filas)")
+            return registros
+        except Exception as e:
+            logger.warning(f"[CHECKPOINT] No se pudo leer el extracto de {self.id}: {e}")
+            return None
+
+    # --- Escritura ---
+
+    def _guardar_estado(self):
+        estado = {
+            "modulo": self.modulo,
+            "etapa": self.etapa,
+            "huella": self.huella,
+            "total": self.total,
+            "confirmados": self.confirmados,
+            "errores": self.errores,
+            "orden": self.orden,
+        }
+        _escribir_atomico(self._ruta_estado, json.dumps(estado).encode("utf-8"))
+
+    def guardar_extracto(self, registros):
+        """Guarda el extracto (como tuplas) y lo devuelve. Un fallo de disco no detiene la migracion."""
+        registros = [tuple(fila) for fila in registros]
+        if not self.persistir:
+            return registros
+        try:
+            os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+            _escribir_atomico(self._ruta_extracto, pickle.dumps(registros, pickle.HIGHEST_PROTOCOL))
+            self.etapa = "extraido"
+            self._guardar_estado()
+        except Exception as e:
+            logger.warning(f"[CHECKPOINT] No se pudo guardar el extracto de {self.id}: {e}")
+        return registros
+
+    def guardar_plan(self, plan: list, huella: str, total: int):
+        """Sentencias generadas: a partir de aqui solo se avanza."""
+        self.plan, self.huella, self.total = plan, huella, total
+        self.confirmados, self.errores, self.orden = 0, 0, "plan"
+        if not self.persistir:
+            return
+        try:
+            os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+            _escribir_atomico(self._ruta_plan, pickle.dumps(plan, pickle.HIGHEST_PROTOCOL))
+            self.etapa = "planificado"
+            self._guardar_estado()
+        except Exception as e:
+            logger.warning(f"[CHECKPOINT] No se pudo guardar el plan de {self.id}: {e}")
+
+    def avance(self, confirmados: int, errores: int = 0, orden: str = None):
+        """Llamar justo despues de cada commit."""
+        self.confirmados = confirmados
+        if orden:
+            self.orden = orden
+        if self.etapa != "planificado":
+            return
+        try:
+            self.errores = errores
+            self._guardar_estado()
+        except Exception as e:
+            logger.warning(f"[CHECKPOINT] No se pudo registrar el avance de {self.id}: {e}")
+
+    def cerrar(self):
+        """Corrida terminada (o descartada): borra el diario."""
+        for ruta in (self._ruta_estado, self._ruta_extracto, self._ruta_plan):
+            try:
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            except Exception as e:
+                logger.warning(f"[CHECKPOINT] No se pudo borrar {ruta}: {e}")
+        self.etapa = None
+        self.plan = None
+
+
+def corridas_pendientes() -> list:
+    """Diarios sin terminar (para el endpoint de consulta)."""
+    pendientes = []
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return pendientes
+    for nombre in sorted(os.listdir(CHECKPOINT_DIR)):
+        if not nombre.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(CHECKPOINT_DIR, nombre), encoding="utf-8") as f:
+                estado = json.load(f)
+            estado["id"] = nombre[:-len(".json")]
+            pendientes.append(estado)
+        except Exception as e:
+            logger.warning(f"[CHECKPOINT] Diario {nombre} ilegible: {e}")
+    return pendientes
@@ -0,0 +1,252 @@
+import logging
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from Conexion.conexion_hana import ConexionHANA
+from Conexion.conexion_sql import ConexionSQL
+from Config.conexion_config import CONFIG_HANA
+from Procesamiento.Importador import Importador
+from Procesamiento.cache_maestros import cache_maestros
+from Migrador.cargador import CargadorSQL
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# SINCRONIZACION POR HASH DE RANGOS (tipo Merkle)
+# ==========================================
+# Tablas maestras completas sin fecha de modificacion confiable (OBTW, OWHS): en vez
+# de releer la tabla entera se comparan resumenes por rango en ambos lados.
+# Cada fila cae en el rango del prefijo hex del MD5 de su clave; el resumen de un
+# rango es (filas, suma de los primeros 4 bytes del MD5 de la fila), calculado en
+# HANA (HASH_MD5) y en SQL Server (HASHBYTES) con la misma forma canonica de texto.
+# Solo se baja un nivel (un caracter hex mas: 16 subrangos) en los rangos distintos,
+# y los rangos chicos se comparan fila por fila: viajan solo esas filas.
+# Si la forma canonica difiere entre motores (acentos, fechas) el rango sale
+# "distinto" y se resuelve comparando filas: cuesta transferencia, no exactitud.
+SYNC_NIVEL_INICIAL = int(os.getenv("MIGRACION_SYNC_NIVEL_INICIAL", "2"))  # 2 hex = 256 rangos
+SYNC_HOJA_FILAS = int(os.getenv("MIGRACION_SYNC_HOJA_FILAS", "500"))      # Rango hoja: se comparan filas
+SYNC_MAX_NIVEL = 8
+_PREFIJOS_POR_CONSULTA = 500
+
+# tabla -> (columna clave, columnas en el orden de la consulta del migrador general)
+TABLAS_SINCRONIZABLES = {
+    'OBTW': ('AbsEntry', ['ItemCode', 'MdAbsEntry', 'WhsCode', 'Location', 'AbsEntry']),
+    'OWHS': ('WhsCode', ['WhsCode', 'WhsName', 'TaxOffice']),
+}
+
+
+# --- Expresiones de hash en cada motor ---
+
+def _hana_texto(columna: str) -> str:
+    return f"""COALESCE(TO_NVARCHAR(T."{columna}"), '')"""
+
+
+def _sql_texto(columna: str) -> str:
+    return f"COALESCE(CAST(T.{columna} AS NVARCHAR(4000)), '')"
+
+
+def _hash_hana(columnas: list) -> str:
+    texto = " || '|' || ".join(_hana_texto(c) for c in columnas)
+    return f"HASH_MD5(TO_BINARY({texto}))"
+
+
+def _hash_sql(columnas: list) -> str:
+    # CONCAT necesita dos argumentos: el '' final cubre la clave sola
+    texto = ", '|', ".join(_sql_texto(c) for c in columnas)
+    return f"HASHBYTES('MD5', CAST(CONCAT({texto}, '') AS VARCHAR(8000)))"
+
+
+def _consulta_hana(tabla: str, clave: str, columnas: list, seleccion: str, largo_prefijos: dict, agrupar: str = "") -> str:
+    esquema = CONFIG_HANA.get("schema", "SBO_SCHEMA")
+    return f"""
+        SELECT {seleccion} FROM (
+            SELECT T.*, BINTOHEX({_hash_hana([clave])}) AS "H_CLAVE", BINTOHEX({_hash_hana(columnas)}) AS "H_FILA"
+            FROM {esquema}.{tabla} T
+        ) R
+        {_condicion_prefijos('SUBSTR(R."H_CLAVE", 1, {n})', largo_prefijos)}
+        {agrupar}
+    """
+
+
+def _consulta_sql(tabla: str, clave: str, columnas: list, seleccion: str, largo_prefijos: dict, agrupar: str = "") -> str:
+    return f"""
+        SELECT {seleccion} FROM (
+            SELECT T.*, CONVERT(VARCHAR(32), {_hash_sql([clave])}, 2) AS H_CLAVE, {_hash_sql(columnas)} AS H_FILA
+            FROM dbo.{tabla} T
+        ) R
+        {_condicion_prefijos('LEFT(R.H_CLAVE, {n})', largo_prefijos)}
+        {agrupar}
+    """
+
+
+def _condicion_prefijos(expresion: str, largo_prefijos: dict) -> str:
+    """WHERE de los rangos pedidos ({largo: [prefijos]}); sin prefijos = toda la tabla."""
+    partes = [f"{expresion.format(n=largo)} IN ({', '.join(repr(p) for p in prefijos)})"
+              for largo, prefijos in largo_prefijos.items() if prefijos]
+    return f"WHERE {' OR '.join(partes)}" if partes else ""
+
+
+def _por_largo(prefijos) -> dict:
+    agrupados = {}
+    for prefijo in prefijos:
+        agrupados.setdefault(len(prefijo), []).append(prefijo)
+    return agrupados
+
+
+def _lotes(prefijos: list):
+    for i in range(0, len(prefijos), _PREFIJOS_POR_CONSULTA):
+        yield prefijos[i:i + _PREFIJOS_POR_CONSULTA]
+
+
+def _normalizar(valor):
+    """Valor comparable entre HANA y SQL Server (mismo criterio que el INSERT del Importador)."""
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return format(Decimal(str(valor)).normalize(), 'f')
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(valor, date):
+        return valor.strftime('%Y-%m-%d 00:00:00')
+    texto = str(valor).strip()
+    return texto or None
+
+
+class SincronizadorTabla:
+    """Compara una tabla maestra HANA <-> SQL Server por rangos y aplica solo las diferencias."""
+
+    def __init__(self, tabla: str, hana, sql, origen: str):
+        self.tabla = tabla
+        self.clave, self.columnas = TABLAS_SINCRONIZABLES[tabla]
+        self.hana = hana
+        self.sql = sql
+        self.origen = origen  # Nombre del archivo de rechazos
+        self.rangos_comparados = 0
+        self.rangos_distintos = 0
+        self.niveles = 0
+
+    def _resumen(self, largo: int, prefijos: list) -> tuple:
+        """({rango: (filas, suma)} HANA, idem SQL Server) de los subrangos de `prefijos` con `largo` caracteres."""
+        hana, sql = {}, {}
+        for lote in (_lotes(prefijos) if prefijos else [[]]):
+            pedidos = _por_largo(lote)
+            consulta = _consulta_hana(
+                self.tabla, self.clave, self.columnas,
+                f'SUBSTR(R."H_CLAVE", 1, {largo}), COUNT(*), SUM(HEXTONUM(SUBSTR(R."H_FILA", 1, 8)))',
+                pedidos, f'GROUP BY SUBSTR(R."H_CLAVE", 1, {largo})')
+            filas = self.hana.obtener_tablas({self.tabla: consulta})[self.tabla]
+            if filas is None:
+                raise RuntimeError(f"Fallo el resumen HANA de {self.tabla} (nivel {largo})")
+            hana.update({r[0]: (int(r[1]), int(r[2])) for r in filas})
+
+            self.sql.cursor.execute(_consulta_sql(
+                self.tabla, self.clave, self.columnas,
+                f"LEFT(R.H_CLAVE, {largo}), COUNT(*), SUM(CONVERT(BIGINT, SUBSTRING(R.H_FILA, 1, 4)))",
+                pedidos, f"GROUP BY LEFT(R.H_CLAVE, {largo})"))
+            sql.update({r[0]: (int(r[1]), int(r[2])) for r in self.sql.cursor.fetchall()})
+        return hana, sql
+
+    def rangos_hoja(self) -> list:
+        """Baja por los rangos distintos hasta rangos chicos. Devuelve los prefijos a comparar fila por fila."""
+        hojas, pendientes, largo = [], [], SYNC_NIVEL_INICIAL
+        while True:
+            hana, sql = self._resumen(largo, pendientes)
+            self.niveles += 1
+            rangos = set(hana) | set(sql)
+            self.rangos_comparados += len(rangos)
+            distintos = [r for r in sorted(rangos) if hana.get(r) != sql.get(r)]
+            self.rangos_distintos += len(distintos)
+            pendientes = []
+            for rango in distintos:
+                filas = max(hana.get(rango, (0, 0))[0], sql.get(rango, (0, 0))[0])
+                (hojas if filas <= SYNC_HOJA_FILAS or largo >= SYNC_MAX_NIVEL else pendientes).append(rango)
+            if not pendientes:
+                return hojas
+            largo += 1
+
+    def diferencias(self, hojas: list) -> tuple:
+        """(filas HANA a insertar, claves a borrar en SQL Server, filas comparadas) de los rangos hoja."""
+        indice = self.columnas.index(self.clave)
+        hana, sql = {}, {}
+        for lote in _lotes(hojas):
+            pedidos = _por_largo(lote)
+            seleccion = ", ".join(f'R."{c}"' for c in self.columnas)
+            filas = self.hana.obtener_tablas(
+                {self.tabla: _consulta_hana(self.tabla, self.clave, self.columnas, seleccion, pedidos)})[self.tabla]
+            if filas is None:
+                raise RuntimeError(f"Fallo la lectura de filas HANA de {self.tabla}")
+            hana.update({_normalizar(f[indice]): f for f in filas})
+
+            self.sql.cursor.execute(_consulta_sql(
+                self.tabla, self.clave, self.columnas, ", ".join(f"R.{c}" for c in self.columnas), pedidos))
+            sql.update({_normalizar(f[indice]): f for f in self.sql.cursor.fetchall()})
+
+        insertar = [f for k, f in hana.items()
+                    if k not in sql or [_normalizar(v) for v in f] != [_normalizar(v) for v in sql[k]]]
+        borrar = [k for k, f in sql.items()
+                  if k not in hana or [_normalizar(v) for v in f] != [_normalizar(v) for v in hana[k]]]
+        return insertar, borrar, len(hana) + len(sql)
+
+    def aplicar(self, insertar: list, borrar: list) -> dict:
+        """Borra las claves distintas/sobrantes e inserta las filas de HANA, en una transaccion."""
+        cursor = self.sql.cursor
+        if borrar:
+            cursor.execute("IF OBJECT_ID('tempdb..#CLAVES_SYNC') IS NOT NULL DROP TABLE #CLAVES_SYNC")
+            cursor.execute("CREATE TABLE #CLAVES_SYNC (Clave NVARCHAR(100) NOT NULL)")
+            cursor.fast_executemany = True
+            cursor.executemany("INSERT INTO #CLAVES_SYNC (Clave) VALUES (?)", [(k,) for k in borrar])
+            cursor.fast_executemany = False
+            cursor.execute(f"DELETE T FROM dbo.{self.tabla} T JOIN #CLAVES_SYNC K ON T.{self.clave} = K.Clave")
+            cursor.execute("DROP TABLE #CLAVES_SYNC")
+
+        # Las filas que se reemplazan no pueden quedar "vigentes" en la cache de maestros
+        cache_maestros.invalidar(self.tabla)
+        importador = Importador()
+        for fila in insertar:
+            importador.query_transaccion(fila, self.tabla)
+        cargador = CargadorSQL(self.sql, self.origen)
+        for bloque in importador.obtener_query_final():
+            cargador.ejecutar(bloque, self.tabla)
+        self.sql.conexion.commit()
+        return cargador.resumen()
+
+
+def sincronizar_tabla(tabla: str, origen: str = None, mediciones: list = None) -> dict:
+    """
+    Sincroniza una tabla de TABLAS_SINCRONIZABLES transfiriendo solo los rangos distintos.
+    Las mediciones de transferencia HANA se agregan a `mediciones`.
+    """
+    inicio = time.perf_counter()
+    with ConexionHANA() as hana, ConexionSQL() as sql:
+        if not hana.db_estado or not sql.db_estado:
+            raise ConnectionError(f"Sin conexion a HANA o SQL Server para sincronizar {tabla}")
+        try:
+            sincronizador = SincronizadorTabla(tabla, hana, sql, origen or f"SYNC_{tabla}")
+            hojas = sincronizador.rangos_hoja()
+            insertar, borrar, filas_comparadas = sincronizador.diferencias(hojas) if hojas else ([], [], 0)
+            carga = sincronizador.aplicar(insertar, borrar) if insertar or borrar else None
+        except Exception:
+            sql.conexion.rollback()  # ConexionSQL confirma al salir: no publicar un borrado sin su insercion
+            raise
+        finally:
+            if mediciones is not None:
+                mediciones.extend(hana.metricas)
+
+    resumen = {
+        "tabla": tabla,
+        "niveles": sincronizador.niveles,
+        "rangos_comparados": sincronizador.rangos_comparados,
+        "rangos_distintos": sincronizador.rangos_distintos,
+        "rangos_hoja": len(hojas),
+        "filas_comparadas": filas_comparadas,
+        "insertadas": len(insertar),
+        "borradas": len(borrar),
+        "carga": carga,
+        "segundos": round(time.perf_counter() - inicio, 2),
+    }
+    logger.info(f"[SYNC] {tabla}: {resumen['rangos_comparados']} rangos comparados en {resumen['niveles']} niveles, "
+                f"{resumen['rangos_hoja']} rangos hoja ({filas_comparadas} filas), "
+                f"{len(insertar)} filas enviadas, {len(borrar)} borradas ({resumen['segundos']}s)")
+    return resumen
@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+
+from Migrador.control_migracion import clave_almacen
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# SNAPSHOTS DE EXTRACCION (replay sin HANA)
+# ==========================================
+# Cada extracto HANA se puede guardar como archivo columnar comprimido:
+#   <modulo>_<fecha>_<almacen>_<hash consulta>.snap.gz
+# Modo "guardar": lee HANA y guarda el snapshot.
+# Modo "cargar": usa el snapshot si existe (no toca HANA); si no, lee HANA y lo guarda.
+# El hash de la consulta invalida solo los snapshots cuando cambia el SQL.
+SNAPSHOT_MODO = os.getenv("MIGRACION_SNAPSHOT", "")  # "" | "guardar" | "cargar"
+SNAPSHOT_DIR = os.getenv("MIGRACION_SNAPSHOT_DIR", "Snapshots")
+SNAPSHOT_RETENCION_DIAS = int(os.getenv("MIGRACION_SNAPSHOT_RETENCION_DIAS", "7"))
+SNAPSHOT_MAX_MB = int(os.getenv("MIGRACION_SNAPSHOT_MAX_MB", "2048"))
+
+MODOS_SNAPSHOT = ("guardar", "cargar")
+
+_lock = threading.Lock()
+
+
+def _huella_consulta(query: str) -> str:
+    return hashlib.sha1(" ".join(query.split()).encode("utf-8")).hexdigest()[:12]
+
+
+def ruta_snapshot(modulo: str, fecha, almacen, query: str) -> str:
+    fecha_txt = fecha if isinstance(fecha, str) else fecha.strftime('%Y-%m-%d')
+    almacen_txt = "TODOS" if almacen == "*" else re.sub(r'[^\w-]', '-', clave_almacen(almacen))
+    nombre = f"{modulo}_{fecha_txt}_{almacen_txt}_{_huella_consulta(query)}.snap.gz"
+    return os.path.join(SNAPSHOT_DIR, nombre)
+
+
+def guardar_snapshot(modulo: str, fecha, almacen, query: str, registros):
+    """Guarda el extracto por columnas (gzip). Un fallo de disco no detiene la migracion."""
+    ruta = ruta_snapshot(modulo, fecha, almacen, query)
+    try:
+        inicio = time.perf_counter()
+        contenido = {
+            "version": 1,
+            "modulo": modulo,
+            "filas": len(registros),
+            "columnas": [list(c) for c in zip(*registros)],
+        }
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        temporal = ruta + ".tmp"
+        with gzip.open(temporal, "wb", compresslevel=6) as f:
+            pickle.dump(contenido, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporal, ruta)
+        logger.info(f"[SNAPSHOT] {os.path.basename(ruta)}: {len(registros)} filas "
+                    f"({os.path.getsize(ruta) // 1024} KB, {time.perf_counter() - inicio:.2f}s)")
+        aplicar_retencion()
+    except Exception as e:
+        logger.warning(f"[SNAPSHOT] No se pudo guardar {ruta}: {e}")
+
+
+def cargar_snapshot(modulo: str, fecha, almacen, query: str):
+    """Filas (tuplas) del snapshot o None si no existe / no se puede leer."""
+    ruta = ruta_snapshot(modulo, fecha, almacen, query)
+    if not os.path.exists(ruta):
+        logger.info(f"[SNAPSHOT] Sin snapshot para {os.path.basename(ruta)}, se lee HANA")
+        return None
+    try:
+        with gzip.open(ruta, "rb") as f:
+            contenido = pickle.load(f)
+        os.utime(ruta)  # Uso reciente: lo ultimo que expulsa la retencion por tamaño
+        registros = list(zip(*contenido["columnas"])) if contenido["filas"] else []
+        logger.info(f"[SNAPSHOT] {os.path.basename(ruta)}: {len(registros)} filas cargadas sin HANA")
+        return registros
+    except Exception as e:
+        logger.warning(f"[SNAPSHOT] Snapshot ilegible {ruta}: {e}")
+        return None
+
+
+def listar_snapshots() -> list:
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return []
+    snapshots = []
+    for nombre in sorted(os.listdir(SNAPSHOT_DIR)):
+        if nombre.endswith(".snap.gz"):
+            info = os.stat(os.path.join(SNAPSHOT_DIR, nombre))
+            snapshots.append({
+                "archivo": nombre,
+                "kb": info.st_size // 1024,
+                "usado": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info.st_mtime)),
+            })
+    return snapshots
+
+
+def aplicar_retencion():
+    """Borra snapshots mas viejos que la retencion y, si se supera el tamaño maximo, los menos usados."""
+    with _lock:
+        if not os.path.isdir(SNAPSHOT_DIR):
+            return
+        archivos = []
+        limite = time.time() - SNAPSHOT_RETENCION_DIAS * 86400
+        for nombre in os.listdir(SNAPSHOT_DIR):
+            if not nombre.endswith(".snap.gz"):
+                continue
+            ruta = os.path.join(SNAPSHOT_DIR, nombre)
+            try:
+                info = os.stat(ruta)
+                if info.st_mtime < limite:
+                    os.remove(ruta)
+                    continue
+                archivos.append((info.st_mtime, info.st_size, ruta))
+            except OSError:
+                continue
+        total = sum(a[1] for a in archivos)
+        maximo = SNAPSHOT_MAX_MB * 1024 * 1024
+        for _, tamano, ruta in sorted(archivos):
+            if total <= maximo:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+                logger.info(f"[SNAPSHOT] Expulsado por tamaño: {os.path.basename(ruta)}")
+            except OSError:
+                pass
@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# TRABAJOS DE MIGRACION (ejecucion en segundo plano)
+# ==========================================
+# Mismo patron que los PDF (task_id + consulta de progreso), pero con un pool
+# acotado: como mucho MAX_TRABAJOS migraciones a la vez, el resto queda "queued".
+# Las sesiones HANA ademas estan limitadas en ConexionHANA (HANA_MAX_SESIONES).
+MAX_TRABAJOS = int(os.getenv("MIGRACION_MAX_TRABAJOS", "2"))
+RETENCION_SEGUNDOS = int(os.getenv("MIGRACION_TRABAJOS_RETENCION", "3600"))
+
+_pool = ThreadPoolExecutor(max_workers=MAX_TRABAJOS, thread_name_prefix="migracion")
+_lock = threading.Lock()
+trabajos_migracion = {}  # task_id -> estado del trabajo
+
+
+def _ahora():
+    return time.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _purgar():
+    """Olvida los trabajos terminados hace mas de RETENCION_SEGUNDOS."""
+    limite = time.time() - RETENCION_SEGUNDOS
+    for task_id in [t for t, j in trabajos_migracion.items() if j.get("_fin", time.time()) < limite]:
+        del trabajos_migracion[task_id]
+
+
+class ProgresoTrabajo:
+    """
+    Callback que reciben los migradores (parametro `progreso`).
+    progreso(tabla, etapa, almacen=..., filas=..., hechos=..., total=...)
+    etapa: "extraido" | "cargando" | "ok" | "unchanged" | "resumed" | "error"
+    """
+
+    def __init__(self, task_id: str, almacen):
+        self.task_id = task_id
+        self.almacen = almacen
+
+    def __call__(self, tabla: str, etapa: str, almacen=None, **datos):
+        # En trabajos multi-almacen la misma tabla se carga una vez por almacen
+        clave = tabla if almacen is None or almacen == self.almacen else f"{tabla} [{almacen}]"
+        with _lock:
+            trabajo = trabajos_migracion.get(self.task_id)
+            if trabajo is None:
+                return
+            tabla_estado = trabajo["tablas"].setdefault(clave, {})
+            tabla_estado.update(datos)
+            tabla_estado["etapa"] = etapa
+            tabla_estado["actualizado"] = _ahora()
+
+
+def enviar_trabajo(descripcion: dict, funcion, clave=None) -> str:
+    """
+    Encola `funcion(progreso)` en el pool y devuelve el task_id.
+    `descripcion` (modulo, fecha, almacen...) se copia tal cual al estado del trabajo.
+    Si ya hay un trabajo pendiente o en curso con la misma `clave`, devuelve su task_id.
+    """
+    task_id = str(uuid.uuid4())
+    with _lock:
+        _purgar()
+        if clave is not None:
+            for existente, trabajo in trabajos_migracion.items():
+                if trabajo.get("_clave") == clave and trabajo["estado"] in ("queued", "running"):
+                    logger.info(f"Trabajo {existente} reutilizado para {clave}")
+                    return existente
+        trabajos_migracion[task_id] = dict(descripcion, estado="queued", tablas={},
+                                           creado=_ahora(), inicio=None, fin=None, _clave=clave)
+    progreso = ProgresoTrabajo(task_id, descripcion.get("almacen"))
+
+    def ejecutar():
+        with _lock:
+            trabajos_migracion[task_id].update(estado="running", inicio=_ahora())
+        logger.info(f"Trabajo {task_id} iniciado: {descripcion}")
+        try:
+            resultados = funcion(progreso)
+            cambios = {"estado": "done", "resultados": resultados}
+        except Exception as e:
+            logger.error(f"Trabajo {task_id} fallido: {e}", exc_info=True)
+            cambios = {"estado": "error", "error": str(e)}
+        with _lock:
+            trabajos_migracion[task_id].update(cambios, fin=_ahora(), _fin=time.time())
+        logger.info(f"Trabajo {task_id} terminado: {cambios['estado']}")
+
+    _pool.submit(ejecutar)
+    return task_id
+
+
+def consultar_trabajo(task_id: str):
+    with _lock:
+        trabajo = trabajos_migracion.get(task_id)
+        if trabajo is None:
+            return None
+        # Copia sin campos internos (el trabajo sigue mutando en otro hilo)
+        copia = {k: v for k, v in trabajo.items() if not k.startswith("_")}
+        copia["tablas"] = {t: dict(e) for t, e in trabajo["tablas"].items()}
+        return copia
+
+
+def listar_trabajos() -> list:
+    with _lock:
+        ids = list(trabajos_migracion)
+    return [dict(consultar_trabajo(t) or {}, task_id=t) for t in ids]
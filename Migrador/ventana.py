@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+
+class VentanaFechas:
+    """
+    Rango semiabierto de dias [desde, hasta).
+    La misma ventana arma el filtro de la extraccion HANA y el de la limpieza en
+    SQL Server: lo que se borra es exactamente lo que se vuelve a cargar.
+    """
+
+    def __init__(self, desde, dias: int = 1):
+        self.desde = desde.date() if isinstance(desde, datetime) else desde
+        self.hasta = self.desde + timedelta(days=dias)
+
+    @classmethod
+    def alrededor(cls, fecha, margen_dias: int = 0):
+        """Ventana centrada en `fecha` con `margen_dias` antes y despues."""
+        fecha = fecha.date() if isinstance(fecha, datetime) else fecha
+        return cls(fecha - timedelta(days=margen_dias), 1 + 2 * margen_dias)
+
+    @property
+    def dias(self) -> int:
+        return (self.hasta - self.desde).days
+
+    def condicion(self, columna: str) -> str:
+        # Literales 'YYYY-MM-DD': sirven igual en HANA y en SQL Server, y la columna queda sin funciones (usa indices)
+        return f"{columna} >= '{self.desde.strftime('%Y-%m-%d')}' AND {columna} < '{self.hasta.strftime('%Y-%m-%d')}'"
+
+    def como_dict(self) -> dict:
+        return {"desde": str(self.desde), "hasta": str(self.hasta - timedelta(days=1)), "dias": self.dias}
+
+    def __repr__(self):
+        return f"VentanaFechas({self.desde} .. {self.hasta})"
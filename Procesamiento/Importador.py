@@ -1,13 +1,37 @@
 import logging
 from datetime import datetime, date
+from Procesamiento.cache_maestros import CacheMaestros, cache_maestros
 
 logger = logging.getLogger(__name__)
 
+
+def clave_texto(pk) -> tuple:
+    """PK normalizada a tupla de texto (para comparar con lo que devuelve SQL Server)."""
+    partes = pk if isinstance(pk, tuple) else (pk,)
+    return tuple(str(p).strip() for p in partes)
+
+
 class Importador:
+    # PK de las tablas maestras (índices sobre los valores mapeados)
+    PK_MAESTROS = {
+        "OITM": (0,),     # ItemCode
+        "OWHS": (0,),     # WhsCode
+        "OBTW": (4,),     # AbsEntry
+        "OBTN": (0, 1),   # ItemCode + DistNumber
+    }
+
     def __init__(self):
         self.query_sql = []  # Lista de bloques de queries
         self.bloque_actual = [] # Buffer temporal para el bloque actual
         self.tamano_bloque = 50 # Límite de inserts por bloque
+
+        # Cache de maestros: filas omitidas y filas pendientes de confirmar
+        self.omitidos_cache = 0
+        self.omitidos_existentes = 0  # Maestros que ya estaban en SQL Server (consulta previa de claves)
+        self.maestros_pendientes = {}  # tabla -> [(pk, huella)] alineado con self.inserts[tabla]
+        self.maestros_bloques = []     # [(tabla, pk, huella)] por bloque, alineado con self.query_sql
+        self._maestros_bloque_actual = []
+        self._confirmados = []
         
         # DEFINICIÓN DE MAPEOS (Tabla -> Índices de HANA)
         # Esto reemplaza el if/elif gigante. Es más limpio y fácil de editar.
@@ -57,8 +81,22 @@ class Importador:
 
         # Si alcanzamos el límite, guardamos el bloque y limpiamos
         if len(self.bloque_actual) >= self.tamano_bloque:
-            self.query_sql.append("".join(self.bloque_actual))
-            self.bloque_actual = []
+            self._cerrar_bloque()
+
+    def _cerrar_bloque(self):
+        self.query_sql.append("".join(self.bloque_actual))
+        self.maestros_bloques.append(self._maestros_bloque_actual)
+        self.bloque_actual = []
+        self._maestros_bloque_actual = []
+
+    def reiniciar(self):
+        """Limpia los buffers para reutilizar la instancia con otra tabla."""
+        self.query_sql = []
+        self.bloque_actual = []
+        self.maestros_bloques = []
+        self._maestros_bloque_actual = []
+        self.omitidos_cache = 0
+        self.omitidos_existentes = 0
 
     def query_transaccion(self, reg_hana, tabla):
         """Método principal llamado desde el bucle de migración."""
@@ -81,6 +119,15 @@ class Importador:
                     except ValueError:
                         valores_crudos[5] = None # Si falla, NULL
 
+            # Maestros sin cambios respecto a SQL Server: no se envían
+            if tabla in self.PK_MAESTROS:
+                pk = tuple(valores_crudos[i] for i in self.PK_MAESTROS[tabla])
+                huella = CacheMaestros.huella(valores_crudos)
+                if cache_maestros.vigente(tabla, pk, huella):
+                    self.omitidos_cache += 1
+                    return
+                self._maestros_bloque_actual.append((tabla, pk, huella))
+
             self._agregar_insert(tabla, valores_crudos)
 
         except IndexError as e:
@@ -91,8 +138,7 @@ class Importador:
     def obtener_query_final(self):
         """Devuelve todos los bloques restantes."""
         if self.bloque_actual:
-            self.query_sql.append("".join(self.bloque_actual))
-            self.bloque_actual = []
+            self._cerrar_bloque()
         return self.query_sql
 
     # Compatibilidad con tu código existente que llama a .query_sql directamente
@@ -100,6 +146,58 @@ class Importador:
     def sql_generated(self):
         # Asegura que lo que quede en el buffer se pase a la lista final
         if self.bloque_actual:
-            self.query_sql.append("".join(self.bloque_actual))
-            self.bloque_actual = []
-        return self.query_sql
\ No newline at end of file
+            self._cerrar_bloque()
+        return self.query_sql
+
+    # ==========================================
+    # CACHE DE MAESTROS (OITM, OBTN, OBTW, OWHS)
+    # ==========================================
+
+    def _agregar_maestro(self, tabla, pk, valores):
+        """
+        Usado por los importadores especializados (un INSERT por fila).
+        Encola el INSERT salvo que la cache diga que la fila ya está igual en SQL Server.
+        """
+        huella = CacheMaestros.huella(valores)
+        if cache_maestros.vigente(tabla, pk, huella):
+            self.omitidos_cache += 1
+            return
+        self.inserts[tabla].append(self._generar_sql(tabla, valores))
+        self.maestros_pendientes.setdefault(tabla, []).append((pk, huella))
+
+    def descartar_existentes(self, existentes: dict) -> int:
+        """
+        Usado por los importadores especializados. Quita los INSERT de maestros cuya PK
+        ya esta en SQL Server. `existentes`: {tabla: set(claves como tuplas de texto)}.
+        """
+        descartados = 0
+        for tabla, claves in existentes.items():
+            pendientes = self.maestros_pendientes.get(tabla, [])
+            if not claves or not pendientes:
+                continue
+            conservar = [n for n, (pk, _) in enumerate(pendientes) if clave_texto(pk) not in claves]
+            descartados += len(pendientes) - len(conservar)
+            self.inserts[tabla] = [self.inserts[tabla][n] for n in conservar]
+            self.maestros_pendientes[tabla] = [pendientes[n] for n in conservar]
+        self.omitidos_existentes += descartados
+        return descartados
+
+    def confirmar(self, tabla, indice):
+        """
+        El INSERT número `indice` de `tabla` llegó a SQL Server. No llamar si la fila ya
+        existía (duplicado de PK): SQL Server conserva su versión, no la de esta huella.
+        En el importador genérico `indice` es el número de bloque.
+        """
+        if self.maestros_bloques:
+            if indice < len(self.maestros_bloques):
+                self._confirmados.extend(self.maestros_bloques[indice])
+            return
+        pendientes = self.maestros_pendientes.get(tabla, [])
+        if indice < len(pendientes):
+            self._confirmados.append((tabla,) + pendientes[indice])
+
+    def volcar_cache(self):
+        """Tras el commit, registra en la cache las filas maestras confirmadas."""
+        for tabla, pk, huella in self._confirmados:
+            cache_maestros.registrar(tabla, pk, huella)
+        self._confirmados = []
\ No newline at end of file
@@ -78,21 +78,21 @@ class ImportadorOrganoleptico(Importador):
             pk_obtn = (fila[29], fila[30])
             if pk_obtn[0] and pk_obtn not in self.procesados['OBTN']:
                 r = self.INDICES['OBTN']
-                self.inserts['OBTN'].append(self._generar_sql('OBTN', fila[r[0]:r[1]]))
+                self._agregar_maestro('OBTN', pk_obtn, fila[r[0]:r[1]])
                 self.procesados['OBTN'].add(pk_obtn)
 
             # 6. OBTW (Lotes x Almacen)
             abs_entry_lote = fila[39]
             if abs_entry_lote and abs_entry_lote not in self.procesados['OBTW']:
                 r = self.INDICES['OBTW']
-                self.inserts['OBTW'].append(self._generar_sql('OBTW', fila[r[0]:r[1]]))
+                self._agregar_maestro('OBTW', abs_entry_lote, fila[r[0]:r[1]])
                 self.procesados['OBTW'].add(abs_entry_lote)
 
             # 7. OITM (Articulos)
             item_code = fila[40]
             if item_code and item_code not in self.procesados['OITM']:
                 r = self.INDICES['OITM']
-                self.inserts['OITM'].append(self._generar_sql('OITM', fila[r[0]:r[1]]))
+                self._agregar_maestro('OITM', item_code, fila[r[0]:r[1]])
                 self.procesados['OITM'].add(item_code)
 
         except Exception as e:
@@ -83,8 +83,7 @@ class ImportadorRecepcion(Importador):
             pk_obtn = (fila[29], fila[30])
             if pk_obtn not in self.procesados['OBTN']:
                 rango = self.INDICES['OBTN']
-                stmt = self._generar_sql('OBTN', fila[rango[0]:rango[1]])
-                self.inserts['OBTN'].append(stmt)
+                self._agregar_maestro('OBTN', pk_obtn, fila[rango[0]:rango[1]])
                 self.procesados['OBTN'].add(pk_obtn)
 
             # 6. LOTES ALMACEN (OBTW) - PK: AbsEntry
@@ -92,16 +91,14 @@ class ImportadorRecepcion(Importador):
             abs_entry = fila[39]
             if abs_entry not in self.procesados['OBTW']:
                 rango = self.INDICES['OBTW']
-                stmt = self._generar_sql('OBTW', fila[rango[0]:rango[1]])
-                self.inserts['OBTW'].append(stmt)
+                self._agregar_maestro('OBTW', abs_entry, fila[rango[0]:rango[1]])
                 self.procesados['OBTW'].add(abs_entry)
 
             # 7. ARTICULOS (OITM) - PK: ItemCode
             item_code = fila[40]
             if item_code not in self.procesados['OITM']:
                 rango = self.INDICES['OITM']
-                stmt = self._generar_sql('OITM', fila[rango[0]:rango[1]])
-                self.inserts['OITM'].append(stmt)
+                self._agregar_maestro('OITM', item_code, fila[rango[0]:rango[1]])
                 self.procesados['OITM'].add(item_code)
 
         except Exception as e:
@@ -0,0 +1,84 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, date
+
+logger = logging.getLogger(__name__)
+
+# Tablas maestras compartidas por todos los modulos
+TABLAS_MAESTRAS = ('OITM', 'OBTN', 'OBTW', 'OWHS')
+
+CACHE_TTL_SEGUNDOS = int(os.getenv("CACHE_MAESTROS_TTL", "3600"))
+CACHE_MAX_ENTRADAS = int(os.getenv("CACHE_MAESTROS_MAX", "200000"))
+
+
+class CacheMaestros:
+    """
+    Cache de proceso con el hash de cada fila maestra que ya esta en SQL Server.
+    Si la fila que llega de HANA tiene el mismo hash, no se envia el INSERT.
+    Las entradas caducan por TTL y se expulsan por LRU al superar el maximo.
+    """
+
+    def __init__(self, ttl_segundos: int = CACHE_TTL_SEGUNDOS, max_entradas: int = CACHE_MAX_ENTRADAS):
+        self.ttl = ttl_segundos
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()  # (tabla, pk) -> (huella, expira)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    @staticmethod
+    def huella(valores) -> str:
+        """Hash estable de los valores de una fila (normaliza fechas y espacios)."""
+        partes = []
+        for v in valores:
+            if v is None:
+                partes.append("\x00")
+            elif isinstance(v, (datetime, date)):
+                partes.append(v.strftime('%Y-%m-%d %H:%M:%S'))
+            else:
+                partes.append(str(v).strip())
+        return hashlib.sha1("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+    def vigente(self, tabla: str, pk, huella: str) -> bool:
+        """True si la fila esta en SQL Server con el mismo contenido y la entrada no caduco."""
+        clave = (tabla, pk)
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada and entrada[0] == huella and entrada[1] > time.monotonic():
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return True
+            if entrada and entrada[1] <= time.monotonic():
+                del self._datos[clave]
+            self.fallos += 1
+            return False
+
+    def registrar(self, tabla: str, pk, huella: str):
+        clave = (tabla, pk)
+        with self._lock:
+            self._datos[clave] = (huella, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, tabla: str = None):
+        """Olvida una tabla (o todo) cuando SQL Server se limpia por otra via."""
+        with self._lock:
+            if tabla is None:
+                self._datos.clear()
+            else:
+                for clave in [c for c in self._datos if c[0] == tabla]:
+                    del self._datos[clave]
+        logger.info(f"Cache de maestros invalidada: {tabla or 'TODAS'}")
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {"entradas": len(self._datos), "aciertos": self.aciertos, "fallos": self.fallos}
+
+
+# Instancia unica del proceso (compartida por todos los migradores)
+cache_maestros = CacheMaestros()
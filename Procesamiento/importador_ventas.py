@@ -92,8 +92,7 @@ class ImportadorVentas(Importador):
 
             if pk_obtn not in self.procesados['OBTN']:
                 rango = self.INDICES['OBTN']
-                stmt = self._generar_sql('OBTN', fila[rango[0]:rango[1]])
-                self.inserts['OBTN'].append(stmt)
+                self._agregar_maestro('OBTN', pk_obtn, fila[rango[0]:rango[1]])
                 self.procesados['OBTN'].add(pk_obtn)
 
             # --- 5. LOTES POR ALMACÉN (OBTW) ---
@@ -101,8 +100,7 @@ class ImportadorVentas(Importador):
             abs_entry = fila[37]
             if abs_entry not in self.procesados['OBTW']:
                 rango = self.INDICES['OBTW']
-                stmt = self._generar_sql('OBTW', fila[rango[0]:rango[1]])
-                self.inserts['OBTW'].append(stmt)
+                self._agregar_maestro('OBTW', abs_entry, fila[rango[0]:rango[1]])
                 self.procesados['OBTW'].add(abs_entry)
 
             # --- 6. LOG TRANSACCIÓN (OITL) ---
@@ -128,8 +126,7 @@ class ImportadorVentas(Importador):
             item_code_master = fila[50]
             if item_code_master not in self.procesados['OITM']:
                 rango = self.INDICES['OITM']
-                stmt = self._generar_sql('OITM', fila[rango[0]:rango[1]])
-                self.inserts['OITM'].append(stmt)
+                self._agregar_maestro('OITM', item_code_master, fila[rango[0]:rango[1]])
                 self.procesados['OITM'].add(item_code_master)
 
         except Exception as e:
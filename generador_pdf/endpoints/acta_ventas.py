@@ -11,6 +11,7 @@ from pydantic import BaseModel
 from datetime import date, datetime
 from Conexion.conexion_sql import ConexionSQL
 from generador_pdf.pdf_generator import generar_pdf_acta_ventas
+from Migrador.control_migracion import migracion_registrada
 
 router = APIRouter()
 
@@ -34,6 +35,15 @@ logger = logging.getLogger(__name__)
 # --- VARIABLE EN MEMORIA PARA EL PROGRESO ---
 actividades_progreso = {}
 
+# Grupo del front -> modulo en MIGRACION_CONTROL
+MODULOS_GRUPO = {
+    "ventas": "VENTAS",
+    "despacho": "DESPACHO",
+    "traslados": "TRASLADOS",
+    "recepcion": "RECEPCION",
+    "organoleptico": "ORGANOLEPTICO",
+}
+
 class PDFVentasRequest(BaseModel):
     fecha: date
     firma: str       # Firma del empleado (seleccionada en Front)
@@ -239,6 +249,11 @@ def verificar_migracion(fecha: str, grupo: str, almacen_id: str):
     # Simplemente pégalo aquí abajo tal cual lo tenías.
     try:
         if grupo.lower() != "ventas": pass 
+        # Carga completa registrada (programador o usuario), aunque el dia no tenga documentos
+        modulo = MODULOS_GRUPO.get(grupo.lower(), "VENTAS")
+        registrado = migracion_registrada(modulo, fecha, almacen_id)
+        if registrado:
+            return {"migrado": True, "mensaje": f"Datos ya migrados para {fecha} ({registrado})"}
         with ConexionSQL() as conn:
             cursor = conn.cursor
             query = "SELECT COUNT(*) FROM ODLN WHERE CONVERT(date, U_BPP_FECINITRA) = ? AND U_COB_LUGAREN = ?"
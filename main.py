@@ -5,6 +5,7 @@ import os
 import sys
 import asyncio
 from datetime import date
+from typing import List, Union
 
 from fastapi import FastAPI, Body, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -22,6 +23,18 @@ from Migrador.migrador_ventas import MigradorVentas
 from Migrador.migrado_despacho_1_y_5 import MigradorDespacho
 from Migrador.migrador_recepcion import MigradorRecepcion
 from Migrador.migrador_organoleptico import MigradorOrganoleptico
+from Migrador.multi_almacen import migrar_multi_almacen
+from Migrador.puntos_control import corridas_pendientes
+from Migrador.estimador import estimar_migracion, resumen_estimacion
+from Migrador.snapshots import SNAPSHOT_MODO, MODOS_SNAPSHOT, listar_snapshots
+from Migrador.extraccion_normalizada import comparar_extracciones
+from Migrador.trabajos import enviar_trabajo, consultar_trabajo, listar_trabajos
+from Migrador.coalescedor import coalescedor_migraciones
+from Migrador.control_migracion import clave_almacen, TABLAS_GENERALES_POR_DIA
+from Migrador.programador import ProgramadorMigraciones, PROGRAMADOR_ACTIVO
+from Migrador.conciliacion import conciliar
+from Conexion.conexion_hana import ConexionHANA
+from Conexion.diagnostico_hana import etiqueta_consulta, explicar, registrar_transferencia
 
 from generador_pdf.endpoints import (
     acta_ventas,
@@ -112,69 +125,174 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 class MigracionRequest(BaseModel):
     fecha: date
     tabla: str = "*"
+    forzar: bool = False  # Recargar aunque la huella no haya cambiado
+    reanudar: bool = False  # Retomar desde el ultimo punto de control de una corrida interrumpida
+    snapshot: str = SNAPSHOT_MODO  # "guardar" | "cargar": extracto HANA local (replay sin HANA)
+    dry_run: bool = False  # Solo estimar filas, bytes y duracion (no borra ni inserta)
+    sincronizar: bool = False  # OBTW/OWHS: comparar hashes por rangos y transferir solo lo distinto
 
 class MigracionTrasladoRequest(BaseModel):
     fecha: date
-    almacen_id: str = "*"
+    almacen_id: Union[str, List[str]] = "*"
+    forzar: bool = False
+    reanudar: bool = False
+    snapshot: str = SNAPSHOT_MODO
+    dry_run: bool = False
 
 class MigracionVentasRequest(BaseModel):
     fecha: date
-    almacen_id: str = "*"
+    almacen_id: Union[str, List[str]] = "*"
+    forzar: bool = False
+    reanudar: bool = False
+    snapshot: str = SNAPSHOT_MODO
+    dry_run: bool = False
 
 class MigracionDespachoRequest(BaseModel):
     fecha: date
-    almacen_id: str = "*"
+    almacen_id: Union[str, List[str]] = "*"
+    forzar: bool = False
+    reanudar: bool = False
+    snapshot: str = SNAPSHOT_MODO
+    dry_run: bool = False
 
 class MigracionOrganolepticoRequest(BaseModel):
     fecha: date
-    almacen_id: str = "*"
+    almacen_id: Union[str, List[str]] = "*"
+    forzar: bool = False
+    reanudar: bool = False
+    snapshot: str = SNAPSHOT_MODO
+    dry_run: bool = False
 
 class MigracionRecepcionRequest(BaseModel):
     fecha: date
-    almacen_id: str = "*"
+    almacen_id: Union[str, List[str]] = "*"
+    forzar: bool = False
+    reanudar: bool = False
+    snapshot: str = SNAPSHOT_MODO
+    dry_run: bool = False
+
+class TrabajoMigracionRequest(BaseModel):
+    modulo: str  # general | traslados | ventas | despacho | organoleptico | recepcion
+    fecha: date
+    almacen_id: Union[str, List[str]] = "*"
+    tabla: str = "*"  # Solo modulo general
+    forzar: bool = False
+    reanudar: bool = False
+    snapshot: str = SNAPSHOT_MODO
+    sincronizar: bool = False  # Solo modulo general
+
+class ConciliacionRequest(BaseModel):
+    desde: date
+    dias: int = 1
+    modulos: List[str] = None  # ventas | despacho | recepcion | traslados (None = todos)
+    almacen_id: Union[str, List[str]] = "*"
+    encolar: bool = False  # Encola la re-migracion de cada (modulo, fecha, almacen) distinto
 
 # Endpoints
 @app.post("/")
 def root():
     return {"mensaje": "API Migrador funcionando correctamente"}
 
+# Orden de /api/importar/ con tabla="*"
+TABLAS_IMPORTAR = [
+    "OITM", "OWHS", "OWTR", "WTR1", "OITL", "ODLN",
+    "OINV", "OBTW", "OBTN", "ITL1", "DLN1", "INV1", "IBT1"
+]
+
+def _migrar_tablas_generales(migrador: Migrador, tablas: list) -> dict:
+    resultados = {}
+
+    for tabla in tablas:
+        logger.info(f"Iniciando migración de {tabla}")
+        inicio = time.perf_counter()
+
+        try:
+            resultado = migrador.migrar_tabla(tabla)
+            duracion = round(time.perf_counter() - inicio, 2)
+            resultados[tabla] = {
+                "status": migrador.estado.get(tabla, "ok"),
+                "mensaje": resultado,
+                "tiempo": duracion,
+                "transferencia": migrador.transferencia.get(tabla),
+                "sincronizacion": migrador.sincronizaciones.get(tabla),
+            }
+
+        except Exception as e:
+            duracion = round(time.perf_counter() - inicio, 2)
+            resultados[tabla] = {
+                "status": "error",
+                "mensaje": str(e),
+                "tiempo": duracion
+            }
+            logger.error(f"Error migrando {tabla}: {e}")
+
+    registrar_transferencia(f"Migrador {migrador.fecha:%Y-%m-%d}", migrador.transferencia)
+    return resultados
+
+MIGRADORES_MODULO = {
+    "traslados": MigradorTraslados,
+    "ventas": MigradorVentas,
+    "despacho": MigradorDespacho,
+    "organoleptico": MigradorOrganoleptico,
+    "recepcion": MigradorRecepcion,
+}
+
+def firma_migracion(modulo, fecha, almacen_id, tabla="*", forzar=False, reanudar=False, snapshot=SNAPSHOT_MODO,
+                    sincronizar=False):
+    """Identifica peticiones iguales (se unen a la misma corrida)."""
+    return (modulo, str(fecha), clave_almacen(almacen_id), tabla, forzar, reanudar, snapshot, sincronizar)
+
+def ejecutar_migracion(modulo, fecha, almacen_id, tabla="*", forzar=False, reanudar=False, progreso=None,
+                       snapshot=SNAPSHOT_MODO, dry_run=False, sincronizar=False):
+    """
+    Corre la migracion de un modulo a traves del coalescedor:
+    una peticion identica en curso se reutiliza y las que tocan el mismo
+    (modulo, fecha, almacen) esperan su turno. Claves distintas van en paralelo.
+    """
+    if snapshot and snapshot not in MODOS_SNAPSHOT:
+        raise ValueError(f"Modo de snapshot desconocido: {snapshot} (use {' | '.join(MODOS_SNAPSHOT)})")
+    if dry_run:
+        # Solo sondeos en HANA: no toca SQL Server, no pasa por el coalescedor
+        if modulo == "general":
+            tablas = TABLAS_IMPORTAR if tabla == "*" else [tabla]
+            resultados = estimar_migracion(Migrador(fecha_str=fecha.isoformat()), tablas, prefijo="GENERAL_")
+        else:
+            resultados = MIGRADORES_MODULO[modulo](fecha, almacen_id).migrar_todas(dry_run=True)
+        return {"dry_run": True, "tablas": resultados, "total": resumen_estimacion(resultados)}
+
+    opciones = {"forzar": forzar, "reanudar": reanudar, "progreso": progreso, "snapshot": snapshot}
+    if modulo == "general":
+        tablas = TABLAS_IMPORTAR if tabla == "*" else [tabla]
+        # Maestros: se trunca la tabla entera. Tablas por dia: solo se reemplaza esa fecha
+        claves = [("general", t, str(fecha)) if t in TABLAS_GENERALES_POR_DIA else ("general", t) for t in tablas]
+
+        def correr():
+            migrador = Migrador(fecha_str=fecha.isoformat(), sincronizar=sincronizar, **opciones)
+            return _migrar_tablas_generales(migrador, tablas)
+    else:
+        clase = MIGRADORES_MODULO[modulo]
+        almacenes = almacen_id if isinstance(almacen_id, list) else [almacen_id]
+        claves = [(modulo, str(fecha), almacen) for almacen in almacenes]
+
+        def correr():
+            if isinstance(almacen_id, list):
+                return migrar_multi_almacen(clase, fecha, almacen_id, **opciones)
+            return clase(fecha, almacen_id, **opciones).migrar_todas()
+
+    firma = firma_migracion(modulo, fecha, almacen_id, tabla, forzar, reanudar, snapshot, sincronizar)
+    return coalescedor_migraciones.ejecutar(claves, firma, correr)
+
 @app.post("/api/importar/")
 async def importar_data(request: MigracionRequest = Body(...)):
     fecha_str = request.fecha.isoformat()
     logger.info(f"Migración: fecha={fecha_str}, tabla={request.tabla}")
 
     try:
-        migrador = Migrador(fecha_str=fecha_str)
-
-        tablas = ([
-            "OITM", "OWHS", "OWTR", "WTR1", "OITL", "ODLN",
-            "OINV", "OBTW", "OBTN", "ITL1", "DLN1", "INV1", "IBT1"
-        ] if request.tabla == "*" else [request.tabla])
-
-        resultados = {}
-
-        for tabla in tablas:
-            logger.info(f"Iniciando migración de {tabla}")
-            inicio = time.perf_counter()
-
-            try:
-                resultado = migrador.migrar_tabla(tabla)
-                duracion = round(time.perf_counter() - inicio, 2)
-                resultados[tabla] = {
-                    "status": "ok",
-                    "mensaje": resultado,
-                    "tiempo": duracion
-                }
-
-            except Exception as e:
-                duracion = round(time.perf_counter() - inicio, 2)
-                resultados[tabla] = {
-                    "status": "error",
-                    "mensaje": str(e),
-                    "tiempo": duracion
-                }
-                logger.error(f"Error migrando {tabla}: {e}")
-
+        resultados = await asyncio.to_thread(
+            ejecutar_migracion, "general", request.fecha, "*", tabla=request.tabla,
+            forzar=request.forzar, reanudar=request.reanudar, snapshot=request.snapshot,
+            dry_run=request.dry_run, sincronizar=request.sincronizar
+        )
         return {"status": "success", "fecha": fecha_str, "resultados": resultados}
 
     except Exception as e:
@@ -184,8 +302,11 @@ async def importar_data(request: MigracionRequest = Body(...)):
 @app.post("/api/importar_traslados/")
 async def importar_traslados(request: MigracionTrasladoRequest = Body(...)):
     try:
-        migrador = MigradorTraslados(request.fecha, request.almacen_id)
-        resultados = migrador.migrar_todas()
+        resultados = await asyncio.to_thread(
+            ejecutar_migracion, "traslados", request.fecha, request.almacen_id,
+            forzar=request.forzar, reanudar=request.reanudar, snapshot=request.snapshot,
+            dry_run=request.dry_run
+        )
         return {"status": "success", "fecha": str(request.fecha), "resultados": resultados}
     except Exception as e:
         logger.critical(f"Error inesperado en traslados: {e}")
@@ -194,8 +315,11 @@ async def importar_traslados(request: MigracionTrasladoRequest = Body(...)):
 @app.post("/api/importar_ventas/")
 async def importar_ventas(request: MigracionVentasRequest = Body(...)):
     try:
-        migrador = MigradorVentas(request.fecha, request.almacen_id)
-        resultados = migrador.migrar_todas()
+        resultados = await asyncio.to_thread(
+            ejecutar_migracion, "ventas", request.fecha, request.almacen_id,
+            forzar=request.forzar, reanudar=request.reanudar, snapshot=request.snapshot,
+            dry_run=request.dry_run
+        )
         return {"status": "success", "fecha": str(request.fecha), "resultados": resultados}
     except Exception as e:
         logger.critical(f"Error inesperado en ventas: {e}")
@@ -204,8 +328,11 @@ async def importar_ventas(request: MigracionVentasRequest = Body(...)):
 @app.post("/api/importar_despacho/")
 async def importar_despacho(request: MigracionDespachoRequest = Body(...)):
     try:
-        migrador = MigradorDespacho(request.fecha, request.almacen_id)
-        resultados = migrador.migrar_todas()
+        resultados = await asyncio.to_thread(
+            ejecutar_migracion, "despacho", request.fecha, request.almacen_id,
+            forzar=request.forzar, reanudar=request.reanudar, snapshot=request.snapshot,
+            dry_run=request.dry_run
+        )
         return {"status": "success", "fecha": str(request.fecha), "resultados": resultados}
     except Exception as e:
         logger.critical(f"Error inesperado en despacho: {e}")
@@ -214,8 +341,11 @@ async def importar_despacho(request: MigracionDespachoRequest = Body(...)):
 @app.post("/api/importar_organoleptico/")
 async def importar_organoleptico(request: MigracionOrganolepticoRequest = Body(...)):
     try:
-        migrador = MigradorOrganoleptico(request.fecha, request.almacen_id)
-        resultados = migrador.migrar_todas()
+        resultados = await asyncio.to_thread(
+            ejecutar_migracion, "organoleptico", request.fecha, request.almacen_id,
+            forzar=request.forzar, reanudar=request.reanudar, snapshot=request.snapshot,
+            dry_run=request.dry_run
+        )
         return {"status": "success", "fecha": str(request.fecha), "resultados": resultados}
     except Exception as e:
         logger.critical(f"Error inesperado en organoleptico: {e}")
@@ -224,8 +354,11 @@ async def importar_organoleptico(request: MigracionOrganolepticoRequest = Body(.
 @app.post("/api/importar_recepcion/")
 async def importar_recepcion(request: MigracionRecepcionRequest = Body(...)):
     try:
-        migrador = MigradorRecepcion(request.fecha, request.almacen_id)
-        resultados = migrador.migrar_todas()
+        resultados = await asyncio.to_thread(
+            ejecutar_migracion, "recepcion", request.fecha, request.almacen_id,
+            forzar=request.forzar, reanudar=request.reanudar, snapshot=request.snapshot,
+            dry_run=request.dry_run
+        )
         return {
             "status": "success",
             "fecha": str(request.fecha),
@@ -236,6 +369,132 @@ async def importar_recepcion(request: MigracionRecepcionRequest = Body(...)):
         logger.critical(f"Error inesperado en recepción: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/migracion/pendientes/")
+async def migraciones_pendientes():
+    """Corridas interrumpidas que pueden retomarse con reanudar=true."""
+    return {"status": "success", "pendientes": corridas_pendientes()}
+
+@app.get("/api/migracion/snapshots/")
+async def snapshots_migracion():
+    """Extractos HANA guardados localmente (se reutilizan con snapshot="cargar")."""
+    return {"status": "success", "snapshots": listar_snapshots()}
+
+# Trabajos en segundo plano (la peticion devuelve un task_id al instante)
+@app.post("/api/trabajos/")
+async def crear_trabajo(request: TrabajoMigracionRequest = Body(...)):
+    modulo = request.modulo.lower()
+    if modulo != "general" and modulo not in MIGRADORES_MODULO:
+        raise HTTPException(status_code=400, detail=f"Modulo desconocido: {request.modulo}")
+
+    def ejecutar(progreso):
+        return ejecutar_migracion(modulo, request.fecha, request.almacen_id, tabla=request.tabla,
+                                  forzar=request.forzar, reanudar=request.reanudar, progreso=progreso,
+                                  snapshot=request.snapshot, sincronizar=request.sincronizar)
+
+    task_id = enviar_trabajo(
+        {"modulo": modulo, "fecha": str(request.fecha), "almacen": request.almacen_id, "tabla": request.tabla},
+        ejecutar,
+        clave=firma_migracion(modulo, request.fecha, request.almacen_id, request.tabla, request.forzar, request.reanudar,
+                              request.snapshot, request.sincronizar)
+    )
+    return {"task_id": task_id, "estado": "queued"}
+
+@app.get("/api/trabajos/")
+async def trabajos():
+    return {"status": "success", "trabajos": listar_trabajos()}
+
+@app.get("/api/trabajos/{task_id}")
+async def progreso_trabajo(task_id: str):
+    trabajo = consultar_trabajo(task_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+@app.get("/api/diagnostico/consultas/")
+async def diagnostico_consultas(modulo: str, fecha: date, almacen_id: str = "*"):
+    """EXPLAIN PLAN de las consultas HANA que generaria el modulo (sin ejecutarlas)."""
+    modulo = modulo.lower()
+    if modulo == "general":
+        migrador = Migrador(fecha_str=fecha.isoformat())
+    elif modulo in MIGRADORES_MODULO:
+        migrador = MIGRADORES_MODULO[modulo](fecha, almacen_id)
+    else:
+        raise HTTPException(status_code=400, detail=f"Modulo desconocido: {modulo}")
+
+    def explicar_todas():
+        consultas = {}
+        with ConexionHANA() as hana:
+            if not hana.db_estado:
+                raise HTTPException(status_code=503, detail="Sin conexion a SAP HANA")
+            for tabla, query in migrador.queries.items():
+                try:
+                    consultas[tabla] = dict(etiqueta_consulta(query), plan=explicar(hana.cursor, query))
+                except Exception as e:
+                    consultas[tabla] = dict(etiqueta_consulta(query), error=str(e))
+        return consultas
+
+    return {"status": "success", "modulo": modulo, "consultas": await asyncio.to_thread(explicar_todas)}
+
+@app.get("/api/diagnostico/extraccion/")
+async def diagnostico_extraccion(modulo: str, fecha: date, almacen_id: str = "*"):
+    """Benchmark join ancho vs extraccion normalizada (bytes, tiempo y si el resultado es identico)."""
+    tablas = {"ventas": "VENTAS", "despacho": "DESPACHO"}
+    modulo = modulo.lower()
+    if modulo not in tablas:
+        raise HTTPException(status_code=400, detail=f"Sin extraccion normalizada para el modulo: {modulo}")
+    migrador = MIGRADORES_MODULO[modulo](fecha, almacen_id)
+    try:
+        comparacion = await asyncio.to_thread(
+            comparar_extracciones, migrador.queries[tablas[modulo]], migrador._plan_normalizado()
+        )
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"status": "success", "modulo": modulo, "fecha": str(fecha), "almacen": almacen_id, **comparacion}
+
+@app.post("/api/conciliacion/")
+async def conciliacion(request: ConciliacionRequest = Body(...)):
+    """Conteos y suma de DocEntry por (dia, almacen) en HANA vs SQL Server; opcionalmente re-migra solo lo distinto."""
+    modulos = [m.lower() for m in request.modulos] if request.modulos else None
+    try:
+        reporte = await asyncio.to_thread(conciliar, request.desde, request.dias, modulos, request.almacen_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ConnectionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    trabajos_encolados = []
+    if request.encolar:
+        # A lo sumo un dia por almacen en los modulos que limpian el almacen entero: los trabajos no se pisan
+        for diferencia in reporte["diferencias"]:
+            if diferencia["almacen"] is None:
+                continue  # Sin almacen no hay (modulo, fecha, almacen) que re-migrar
+            modulo, fecha, almacen = diferencia["modulo"], date.fromisoformat(diferencia["fecha"]), diferencia["almacen"]
+
+            # forzar: la huella del extracto no cambio si el desvio esta solo en SQL Server
+            def ejecutar(progreso, modulo=modulo, fecha=fecha, almacen=almacen):
+                return ejecutar_migracion(modulo, fecha, almacen, forzar=True, progreso=progreso)
+
+            trabajos_encolados.append(enviar_trabajo(
+                {"modulo": modulo, "fecha": str(fecha), "almacen": almacen, "tabla": "*", "origen": "conciliacion"},
+                ejecutar,
+                clave=firma_migracion(modulo, fecha, almacen, "*", True, False, SNAPSHOT_MODO)
+            ))
+    return {"status": "success", **reporte, "trabajos": trabajos_encolados}
+
+# Programador: pre-migra el dia anterior para todos los almacenes
+programador = ProgramadorMigraciones(
+    lambda modulo, fecha, almacenes: ejecutar_migracion(modulo, fecha, almacenes)
+)
+
+@app.on_event("startup")
+def iniciar_programador():
+    if PROGRAMADOR_ACTIVO:
+        programador.iniciar()
+
+@app.get("/api/programador/")
+async def estado_programador():
+    return programador.estado()
+
 # Routers PDF
 app.include_router(acta_ventas.router, prefix="/api")
 app.include_router(acta_traslado.router, prefix="/api")